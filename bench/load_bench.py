@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""Load benchmark: webserver.py and ConversationManager against a local stand-in backend.
+
+Starts ``bench/standin.py`` (simulated latency, token rate and errors) in a
+subprocess and points ``OPENROUTER_BASE_URL``/``OLLAMA_BASE_URL`` at it. It
+then drives these scenarios with a fixed number of concurrent clients:
+
+- web: ``POST /api/chat/qwen`` on ``webserver.py``, run under uvicorn in a subprocess
+- web-stream: ``POST /api/chat/qwen/stream`` (TTFT = first text event)
+- manager: `ConversationManager.ahandle` in process, one conversation per client
+- manager-stream: `ConversationManager.astream`
+
+Each scenario reports requests/sec, errors and p50/p95/p99 latency and TTFT.
+Results are compared with a JSON baseline (``--baseline``). The first run, or
+a run with ``--update``, writes the baseline. A later run exits with status 1
+when throughput drops, or a p95/p99 rises, by more than ``--tolerance``.
+Baselines are only comparable when recorded on the same machine with the
+same parameters.
+
+Prompts are unique per request, so reply caches and request coalescing don't
+flatter the numbers. Provider ``limits`` in agents.yml are stripped unless
+``--keep-limits`` is given, so the run measures the pipeline rather than
+the configured rate limit.
+
+Usage: python bench/load_bench.py [--scenario all] [--requests 200] [--concurrency 16] [--latency 0.05] [--baseline bench/baseline.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ("web", "web-stream", "manager", "manager-stream")
+# lower is better for these; requests/sec is the only higher-is-better metric compared
+WATCHED = ("latency_p95_ms", "latency_p99_ms", "ttft_p95_ms", "ttft_p99_ms")
+
+# one request: returns (latency seconds, ttft seconds or None), raises on failure
+Request = Callable[[int], Awaitable[Tuple[float, Optional[float]]]]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, `q` in [0, 100]."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))  # ceil
+    return ordered[int(rank) - 1]
+
+
+def summarize(latencies: List[float], ttfts: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    def ms(v: Optional[float]) -> Optional[float]:
+        return None if v is None else round(v * 1e3, 2)
+
+    out: Dict[str, Any] = {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+    }
+    for q in (50, 95, 99):
+        out[f"latency_p{q}_ms"] = ms(percentile(latencies, q))
+    for q in (50, 95, 99):
+        out[f"ttft_p{q}_ms"] = ms(percentile(ttfts, q))
+    return out
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions of `current` against `baseline`, as readable lines."""
+    problems: List[str] = []
+    for name, now in current.get("scenarios", {}).items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        if before.get("rps") and now.get("rps", 0.0) < before["rps"] * (1 - tolerance):
+            problems.append(f"{name}: rps {before['rps']} -> {now.get('rps')}")
+        for key in WATCHED:
+            old, new = before.get(key), now.get(key)
+            if old is not None and new is not None and new > old * (1 + tolerance):
+                problems.append(f"{name}: {key} {old} -> {new}")
+        if now.get("errors", 0) > before.get("errors", 0):
+            problems.append(f"{name}: errors {before.get('errors', 0)} -> {now['errors']}")
+    return problems
+
+
+async def run_load(make_client: Callable[[], Request], requests: int, concurrency: int) -> Dict[str, Any]:
+    """`concurrency` clients issue `requests` calls in total; each client gets its own `make_client()`."""
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    errors = 0
+    next_id = iter(range(requests))
+
+    async def client() -> None:
+        nonlocal errors
+        send = make_client()
+        for i in next_id:
+            try:
+                latency, ttft = await send(i)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(latency)
+            if ttft is not None:
+                ttfts.append(ttft)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return summarize(latencies, ttfts, errors, time.perf_counter() - start)
+
+
+# --- scenarios ------------------------------------------------------------
+
+
+def _prompt(i: int) -> str:
+    return f"benchmark question {i}: summarize the previous answer"
+
+
+def web_client(url: str, http, stream: bool) -> Request:
+    async def send(i: int) -> Tuple[float, Optional[float]]:
+        body = {"messages": [{"role": "user", "content": _prompt(i)}]}
+        start = time.perf_counter()
+        if not stream:
+            resp = await http.post(url + "/api/chat/qwen", json=body)
+            resp.raise_for_status()
+            return time.perf_counter() - start, None
+        ttft = None
+        async with http.stream("POST", url + "/api/chat/qwen/stream", json=body) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if line.startswith("event: error"):
+                    raise RuntimeError("stream failed")
+                if ttft is None and line.startswith('data: {"text"'):
+                    ttft = time.perf_counter() - start
+        return time.perf_counter() - start, ttft
+
+    return send
+
+
+def manager_client(agents, stream: bool) -> Request:
+    from core.manager import ConversationManager
+
+    cm = ConversationManager(agents)
+
+    async def send(i: int) -> Tuple[float, Optional[float]]:
+        start = time.perf_counter()
+        if not stream:
+            reply = await cm.ahandle(_prompt(i))
+            if reply.startswith("[error"):
+                raise RuntimeError(reply)
+            return time.perf_counter() - start, None
+        ttft = None
+        async for delta in cm.astream(_prompt(i)):
+            if delta.finish_reason == "error":
+                raise RuntimeError(delta.text)
+            if ttft is None and delta.text:
+                ttft = time.perf_counter() - start
+        return time.perf_counter() - start, ttft
+
+    return send
+
+
+# --- processes ------------------------------------------------------------
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, timeout: float = 30.0) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def bench_config(path: str, keep_limits: bool) -> str:
+    """A copy of agents.yml for the run, without provider limits unless `keep_limits`."""
+    import yaml
+
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
+    if not keep_limits:
+        for pcfg in (cfg.get("providers") or {}).values():
+            (pcfg or {}).pop("limits", None)
+    fd, out = tempfile.mkstemp(prefix="bench-agents-", suffix=".yml")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f)
+    return out
+
+
+def start_process(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable] + args, cwd=ROOT, env=env)
+
+
+async def run_scenario(name: str, args: argparse.Namespace, env: Dict[str, str], web_url: Optional[str]) -> Dict[str, Any]:
+    import httpx
+
+    stream = name.endswith("-stream")
+    if name.startswith("web"):
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(timeout=60.0, limits=limits) as http:
+            return await run_load(lambda: web_client(web_url, http, stream), args.requests, args.concurrency)
+
+    os.environ.update(env)
+    from core import transport
+    from core.load import build_registries
+
+    agents = build_registries(env["AGENTS_CONFIG"])
+    try:
+        return await run_load(lambda: manager_client(agents, stream), args.requests, args.concurrency)
+    finally:
+        await transport.aclose()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Concurrent load benchmark against a local stand-in backend.")
+    p.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    p.add_argument("--requests", type=int, default=200, help="Requests per scenario.")
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--latency", type=float, default=0.05, help="Stand-in seconds before the first token.")
+    p.add_argument("--tokens-per-sec", type=float, default=200.0)
+    p.add_argument("--tokens", type=int, default=32)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--config", default=os.path.join(ROOT, "agents", "agents.yml"))
+    p.add_argument("--keep-limits", action="store_true", help="Keep provider limits from the config.")
+    p.add_argument("--baseline", default=os.path.join(ROOT, "bench", "baseline.json"))
+    p.add_argument("--update", action="store_true", help="Overwrite the baseline with this run.")
+    p.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression (0.25 = 25%%).")
+    return p.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    standin_port = free_port()
+    base = f"http://127.0.0.1:{standin_port}"
+    config = bench_config(args.config, args.keep_limits)
+    env = dict(
+        os.environ,
+        OPENROUTER_BASE_URL=f"{base}/api/v1",
+        OLLAMA_BASE_URL=base,
+        OPENROUTER_API_KEY=os.getenv("OPENROUTER_API_KEY", "bench"),
+        AGENTS_CONFIG=config,
+        CHATKIT_AUTH_TOKEN="",
+    )
+    procs = [
+        start_process(
+            ["bench/standin.py", "--port", str(standin_port), "--latency", str(args.latency),
+             "--tokens-per-sec", str(args.tokens_per_sec), "--tokens", str(args.tokens),
+             "--error-rate", str(args.error_rate), "--seed", "0"],
+            env,
+        )
+    ]
+    web_url = None
+    try:
+        wait_ready(base + "/health")
+        if any(s.startswith("web") for s in scenarios):
+            web_port = free_port()
+            web_url = f"http://127.0.0.1:{web_port}"
+            procs.append(start_process(["-m", "uvicorn", "webserver:app", "--port", str(web_port), "--log-level", "warning"], env))
+            wait_ready(web_url + "/api/health")  # 200 once warm-up has finished
+        results: Dict[str, Any] = {}
+        for name in scenarios:
+            results[name] = asyncio.run(run_scenario(name, args, env, web_url))
+            print(f"{name:<15} " + "  ".join(f"{k}={v}" for k, v in results[name].items()))
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait(timeout=10)
+        os.unlink(config)
+
+    params = {k: getattr(args, k) for k in ("requests", "concurrency", "latency", "tokens_per_sec", "tokens", "error_rate", "keep_limits")}
+    run = {
+        "meta": {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(), "machine": platform.node(), "params": params},
+        "scenarios": results,
+    }
+    if args.update or not os.path.exists(args.baseline):
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("meta", {}).get("params") != params:
+        print("warning: baseline was recorded with different parameters", file=sys.stderr)
+    problems = compare(baseline, run, args.tolerance)
+    for line in problems:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    if not problems:
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
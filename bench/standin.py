@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Local stand-in for the OpenRouter and Ollama HTTP APIs, for load benchmarks.
+
+Replies are synthetic tokens paced like a real backend: each call waits
+``--latency`` seconds before the first token (queueing plus prefill), then
+emits ``--tokens`` tokens at ``--tokens-per-sec``. ``--error-rate`` fails that
+share of calls with ``--error-status`` before anything is sent. Point the app
+at it with ``OPENROUTER_BASE_URL=http://127.0.0.1:PORT/api/v1`` and
+``OLLAMA_BASE_URL=http://127.0.0.1:PORT``.
+
+Served routes:
+- ``POST /api/v1/chat/completions``: OpenAI-style JSON, or SSE with ``"stream": true``
+- ``POST /api/chat`` and ``POST /api/generate``: Ollama JSON or NDJSON
+- ``HEAD``/``GET`` on any other path: 200, for warm-up probes
+
+Usage: python bench/standin.py [--port 8900] [--latency 0.05] [--tokens-per-sec 200] [--tokens 32] [--error-rate 0]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+
+@dataclass
+class Behaviour:
+    latency: float = 0.05
+    tokens_per_sec: float = 200.0
+    tokens: int = 32
+    error_rate: float = 0.0
+    error_status: int = 500
+    seed: Optional[int] = None
+
+
+def create_app(b: Behaviour) -> FastAPI:
+    app = FastAPI(title="LLM stand-in")
+    rng = random.Random(b.seed)
+    gap = 1.0 / b.tokens_per_sec if b.tokens_per_sec > 0 else 0.0
+
+    def failed() -> Optional[Response]:
+        if b.error_rate and rng.random() < b.error_rate:
+            return JSONResponse({"error": {"message": "injected failure"}}, status_code=b.error_status)
+        return None
+
+    async def tokens() -> AsyncIterator[str]:
+        await asyncio.sleep(b.latency)
+        for i in range(b.tokens):
+            if i and gap:
+                await asyncio.sleep(gap)
+            yield f"tok{i} "
+
+    async def whole() -> str:
+        await asyncio.sleep(b.latency + gap * max(0, b.tokens - 1))
+        return "".join(f"tok{i} " for i in range(b.tokens))
+
+    usage = {"prompt_tokens": 0, "completion_tokens": b.tokens, "total_tokens": b.tokens}
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(req: Request):
+        body = await req.json()
+        error = failed()
+        if error is not None:
+            return error
+        model = body.get("model", "standin")
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": await whole()}
+            return {"id": "standin", "model": model, "choices": [{"index": 0, "message": message, "finish_reason": "stop"}], "usage": usage}
+
+        async def events() -> AsyncIterator[bytes]:
+            yield b": STANDIN PROCESSING\n\n"
+            async for tok in tokens():
+                chunk = {"id": "standin", "model": model, "choices": [{"index": 0, "delta": {"content": tok}}]}
+                yield b"data: " + json.dumps(chunk).encode() + b"\n\n"
+            final: Dict[str, Any] = {"id": "standin", "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            if (body.get("stream_options") or {}).get("include_usage"):
+                final["usage"] = usage
+            yield b"data: " + json.dumps(final).encode() + b"\n\n"
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    def _ollama_done(model: str, generate: bool) -> Dict[str, Any]:
+        done: Dict[str, Any] = {"model": model, "done": True, "done_reason": "stop", "eval_count": b.tokens}
+        if generate:
+            done["context"] = list(range(b.tokens))
+        return done
+
+    async def _ollama(req: Request, generate: bool):
+        body = await req.json()
+        model = body.get("model", "standin")
+        if generate and not body.get("prompt"):
+            return _ollama_done(model, generate)  # preload call from warm-up
+        error = failed()
+        if error is not None:
+            return error
+        if not body.get("stream", True):
+            done = _ollama_done(model, generate)
+            text = await whole()
+            if generate:
+                done["response"] = text
+            else:
+                done["message"] = {"role": "assistant", "content": text}
+            return done
+
+        async def lines() -> AsyncIterator[bytes]:
+            async for tok in tokens():
+                piece = {"response": tok} if generate else {"message": {"role": "assistant", "content": tok}}
+                yield json.dumps(dict(piece, model=model, done=False)).encode() + b"\n"
+            yield json.dumps(_ollama_done(model, generate)).encode() + b"\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.post("/api/chat")
+    async def ollama_chat(req: Request):
+        return await _ollama(req, generate=False)
+
+    @app.post("/api/generate")
+    async def ollama_generate(req: Request):
+        return await _ollama(req, generate=True)
+
+    @app.api_route("/{path:path}", methods=["GET", "HEAD"])
+    async def probe(path: str):
+        return Response(status_code=200)
+
+    return app
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="OpenRouter/Ollama-compatible stand-in with simulated latency.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8900)
+    p.add_argument("--latency", type=float, default=0.05, help="Seconds before the first token.")
+    p.add_argument("--tokens-per-sec", type=float, default=200.0)
+    p.add_argument("--tokens", type=int, default=32, help="Tokens per reply.")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Share of calls failed with --error-status.")
+    p.add_argument("--error-status", type=int, default=500)
+    p.add_argument("--seed", type=int, default=None)
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = parse_args()
+    behaviour = Behaviour(args.latency, args.tokens_per_sec, args.tokens, args.error_rate, args.error_status, args.seed)
+    uvicorn.run(create_app(behaviour), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: byte-level stream parser vs. naive line iteration + json.loads.
+
+Builds a synthetic OpenAI-style SSE body (or Ollama NDJSON with --ndjson),
+cuts it into network-sized chunks at arbitrary byte offsets, and times:
+
+- naive: incremental UTF-8 decode, split into text lines the way
+  ``httpx.Response.iter_lines()`` does, then ``json.loads`` per line
+- bytes: `core.stream_parser.iter_openai_sse_bytes` on the raw chunks
+
+Usage: python bench/stream_parser_bench.py [--events 20000] [--chunk 256] [--ndjson]
+"""
+
+import argparse
+import codecs
+import json
+import os
+import sys
+import time
+from typing import Callable, Iterable, Iterator, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.stream import Delta, normalize_ollama_ndjson, normalize_openai_sse  # noqa: E402
+from core.stream_parser import iter_ollama_ndjson_bytes, iter_openai_sse_bytes  # noqa: E402
+
+
+def sse_body(events: int) -> bytes:
+    out = [b": OPENROUTER PROCESSING\n\n"]
+    for i in range(events):
+        obj = {"id": "gen-1", "choices": [{"index": 0, "delta": {"content": f"tok{i % 97} é"}}]}
+        out.append(b"data: " + json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n\n")
+    out.append(b"data: [DONE]\n\n")
+    return b"".join(out)
+
+
+def ndjson_body(events: int) -> bytes:
+    out = [json.dumps({"message": {"content": f"tok{i % 97} é"}, "done": False}, ensure_ascii=False).encode() + b"\n" for i in range(events)]
+    out.append(b'{"done": true, "eval_count": 1}\n')
+    return b"".join(out)
+
+
+def chunked(body: bytes, size: int) -> List[bytes]:
+    return [body[i : i + size] for i in range(0, len(body), size)]
+
+
+def naive_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        for line in lines:
+            yield line.rstrip("\r\n")
+    if pending:
+        yield pending
+
+
+def naive_sse(lines: Iterable[str]) -> Iterator[Delta]:
+    for line in lines:
+        data = line[5:].strip() if line.startswith("data:") else ""
+        if data == "[DONE]":
+            return
+        d = normalize_openai_sse(json.loads(data)) if data else None
+        if d is not None:
+            yield d
+
+
+def naive_ndjson(lines: Iterable[str]) -> Iterator[Delta]:
+    for line in lines:
+        d: Optional[Delta] = normalize_ollama_ndjson(json.loads(line)) if line.strip() else None
+        if d is not None:
+            yield d
+            if d.finish_reason:
+                return
+
+
+def timed(fn: Callable[[], int], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--events", type=int, default=20000)
+    p.add_argument("--chunk", type=int, default=256, help="bytes per network chunk")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--ndjson", action="store_true", help="benchmark Ollama NDJSON instead of SSE")
+    args = p.parse_args()
+
+    if args.ndjson:
+        body, line_parser, byte_parser = ndjson_body(args.events), naive_ndjson, iter_ollama_ndjson_bytes
+    else:
+        body, line_parser, byte_parser = sse_body(args.events), naive_sse, iter_openai_sse_bytes
+    chunks = chunked(body, args.chunk)
+
+    def naive() -> int:
+        return sum(1 for _ in line_parser(naive_lines(chunks)))
+
+    def incremental() -> int:
+        return sum(1 for _ in byte_parser(chunks))
+
+    assert naive() == incremental(), "parsers disagree"
+    t_naive = timed(naive, args.repeat)
+    t_bytes = timed(incremental, args.repeat)
+    print(f"{len(chunks)} chunks, {args.events} events, {len(body) / 1e6:.1f} MB")
+    for name, t in (("naive iter_lines + json.loads", t_naive), ("byte parser", t_bytes)):
+        print(f"{name:30s} {t * 1e3:8.1f} ms  {len(chunks) / t:12,.0f} chunks/s  {args.events / t:12,.0f} events/s")
+    print(f"speedup: {t_naive / t_bytes:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
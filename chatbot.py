@@ -1,30 +1,44 @@
 #!/usr/bin/env python3
 import argparse
+import importlib
 import json
 import os
 import sys
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import List, Optional
-from core.load import build_registries
-from core.manager import ConversationManager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from core.stream import Delta, StreamStats
+
+# Everything below is imported on first use, so `--provider mock` (and scripts
+# calling the CLI in a loop) skip httpx, yaml, dotenv and the provider modules.
+# A missing optional dependency resolves to None.
+_LAZY = {
+    "_config": ("src.config", None),  # loads .env via python-dotenv
+    "resilience": ("core.resilience", None),  # shared retry/circuit-breaker wrapper (needs httpx)
+    "transport": ("core.transport", None),  # shared pooled HTTP clients (needs httpx)
+    "warmup": ("core.warmup", None),
+    "QwenProvider": ("src.providers.qwen_provider", "QwenProvider"),  # Qwen via OpenRouter
+}
+
 
-# Import config early to trigger optional .env loading via python-dotenv
-try:
-    from src import config as _config  # noqa: F401
-except Exception:
-    _config = None  # OS env will still be used by providers
+def _load(name: str) -> Any:
+    if name in globals():
+        return globals()[name]  # already imported, or replaced (tests)
+    module, attr = _LAZY[name]
+    try:
+        value = importlib.import_module(module)
+        if attr:
+            value = getattr(value, attr)
+    except Exception:
+        value = None
+    globals()[name] = value
+    return value
 
-# Optional dependency for Ollama HTTP calls
-try:
-    import requests  # type: ignore
-except Exception:
-    requests = None  # type: ignore
 
-# Qwen provider (via OpenRouter)
-try:
-    from src.providers.qwen_provider import QwenProvider
-except Exception:
-    QwenProvider = None  # type: ignore
+def __getattr__(name: str) -> Any:
+    if name in _LAZY:
+        return _load(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 @dataclass
@@ -54,10 +68,44 @@ def parse_args() -> argparse.Namespace:
     p.add_argument(
         "--system", default="You are a helpful assistant.", help="System prompt."
     )
-    return p.parse_args()
+    p.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print tokens as they arrive and report time-to-first-token and tokens/sec.",
+    )
+    p.add_argument(
+        "--batch",
+        default=None,
+        metavar="INPUT.jsonl",
+        help="Run every conversation in a JSON Lines file through the agents concurrently (needs --output).",
+    )
+    p.add_argument("--output", default=None, help="Results file for --batch; an existing file is resumed.")
+    p.add_argument("--concurrency", type=int, default=16, help="Conversations in flight with --batch.")
+    p.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print a per-stage timing breakdown (routing, queueing, network, parsing) after each turn.",
+    )
+    args = p.parse_args()
+    if args.batch and not args.output:
+        p.error("--batch needs --output")
+    return args
+
+
+@contextmanager
+def profiled(enabled: bool, report=None) -> Iterator[None]:
+    """Trace the enclosed turn and print its per-stage breakdown (``--profile``)."""
+    if not enabled:
+        yield
+        return
+    from core import trace
 
+    with trace.start("turn") as tr:
+        yield
+    print(tr.format(), file=report or sys.stderr)
 
-def chat_loop(provider: str, model: Optional[str], system_prompt: str) -> None:
+
+def chat_loop(provider: str, model: Optional[str], system_prompt: str, stream: bool = False, profile: bool = False) -> None:
     messages: List[Message] = [Message("system", system_prompt)]
     print(f"Provider: {provider}")
     if model:
@@ -75,15 +123,54 @@ def chat_loop(provider: str, model: Optional[str], system_prompt: str) -> None:
             print("Bye!")
             break
         messages.append(Message("user", user))
-        reply = run_inference(provider, model, messages)
+        with profiled(profile):
+            if stream:
+                print("Bot: ", end="", flush=True)
+                reply = print_stream(stream_inference(provider, model, messages))
+            else:
+                reply = run_inference(provider, model, messages)
+                print(f"Bot: {reply}")
         messages.append(Message("assistant", reply))
-        print(f"Bot: {reply}")
 
 
-def run_once(provider: str, model: Optional[str], system_prompt: str, prompt: str) -> None:
+def run_once(
+    provider: str, model: Optional[str], system_prompt: str, prompt: str, stream: bool = False, profile: bool = False
+) -> None:
     messages = [Message("system", system_prompt), Message("user", prompt)]
-    reply = run_inference(provider, model, messages)
-    print(reply)
+    with profiled(profile):
+        if stream:
+            print_stream(stream_inference(provider, model, messages))
+        else:
+            print(run_inference(provider, model, messages))
+
+
+def run_batch(input_path: str, output_path: str, concurrency: int = 16, config: str = "agents/agents.yml") -> Dict[str, int]:
+    """Results are appended to `output_path` in completion order; rerun the same command to resume."""
+    from core.batch import run_file
+    from core.load import build_registries
+
+    stats = run_file(build_registries(config), input_path, output_path, concurrency)
+    print(
+        f"[batch] {stats['ok']} ok, {stats['failed']} failed, {stats['skipped']} already done -> {output_path}",
+        file=sys.stderr,
+    )
+    return stats
+
+
+def print_stream(deltas: Iterable[Delta], out=None, report=None) -> str:
+    """Echo deltas as they arrive; returns the full text and reports TTFT and tokens/sec."""
+    out = out or sys.stdout
+    stats = StreamStats()
+    parts: List[str] = []
+    for delta in deltas:
+        stats.observe(delta)
+        if delta.text:
+            parts.append(delta.text)
+            out.write(delta.text)
+            out.flush()
+    out.write("\n")
+    print(f"[{stats.summary()}]", file=report or sys.stderr)
+    return "".join(parts)
 
 
 def run_inference(provider: str, model: Optional[str], messages: List[Message]) -> str:
@@ -98,6 +185,19 @@ def run_inference(provider: str, model: Optional[str], messages: List[Message])
     raise ValueError(f"Unknown provider: {provider}")
 
 
+def stream_inference(provider: str, model: Optional[str], messages: List[Message]) -> Iterator[Delta]:
+    if provider == "mock":
+        words = mock_infer(messages).split(" ")
+        return iter([Delta(text=w if i == 0 else " " + w) for i, w in enumerate(words)])
+    if provider == "openai":
+        return openai_stream(model, messages)
+    if provider == "ollama":
+        return ollama_stream(model, messages)
+    if provider == "qwen":
+        return qwen_stream(model, messages)
+    raise ValueError(f"Unknown provider: {provider}")
+
+
 # --- Providers ---
 
 def mock_infer(messages: List[Message]) -> str:
@@ -142,7 +242,19 @@ class MockProvider:
         return mock_infer(messages)
 
 
-def openai_infer(model: Optional[str], messages: List[Message]) -> str:
+# Clients and providers are reused across turns so keep-alive connections survive.
+_openai_clients: Dict[tuple, object] = {}
+_shared_providers: Dict[type, object] = {}
+
+
+def _shared_provider(cls):
+    provider = _shared_providers.get(cls)
+    if provider is None:
+        provider = _shared_providers[cls] = cls()
+    return provider
+
+
+def _openai_client(model: Optional[str]):
     try:
         from openai import OpenAI
     except Exception as e:
@@ -157,27 +269,65 @@ def openai_infer(model: Optional[str], messages: List[Message]) -> str:
         raise RuntimeError("--model is required for --provider openai.")
 
     base_url = os.getenv("OPENAI_BASE_URL")
-    client = (
-        OpenAI(api_key=api_key, base_url=base_url)
-        if base_url
-        else OpenAI(api_key=api_key)
-    )
+    transport = _load("transport")
+    key = (OpenAI, api_key, base_url)
+    client = _openai_clients.get(key)
+    if client is None:
+        # retries are handled by core.resilience so they share the circuit breaker
+        kwargs = {"api_key": api_key, "max_retries": 0}
+        if base_url:
+            kwargs["base_url"] = base_url
+        if transport is not None:
+            kwargs["http_client"] = transport.get_client(base_url or "https://api.openai.com/v1")
+        client = _openai_clients[key] = OpenAI(**kwargs)
+    return client
 
+
+def openai_infer(model: Optional[str], messages: List[Message]) -> str:
+    client = _openai_client(model)
+    resilience = _load("resilience")
     chat_messages = [{"role": m.role, "content": m.content} for m in messages]
 
+    def create():
+        return client.chat.completions.create(model=model, messages=chat_messages)
+
     try:
-        resp = client.chat.completions.create(model=model, messages=chat_messages)
+        resp = resilience.call("openai", create) if resilience is not None else create()
         return resp.choices[0].message.content.strip()
     except Exception as e:
         raise RuntimeError(f"OpenAI API error: {e}")
 
 
+def openai_stream(model: Optional[str], messages: List[Message]) -> Iterator[Delta]:
+    client = _openai_client(model)
+    resilience = _load("resilience")
+    chat_messages = [{"role": m.role, "content": m.content} for m in messages]
+
+    def create():
+        return client.chat.completions.create(
+            model=model, messages=chat_messages, stream=True, stream_options={"include_usage": True}
+        )
+
+    try:
+        chunks = resilience.call("openai", create) if resilience is not None else create()
+        for chunk in chunks:
+            usage = chunk.usage.model_dump() if getattr(chunk, "usage", None) else None
+            choice = chunk.choices[0] if chunk.choices else None
+            text = (choice.delta.content or "") if choice is not None else ""
+            finish = choice.finish_reason if choice is not None else None
+            if text or finish or usage:
+                yield Delta(text=text, finish_reason=finish, usage=usage)
+    except Exception as e:
+        raise RuntimeError(f"OpenAI API error: {e}")
+
+
 def ollama_infer(model: Optional[str], messages: List[Message]) -> str:
     if not model:
         raise RuntimeError("--model is required for --provider ollama.")
-    if requests is None:
+    transport, resilience = _load("transport"), _load("resilience")
+    if transport is None:
         raise RuntimeError(
-            "The 'requests' package is required for Ollama provider. Run: pip install requests"
+            "The 'httpx' package is required for Ollama provider. Run: pip install httpx"
         )
 
     url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434") + "/api/chat"
@@ -186,15 +336,18 @@ def ollama_infer(model: Optional[str], messages: List[Message]) -> str:
         "messages": [{"role": m.role, "content": m.content} for m in messages],
         "stream": False,
     }
-    try:
-        r = requests.post(
+    def post():
+        r = transport.get_client(url).post(
             url,
-            data=json.dumps(payload),
+            content=json.dumps(payload),
             headers={"Content-Type": "application/json"},
             timeout=120,
         )
         r.raise_for_status()
-        data = r.json()
+        return r
+
+    try:
+        data = resilience.call("ollama", post).json()
         # The exact shape may vary by Ollama version; handle common formats
         if isinstance(data, dict):
             if "message" in data and isinstance(data["message"], dict):
@@ -213,32 +366,72 @@ def qwen_infer(model: Optional[str], messages: List[Message]) -> str:
 
     If model is provided via CLI, it overrides the configured/default model.
     """
+    QwenProvider = _load("QwenProvider")
     if QwenProvider is None:
         raise RuntimeError(
             "Qwen provider not available. Ensure project dependencies are installed."
         )
 
-    provider = QwenProvider()
+    provider = _shared_provider(QwenProvider)
     chat_messages = [{"role": m.role, "content": m.content} for m in messages]
     return provider.chat(chat_messages, model_override=model)
 
 
+def ollama_stream(model: Optional[str], messages: List[Message]) -> Iterator[Delta]:
+    if not model:
+        raise RuntimeError("--model is required for --provider ollama.")
+    if _load("transport") is None:
+        raise RuntimeError(
+            "The 'httpx' package is required for Ollama provider. Run: pip install httpx"
+        )
+    from providers.ollama import OllamaProvider
+
+    provider = OllamaProvider()
+    provider.base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    return provider.stream(model, [{"role": m.role, "content": m.content} for m in messages])
+
+
+def qwen_stream(model: Optional[str], messages: List[Message]) -> Iterator[Delta]:
+    QwenProvider = _load("QwenProvider")
+    if QwenProvider is None:
+        raise RuntimeError(
+            "Qwen provider not available. Ensure project dependencies are installed."
+        )
+    provider = _shared_provider(QwenProvider)
+    return provider.stream([{"role": m.role, "content": m.content} for m in messages], model_override=model)
+
+
 # Provider registry
 PROVIDERS = {
     "mock": MockProvider,
-    "qwen": QwenProvider,
 }
 
 
 if __name__ == "__main__":
     args = parse_args()
+    if args.provider != "mock" or args.batch:
+        _load("_config")  # .env may hold API keys and base URLs
+    if args.batch:
+        stats = run_batch(args.batch, args.output, args.concurrency)
+        sys.exit(1 if stats["failed"] else 0)
     # Prefer new framework path if no legacy provider override was given
     if args.provider is None or args.provider == "qwen":
+        from core.load import build_registries, read_config
+        from core.manager import ConversationManager
+
         agents = build_registries("agents/agents.yml")
         cm = ConversationManager(agents)
         if args.once:
-            print(cm.handle(args.once))
+            with profiled(args.profile):
+                if args.stream:
+                    print_stream(cm.stream(args.once))
+                else:
+                    print(cm.handle(args.once))
             sys.exit(0)
+        warmup = _load("warmup")
+        if warmup is not None and warmup.enabled():
+            # connect and preload while the user types the first message
+            warmup.Warmup().start(warmup.steps(read_config("agents/agents.yml")))
         print("Chatbot started. Type 'exit' to quit.")
         while True:
             try:
@@ -251,10 +444,14 @@ if __name__ == "__main__":
             if user.lower() in {"/exit", ":q", "quit", "exit"}:
                 print("Bye!")
                 break
-            print(cm.handle(user))
+            with profiled(args.profile):
+                if args.stream:
+                    print_stream(cm.stream(user))
+                else:
+                    print(cm.handle(user))
         sys.exit(0)
     # Fallback to legacy path
     if args.once:
-        run_once(args.provider, args.model, args.system, args.once)
+        run_once(args.provider, args.model, args.system, args.once, stream=args.stream, profile=args.profile)
         sys.exit(0)
-    chat_loop(args.provider, args.model, args.system)
+    chat_loop(args.provider, args.model, args.system, stream=args.stream, profile=args.profile)
@@ -1,6 +1,26 @@
-from typing import List, Dict, Optional
+import asyncio
+from typing import AsyncIterator, Iterator, List, Dict, Optional
 
 from .types import Message, Provider, AgentSpec
+from .context import ContextWindow
+from .cache import build_cache, cache_key, is_cacheable
+from .singleflight import AsyncSingleFlight, SingleFlight
+from .semantic_cache import build_semantic_cache, last_user_text
+from .stream import Delta
+from . import metrics, trace
+
+# Process-wide so identical requests from different sessions share one upstream call
+_flights = SingleFlight()
+_aflights = AsyncSingleFlight()
+
+
+def is_error_reply(reply: str) -> bool:
+    return reply.startswith("[error:")
+
+
+def _single(reply: str) -> Delta:
+    # a whole reply as one delta, for providers that cannot stream
+    return Delta(text=reply, finish_reason="error" if is_error_reply(reply) else "stop")
 
 
 class Agent:
@@ -8,6 +28,13 @@ class Agent:
         self.spec = spec
         self.provider = provider
         self.memory = memory
+        self.window = ContextWindow.for_spec(spec)
+        policies = spec.get("policies") or {}
+        self.cache = build_cache(policies.get("cache"))
+        self.semantic = build_semantic_cache(policies.get("semantic_cache"))
+        self.coalesce = policies.get("coalesce", True)
+        # metric labels: agent, provider, model
+        self.labels = (spec.get("id", ""), spec.get("provider", "qwen"), spec.get("model", ""))
 
     def before_call(self, messages: List[Message], context: Optional[Dict] = None) -> List[Message]:
         out: List[Message] = []
@@ -19,9 +46,137 @@ class Agent:
         out.extend(messages)
         return out
 
+    def _key(self, model: str, messages: List[Message], kw: Dict) -> str:
+        # stable across processes, so a SQLite cache backend is shared by workers and restarts
+        return cache_key(f"{self.labels[1]}:{model}", messages, kw)
+
+    def _flight(self, key: str) -> str:
+        # in-flight calls are only shared between agents on the same provider object
+        return f"{id(self.provider)}:{key}"
+
+    def _semantic_scope(self, model: str, messages: List[Message]) -> Optional[str]:
+        """Partition of the semantic cache for this request; None when it must not be used."""
+        if self.semantic is None:
+            return None
+        # a follow-up such as "yes" or "tell me more" means nothing without its history
+        if any(m.get("role") == "assistant" for m in messages):
+            return None
+        system = [m for m in messages if m.get("role") == "system"]
+        return cache_key(f"{self.labels[0]}:{model}", system)
+
+    def _cached(self, key: str, model: str, messages: List[Message]) -> Optional[str]:
+        if self.cache is None and self.semantic is None:
+            return None
+        with trace.span("cache_lookup"):
+            hit = self.cache.get(key) if self.cache is not None else None
+            return self._semantic_hit(hit, model, messages)
+
+    async def _acached(self, key: str, model: str, messages: List[Message]) -> Optional[str]:
+        if self.cache is None and self.semantic is None:
+            return None
+        with trace.span("cache_lookup"):
+            hit = await self.cache.aget(key) if self.cache is not None else None
+            return self._semantic_hit(hit, model, messages)
+
+    def _semantic_hit(self, hit: Optional[str], model: str, messages: List[Message]) -> Optional[str]:
+        scope = self._semantic_scope(model, messages) if hit is None else None
+        if scope is not None:
+            hit = self.semantic.lookup(scope, last_user_text(messages))
+        metrics.CACHE.inc(self.labels[0], "miss" if hit is None else "hit")
+        return hit
+
+    def _remember(self, key: str, model: str, messages: List[Message], reply: str) -> None:
+        if not is_cacheable(reply):
+            return
+        if self.cache is not None:
+            self.cache.set(key, reply)
+        self._remember_semantic(model, messages, reply)
+
+    async def _aremember(self, key: str, model: str, messages: List[Message], reply: str) -> None:
+        if not is_cacheable(reply):
+            return
+        if self.cache is not None:
+            await self.cache.aset(key, reply)
+        self._remember_semantic(model, messages, reply)
+
+    def _remember_semantic(self, model: str, messages: List[Message], reply: str) -> None:
+        scope = self._semantic_scope(model, messages)
+        if scope is not None:
+            self.semantic.add(scope, last_user_text(messages), reply)
+
+    def _direct(self) -> bool:
+        return self.cache is None and self.semantic is None and not self.coalesce
+
     def call(self, messages: List[Message], **kw) -> str:
+        with metrics.track(*self.labels) as t:
+            return t.reply(self._call(messages, **kw))
+
+    def _call(self, messages: List[Message], **kw) -> str:
         model = self.spec.get("model", "")
-        return self.provider.chat(model, messages, **kw)
+        if self._direct():
+            return self.provider.chat(model, messages, **kw)
+        key = self._key(model, messages, kw)
+        hit = self._cached(key, model, messages)
+        if hit is not None:
+            return hit
+        if self.coalesce:
+            return _flights.do(self._flight(key), lambda: self._fetch(key, model, messages, **kw))
+        return self._fetch(key, model, messages, **kw)
+
+    def _fetch(self, key: str, model: str, messages: List[Message], **kw) -> str:
+        reply = self.provider.chat(model, messages, **kw)
+        self._remember(key, model, messages, reply)
+        return reply
+
+    async def acall(self, messages: List[Message], **kw) -> str:
+        with metrics.track(*self.labels) as t:
+            return t.reply(await self._acall(messages, **kw))
+
+    async def _acall(self, messages: List[Message], **kw) -> str:
+        model = self.spec.get("model", "")
+        if self._direct():
+            return await self._afetch(None, model, messages, **kw)
+        key = self._key(model, messages, kw)
+        hit = await self._acached(key, model, messages)
+        if hit is not None:
+            return hit
+        if self.coalesce:
+            return await _aflights.do(self._flight(key), lambda: self._afetch(key, model, messages, **kw))
+        return await self._afetch(key, model, messages, **kw)
+
+    async def _afetch(self, key: Optional[str], model: str, messages: List[Message], **kw) -> str:
+        achat = getattr(self.provider, "achat", None)
+        if achat is not None:
+            reply = await achat(model, messages, **kw)
+        else:
+            # Providers without a native async path run on a worker thread, never on the loop
+            reply = await asyncio.to_thread(self.provider.chat, model, messages, **kw)
+        if key is not None:
+            await self._aremember(key, model, messages, reply)
+        return reply
+
+    def stream(self, messages: List[Message], **kw) -> Iterator[Delta]:
+        with metrics.track(*self.labels) as t:
+            stream = getattr(self.provider, "stream", None)
+            if stream is None:
+                deltas = iter([_single(t.reply(self._call(messages, **kw)))])
+            else:
+                deltas = stream(self.spec.get("model", ""), messages, **kw)
+            for delta in deltas:
+                t.delta(delta)
+                yield delta
+
+    async def astream(self, messages: List[Message], **kw) -> AsyncIterator[Delta]:
+        with metrics.track(*self.labels) as t:
+            astream = getattr(self.provider, "astream", None)
+            if astream is None:
+                delta = _single(t.reply(await self._acall(messages, **kw)))
+                t.delta(delta)
+                yield delta
+                return
+            async for delta in astream(self.spec.get("model", ""), messages, **kw):
+                t.delta(delta)
+                yield delta
 
     def after_call(self, user_text: str, reply: str) -> None:
         if hasattr(self.memory, "write") and callable(getattr(self.memory, "write")):
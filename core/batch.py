@@ -0,0 +1,210 @@
+"""Batch chat: many independent conversations through the agents, concurrently.
+
+Input is JSON Lines with one conversation per line::
+
+    {"id": "q1", "message": "Summarize ..."}
+    {"id": "q2", "turns": ["Hi", "And then?"], "system_prompt": "Be brief."}
+
+A line without an ``id`` is identified by its line number. Each conversation
+gets its own `ConversationManager` over the shared agents, so routing, caches,
+retries and the provider limits in `core.scheduler` apply just as they do for
+interactive chats. At most ``concurrency`` conversations run at once. Input
+is only read as fast as slots free up, so a large file is never held in
+memory. Batch calls queue as a single caller ("batch"), so fair queueing keeps
+interactive users from being starved. A call rejected by a full queue or an
+open circuit is retried after the suggested delay instead of failing the
+record.
+
+Results are JSON lines written in completion order::
+
+    {"id": "q1", "reply": "...", "agent": "bootstrap", "seconds": 1.2}
+    {"id": "q2", "replies": ["...", "..."], "agent": "bootstrap", "seconds": 2.9}
+    {"id": "q3", "error": "..."}
+
+`ResultWriter` makes a run resumable. It reads an existing output file and
+cuts off a torn last line left by a crash. Ids that already have a reply are
+skipped, and failed ids run again; the last line for an id wins.
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Collection, Dict, Iterator, List, Optional, Set
+
+from . import resilience, scheduler
+from .manager import ConversationManager
+from .registry import AgentRegistry
+
+Record = Dict[str, Any]
+
+# rejected before reaching the upstream; waiting and retrying is the right answer in a batch
+_BUSY = (scheduler.QueueFullError, resilience.CircuitOpenError)
+
+
+def parse_line(line: bytes, lineno: int) -> Optional[Record]:
+    """The conversation on one input line; None for blank lines."""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        return {"id": str(lineno), "_error": f"invalid JSON: {e}"}
+    if not isinstance(record, dict):
+        return {"id": str(lineno), "_error": "expected a JSON object"}
+    record["id"] = str(record.get("id", lineno))
+    return record
+
+
+def read_records(path: str) -> Iterator[Record]:
+    with open(path, "rb") as f:
+        for lineno, line in enumerate(f, 1):
+            record = parse_line(line, lineno)
+            if record is not None:
+                yield record
+
+
+def _turns(record: Record) -> List[str]:
+    if "turns" in record:
+        return [str(t) for t in record["turns"] or []]
+    return [str(record.get("message", record.get("prompt", "")))]
+
+
+async def run_conversation(agents: AgentRegistry, record: Record, retries: int = 5) -> Record:
+    if "_error" in record:
+        return {"id": record["id"], "error": record["_error"]}
+    turns = _turns(record)
+    if not any(turns):
+        return {"id": record["id"], "error": "no message"}
+    start = time.perf_counter()
+    cm = ConversationManager(agents, system_prompt=record.get("system_prompt"))
+    replies: List[str] = []
+    try:
+        for text in turns:
+            for attempt in range(retries + 1):
+                try:
+                    reply = await cm.ahandle(text)
+                    break
+                except _BUSY as e:
+                    if attempt == retries:
+                        raise
+                    await asyncio.sleep(getattr(e, "retry_in", 1.0))
+            if reply.startswith("[error"):
+                return {"id": record["id"], "error": reply}
+            replies.append(reply)
+    except Exception as e:
+        return {"id": record["id"], "error": f"{type(e).__name__}: {e}"}
+    result: Record = {"id": record["id"]}
+    if "turns" in record:
+        result["replies"] = replies
+    else:
+        result["reply"] = replies[0]
+    result["agent"] = cm.active
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+class BatchRunner:
+    """Runs submitted conversations with at most `concurrency` in flight; `on_result` sees each result as it completes."""
+
+    def __init__(
+        self,
+        agents: AgentRegistry,
+        on_result: Callable[[Record], None],
+        concurrency: int = 16,
+        skip: Collection[str] = (),
+        caller: str = "batch",
+    ):
+        self.agents = agents
+        self.on_result = on_result
+        self.skip = skip
+        self.caller = caller
+        self.stats = {"submitted": 0, "skipped": 0, "ok": 0, "failed": 0}
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    async def submit(self, record: Record) -> None:
+        """Start `record` once a slot is free (this is where reading the input waits)."""
+        if record["id"] in self.skip:
+            self.stats["skipped"] += 1
+            return
+        await self._slots.acquire()
+        self.stats["submitted"] += 1
+        task = asyncio.create_task(self._run(record))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, record: Record) -> None:
+        scheduler.current_caller.set(self.caller)
+        try:
+            result = await run_conversation(self.agents, record)
+        finally:
+            self._slots.release()
+        self.stats["failed" if "error" in result else "ok"] += 1
+        self.on_result(result)
+
+    async def join(self) -> Dict[str, int]:
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+        return self.stats
+
+
+class ResultWriter:
+    """Appends results to a JSON Lines file; `done` holds the ids that already have a reply there."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            self._recover()
+        self._file = open(path, "ab")
+
+    def _recover(self) -> None:
+        with open(self.path, "r+b") as f:
+            end = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                end += len(line)
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(result, dict) and "id" in result:
+                    if "error" in result:
+                        self.done.discard(str(result["id"]))
+                    else:
+                        self.done.add(str(result["id"]))
+            if end < os.fstat(f.fileno()).st_size:
+                f.truncate(end)  # torn line from an interrupted write
+
+    def write(self, result: Record) -> None:
+        self._file.write(json.dumps(result, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._file.flush()
+        if "error" not in result:
+            self.done.add(result["id"])
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def run_file(agents: AgentRegistry, input_path: str, output_path: str, concurrency: int = 16) -> Dict[str, int]:
+    """Run every conversation in `input_path`, appending results to `output_path` (resuming if it exists)."""
+    writer = ResultWriter(output_path)
+
+    async def main() -> Dict[str, int]:
+        from . import transport
+
+        runner = BatchRunner(agents, writer.write, concurrency, skip=set(writer.done))
+        try:
+            for record in read_records(input_path):
+                await runner.submit(record)
+            return await runner.join()
+        finally:
+            await transport.aclose()
+
+    try:
+        return asyncio.run(main())
+    finally:
+        writer.close()
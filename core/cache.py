@@ -0,0 +1,178 @@
+"""Response caches keyed by model plus normalized messages.
+
+`MemoryCache` is a per-process LRU with TTL and a size bound. It can sit in
+front of a `SQLiteCache` so several uvicorn workers share one on-disk store.
+Agents opt in via ``policies.cache`` in agents.yml, e.g.
+``cache: { ttl: 300, max_entries: 1024, path: ".run/cache.sqlite" }``.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .types import Message
+
+# Call options that change the reply; transport options such as timeout do not
+KEY_PARAMS = ("temperature", "top_p", "top_k", "max_tokens", "stop", "seed", "presence_penalty", "frequency_penalty")
+
+
+def cache_key(model: str, messages: List[Message], params: Optional[Dict[str, Any]] = None) -> str:
+    # Only surrounding whitespace is noise; inside a message it can be code or layout
+    norm = [[m.get("role", ""), (m.get("content") or "").strip()] for m in messages]
+    key: List[Any] = [model, norm]
+    if params:
+        opts = {k: params[k] for k in KEY_PARAMS if params.get(k) is not None}
+        if opts:
+            key.append(opts)
+    raw = json.dumps(key, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(reply: str) -> bool:
+    return bool(reply) and not reply.startswith("[error:")
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def as_dict(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / total if total else 0.0}
+
+
+class SQLiteCache:
+    def __init__(self, path: str, ttl: float = 300.0, max_entries: int = 100_000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit + WAL so concurrent workers read while one writes
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        row = self._conn().execute(
+            "SELECT value, expires FROM responses WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key: str, value: str) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, time.time() + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % 256 == 0:
+            self.prune()
+
+    def prune(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class MemoryCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0, backend: Optional[SQLiteCache] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.stats = CacheStats()
+        self._data: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _memory(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                if item[1] > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.stats.hits += 1
+                    return item[0]
+                del self._data[key]
+        return None
+
+    def _shared(self, key: str, shared: Optional[Tuple[str, float]]) -> Optional[str]:
+        if shared is not None:
+            value, expires = shared
+            self._put(key, value, time.monotonic() + min(self.ttl, expires - time.time()))
+            with self._lock:
+                self.stats.hits += 1
+            return value
+        with self._lock:
+            self.stats.misses += 1
+        return None
+
+    def get(self, key: str) -> Optional[str]:
+        hit = self._memory(key)
+        if hit is not None:
+            return hit
+        return self._shared(key, self.backend.get(key) if self.backend is not None else None)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """`get` for the event loop: the SQLite backend is read on a worker thread."""
+        hit = self._memory(key)
+        if hit is not None:
+            return hit
+        return self._shared(key, await asyncio.to_thread(self.backend.get, key) if self.backend is not None else None)
+
+    def set(self, key: str, value: str) -> None:
+        self._put(key, value, time.monotonic() + self.ttl)
+        if self.backend is not None:
+            self.backend.set(key, value)
+
+    async def aset(self, key: str, value: str) -> None:
+        self._put(key, value, time.monotonic() + self.ttl)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.set, key, value)
+
+    def _put(self, key: str, value: str, expires: float) -> None:
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def build_cache(cfg: Optional[Dict]) -> Optional[MemoryCache]:
+    if not cfg:
+        return None
+    ttl = float(cfg.get("ttl", 300))
+    backend = None
+    if cfg.get("path"):
+        backend = SQLiteCache(cfg["path"], ttl=ttl, max_entries=int(cfg.get("max_disk_entries", 100_000)))
+    return MemoryCache(max_entries=int(cfg.get("max_entries", 1024)), ttl=ttl, backend=backend)
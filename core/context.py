@@ -0,0 +1,60 @@
+"""Token-budgeted context window for the messages sent on each turn."""
+
+import re
+from functools import lru_cache
+from typing import List
+
+from .types import Message, AgentSpec
+
+DEFAULT_CONTEXT_TOKENS = 8192
+MESSAGE_OVERHEAD = 4  # role markers / separators added by chat templates
+
+# Roughly BPE-sized pieces: words split every 4 chars, each punctuation mark on its own.
+_PIECE = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+@lru_cache(maxsize=16384)
+def _estimate(text: str) -> int:
+    return len(_PIECE.findall(text))
+
+
+def estimate_tokens(message: Message) -> int:
+    return _estimate(message.get("content") or "") + MESSAGE_OVERHEAD
+
+
+class ContextWindow:
+    def __init__(self, max_tokens: int = DEFAULT_CONTEXT_TOKENS, reserve: int = 0):
+        self.budget = max(0, max_tokens - reserve)
+
+    @classmethod
+    def for_spec(cls, spec: AgentSpec) -> "ContextWindow":
+        # max_context_tokens caps the request; max_tokens is held back for the reply
+        policies = spec.get("policies") or {}
+        return cls(
+            int(policies.get("max_context_tokens") or DEFAULT_CONTEXT_TOKENS),
+            int(policies.get("max_tokens") or 0),
+        )
+
+    def fit(self, messages: List[Message]) -> List[Message]:
+        """Keep system/handover messages and the newest turns that fit the budget.
+
+        The final message (the new user turn) is always kept, even if it alone
+        exceeds the budget.
+        """
+        if not messages:
+            return messages
+        costs = [estimate_tokens(m) for m in messages]
+        if sum(costs) <= self.budget:
+            return messages
+        last = len(messages) - 1
+        keep = {i for i, m in enumerate(messages) if m.get("role") == "system"}
+        keep.add(last)
+        used = sum(costs[i] for i in keep)
+        for i in range(last - 1, -1, -1):
+            if i in keep:
+                continue
+            if used + costs[i] > self.budget:
+                break
+            keep.add(i)
+            used += costs[i]
+        return [m for i, m in enumerate(messages) if i in keep]
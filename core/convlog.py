@@ -0,0 +1,301 @@
+"""Append-only conversation log with group commit and snapshot compaction; sessions are rebuilt on first access."""
+
+import json
+import os
+import queue
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+_STATE_KEYS = ("history", "active", "summary", "system_prompt")
+_SEGMENT = re.compile(r"^wal-(\d+)\.jsonl$")
+
+
+def apply_record(state: Optional[Dict], rec: Dict) -> Optional[Dict]:
+    """Replay one log record onto a session state (as produced by `ConversationManager.state`)."""
+    op = rec.get("op")
+    if op == "delete":
+        return None
+    if op == "state":
+        return {k: rec.get(k) for k in _STATE_KEYS}
+    state = state or {"history": [], "active": None, "summary": None, "system_prompt": None}
+    history = state["history"]
+    if op == "turn":
+        history.append({"role": "user", "content": rec.get("user", "")})
+        history.append({"role": "assistant", "content": rec.get("reply", "")})
+        state["active"] = rec.get("agent")
+    elif op == "summary":
+        state["summary"] = rec.get("summary")
+        del history[: rec.get("covered", 0)]
+    elif op == "trim":
+        del history[: rec.get("drop", 0)]
+    elif op == "system_prompt":
+        state["system_prompt"] = rec.get("value")
+    return state
+
+
+class LogFullError(RuntimeError):
+    def __init__(self, retry_in: float = 1.0):
+        super().__init__(f"conversation log is behind; retry in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+class _Barrier:
+    def __init__(self, fsync: bool):
+        self.fsync = fsync
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class ConversationLog:
+    def __init__(
+        self,
+        directory: str,
+        fsync_interval: float = 0.05,
+        batch_size: int = 256,
+        max_queue: int = 10_000,
+        compact_every: int = 10_000,
+        put_timeout: float = 0.5,
+    ):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.batch_size = batch_size
+        self.compact_every = compact_every
+        self.put_timeout = put_timeout
+        self.snapshot_path = os.path.join(directory, "snapshot.jsonl")
+        os.makedirs(directory, exist_ok=True)
+        self.appended = 0
+        self.fsyncs = 0
+        self.compactions = 0
+        self.dropped = 0
+        # sessions whose last record was refused; their next one is written as a full state
+        self._lost: Set[str] = set()
+        self._since_compact = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()  # guards the open segment, the index and snapshot swaps
+        self._index: Optional[Dict[str, List[Tuple[str, int]]]] = None
+        segments = self._segments()
+        self._segment = segments[-1] if segments else 1
+        self._wal = open(self._segment_path(self._segment), "ab")
+        if self._wal.tell() and not _ends_with_newline(self._wal.name):
+            self._wal.write(b"\n")  # seal a torn last line so the next record starts clean
+        self._writer = threading.Thread(target=self._run, name="convlog-writer", daemon=True)
+        self._writer.start()
+
+    def _segment_path(self, n: int) -> str:
+        return os.path.join(self.directory, f"wal-{n:08d}.jsonl")
+
+    def _segments(self) -> List[int]:
+        return sorted(int(m.group(1)) for m in map(_SEGMENT.match, os.listdir(self.directory)) if m)
+
+    def _snapshot_through(self) -> int:
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        with open(self.snapshot_path, "rb") as f:
+            header = json.loads(f.readline() or b"{}")
+        return int(header.get("through", 0))
+
+    def _sources(self, upto: Optional[int] = None) -> List[str]:
+        """Snapshot plus the segments written after it (up to `upto`), in replay order."""
+        through = self._snapshot_through()
+        segments = [n for n in self._segments() if n > through and (upto is None or n <= upto)]
+        return [self.snapshot_path] + [self._segment_path(n) for n in segments]
+
+    # --- producer side ----------------------------------------------------
+
+    def append(self, sid: str, rec: Dict, state: Optional[Callable[[], Dict]] = None) -> None:
+        """Queue `rec` for `sid` (`state` gives the state after it); raises `LogFullError` if the writer is behind."""
+        if sid in self._lost and state is not None:
+            rec = dict(state(), op="state")  # resync after a refused record
+        try:
+            self._put(dict(rec, sid=sid), self.put_timeout)
+        except (queue.Full, RuntimeError):
+            self.dropped += 1
+            self._lost.add(sid)
+            raise LogFullError(self.fsync_interval + self.put_timeout) from None
+        self._lost.discard(sid)
+
+    def _put(self, item: object, timeout: Optional[float]) -> None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if not self._writer.is_alive():
+                raise RuntimeError("conversation log writer has stopped")
+            wait = 0.1 if deadline is None else min(0.1, deadline - time.monotonic())
+            try:
+                self._queue.put(item, timeout=max(0.0, wait))
+                return
+            except queue.Full:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+
+    def flush(self, fsync: bool = True, timeout: Optional[float] = None) -> None:
+        """Block until everything appended so far is written (and fsynced), or raise if the writer is gone."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        barrier = _Barrier(fsync)
+        try:
+            self._put(barrier, timeout)
+        except queue.Full:
+            raise TimeoutError("conversation log flush timed out") from None
+        while not barrier.done.wait(0.1):
+            if not self._writer.is_alive():
+                raise RuntimeError("conversation log writer has stopped")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError("conversation log flush timed out")
+
+    def close(self) -> None:
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        with self._lock:
+            if not self._wal.closed:
+                self._wal.close()
+
+    # --- writer thread ----------------------------------------------------
+
+    def _run(self) -> None:
+        dirty = False
+        last_sync = time.monotonic()
+        while True:
+            timeout = max(0.0, self.fsync_interval - (time.monotonic() - last_sync)) if dirty else None
+            try:
+                batch = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                self._fsync()
+                dirty, last_sync = False, time.monotonic()
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [item for item in batch if isinstance(item, dict)]
+            if records:
+                self._write(records)
+                dirty = True
+            stop = any(item is _STOP for item in batch)
+            barriers = [item for item in batch if isinstance(item, _Barrier)]
+            if dirty and (stop or any(b.fsync for b in barriers) or time.monotonic() - last_sync >= self.fsync_interval):
+                self._fsync()
+                dirty, last_sync = False, time.monotonic()
+            if self._since_compact >= self.compact_every:
+                self.compact()
+            for b in barriers:
+                b.done.set()
+            if stop:
+                return
+
+    def _write(self, records: List[Dict]) -> None:
+        with self._lock:
+            for rec in records:
+                line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+                offset = self._wal.tell()
+                self._wal.write(line)
+                if self._index is not None:
+                    self._index.setdefault(rec["sid"], []).append((self._wal.name, offset))
+            self._wal.flush()
+            self.appended += len(records)
+            self._since_compact += len(records)
+
+    def _fsync(self) -> None:
+        with self._lock:
+            os.fsync(self._wal.fileno())
+            self.fsyncs += 1
+
+    def compact(self) -> None:
+        """Fold the snapshot and closed segments into a new snapshot; called from the writer thread."""
+        with self._lock:
+            closed = self._segment
+            self._wal.close()
+            self._segment += 1
+            self._wal = open(self._segment_path(self._segment), "ab")
+            self._since_compact = 0
+        # closed segments are immutable, so folding them needs no lock
+        states: Dict[str, Optional[Dict]] = {}
+        for path in self._sources(upto=closed):
+            for _, rec in _scan(path):
+                states[rec["sid"]] = apply_record(states.get(rec["sid"]), rec)
+        tmp = self.snapshot_path + ".tmp"
+        index: Dict[str, List[Tuple[str, int]]] = {}
+        with open(tmp, "wb") as f:
+            f.write((json.dumps({"op": "header", "through": closed}) + "\n").encode("utf-8"))
+            for sid, state in states.items():
+                if state is not None:
+                    index[sid] = [(self.snapshot_path, f.tell())]
+                    f.write((json.dumps(dict(state, sid=sid, op="state"), ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            os.replace(tmp, self.snapshot_path)
+            for n in self._segments():
+                if n <= closed:
+                    os.remove(self._segment_path(n))
+            if self._index is not None:
+                # swap in the snapshot offsets and keep what the open segment already has
+                for sid, locations in self._index.items():
+                    tail = [loc for loc in locations if loc[0] == self._wal.name]
+                    if tail:
+                        index.setdefault(sid, []).extend(tail)
+                self._index = index
+            self.compactions += 1
+
+    # --- reader side ------------------------------------------------------
+
+    def _build_index(self) -> Dict[str, List[Tuple[str, int]]]:
+        index: Dict[str, List[Tuple[str, int]]] = {}
+        self._wal.flush()
+        for path in self._sources():
+            for offset, rec in _scan(path):
+                index.setdefault(rec["sid"], []).append((path, offset))
+        return index
+
+    def load(self, sid: str) -> Optional[Dict]:
+        """Rebuild one session's state from its records, or None if it has none (or was deleted)."""
+        self.flush(fsync=False)  # records still queued must be visible
+        with self._lock:
+            if self._index is None:
+                self._index = self._build_index()
+            locations = list(self._index.get(sid, ()))
+            state: Optional[Dict] = None
+            handles: Dict[str, object] = {}
+            try:
+                for path, offset in locations:
+                    f = handles.get(path) or handles.setdefault(path, open(path, "rb"))
+                    f.seek(offset)
+                    state = apply_record(state, json.loads(f.readline()))
+            finally:
+                for f in handles.values():
+                    f.close()
+        return state
+
+    def stats(self) -> Dict:
+        return {
+            "appended": self.appended,
+            "queued": self._queue.qsize(),
+            "fsyncs": self.fsyncs,
+            "compactions": self.compactions,
+            "dropped": self.dropped,
+        }
+
+
+def _scan(path: str):
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                rec = None  # torn final line after a crash
+            if isinstance(rec, dict) and "sid" in rec:
+                yield offset, rec
+            offset += len(line)
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
@@ -1,29 +1,107 @@
-from typing import Tuple
+"""Build agent and provider registries from agents.yml.
+
+Providers are discovered from the modules in ``providers/`` that define
+``provider_instance`` (found by reading the source, not importing it) plus any
+``providers.<name>.module`` in the config. Each one is imported and built only
+when an agent or composite first asks for it, so a config that only uses qwen
+never imports the Ollama or OpenAI code.
+"""
+
+import importlib
+import os
+import pkgutil
+from typing import Dict, Optional
+
 import yaml
 
+from . import scheduler
 from .registry import ProviderRegistry, AgentRegistry
 from .agent import Agent
 
+PROVIDERS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "providers")
+# modules not named after the provider they implement
+_MODULE_NAMES = {"openrouter_qwen": "qwen"}
 
-def build_registries(path: str) -> AgentRegistry:
+
+def read_config(path: str) -> dict:
     with open(path, "r", encoding="utf-8") as f:
-        cfg = yaml.safe_load(f) or {}
+        return yaml.safe_load(f) or {}
 
-    providers = ProviderRegistry()
 
-    from providers.openrouter_qwen import provider_instance as qwen_instance
-    from providers.openai import provider_instance as openai_instance
-    from providers.ollama import provider_instance as ollama_instance
+def configure_limits(cfg) -> None:
+    """Set up a scheduler for every provider with a ``limits`` block (`cfg` is a path or parsed config)."""
+    if isinstance(cfg, str):
+        cfg = read_config(cfg)
+    for name, pcfg in (cfg.get("providers") or {}).items():
+        if (pcfg or {}).get("limits"):
+            scheduler.configure(name, pcfg["limits"])
+
+
+def discover_providers(cfg: Optional[dict] = None) -> Dict[str, str]:
+    """Provider name -> module path, without importing any provider."""
+    found: Dict[str, str] = {}
+    for info in pkgutil.iter_modules([PROVIDERS_DIR]):
+        with open(os.path.join(PROVIDERS_DIR, info.name + ".py"), "r", encoding="utf-8") as f:
+            if "\ndef provider_instance(" in f.read():
+                found[_MODULE_NAMES.get(info.name, info.name)] = f"providers.{info.name}"
+    for name, pcfg in ((cfg or {}).get("providers") or {}).items():
+        if (pcfg or {}).get("module"):
+            found[name] = pcfg["module"]
+    return found
+
+
+def _instance(name: str, module: str) -> object:
+    def build() -> object:
+        return importlib.import_module(module).provider_instance()
+
+    if not (os.getenv("CASSETTE_RECORD") or os.getenv("CASSETTE_REPLAY")):
+        return scheduler.scheduled(name, build())
+    from providers import cassette
 
-    providers.register("qwen", qwen_instance())
-    providers.register("openai", openai_instance())
-    providers.register("ollama", ollama_instance())
+    # under the scheduler: recorded timings exclude local queueing, and replays are still limited
+    return scheduler.scheduled(name, cassette.from_env(name, build))
+
+
+def _composite(name: str, pcfg: dict, providers: ProviderRegistry) -> object:
+    from providers.composite import CompositeProvider
+
+    return scheduler.scheduled(name, CompositeProvider.from_config(pcfg, providers))
+
+
+def _fanout(spec: dict, agents: AgentRegistry) -> Agent:
+    from providers.fanout import FanoutProvider
+
+    spec = dict(spec, provider=spec.get("provider", "fanout"))  # metric label
+    return Agent(spec, FanoutProvider.from_config(spec["fanout"], agents))
+
+
+def build_registries(path: str, models: Optional[Dict[str, str]] = None) -> AgentRegistry:
+    """Agents from the config at `path`; `models` maps a provider name to a model that replaces the configured one."""
+    cfg = read_config(path)
+    configure_limits(cfg)
+
+    providers = ProviderRegistry()
+    for name, module in discover_providers(cfg).items():
+        providers.register_lazy(name, lambda name=name, module=module: _instance(name, module))
+    for name, pcfg in (cfg.get("providers") or {}).items():
+        if (pcfg or {}).get("type") == "composite":
+            providers.register_lazy(name, lambda name=name, pcfg=pcfg: _composite(name, pcfg, providers))
 
-    agents = AgentRegistry()
-    for spec in cfg.get("agents", []) or []:
+    agents = AgentRegistry({k: v for k, v in cfg.items() if k not in ("agents", "providers")})
+    specs = cfg.get("agents", []) or []
+    for spec in specs:
+        if spec.get("fanout"):
+            continue
         prov_name = spec.get("provider", "qwen")
+        if models and prov_name in models:
+            spec = dict(spec, model=models[prov_name])
         agent = Agent(spec, providers.get(prov_name))
         agents.register(agent)
+    # fan-out agents call other agents, so they are built once those exist
+    for spec in specs:
+        if spec.get("fanout"):
+            agents.register(_fanout(spec, agents))
 
+    agents.routing_index()  # precompute at load time so the first turn doesn't pay for it
     return agents
 
@@ -1,18 +1,72 @@
-from typing import List, Optional, Dict
+from concurrent.futures import Future
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Dict, Tuple
 
 from .types import Message
-from .agent import Agent
+from .agent import Agent, is_error_reply
+from .stream import Delta
 from .registry import AgentRegistry
+from .summary import Summarizer
+from . import trace
 from router.triage import select_agent
 
 
 class ConversationManager:
-    def __init__(self, agents: AgentRegistry):
+    def __init__(self, agents: AgentRegistry, system_prompt: Optional[str] = None, max_history: Optional[int] = None):
         self.agents = agents
+        self.system_prompt = system_prompt
+        # hard cap on raw turns kept, for long-lived server sessions without a summarizer
+        self.max_history = max_history
         self.history: List[Message] = []
         self.active: Optional[str] = None
+        self.summary: Optional[str] = None
+        # called with a small record for every state change (see core.convlog.apply_record)
+        self.journal: Optional[Callable[[Dict], None]] = None
+        self._summarizer = Summarizer.from_config(agents)
+        # (future, number of leading history messages the summary will replace)
+        self._pending: Optional[Tuple["Future[str]", int]] = None
+
+    def _apply_summary(self) -> None:
+        if self._pending is None or not self._pending[0].done():
+            return
+        future, covered = self._pending
+        self._pending = None
+        try:
+            summary = future.result()
+        except Exception:
+            return  # keep the raw turns; the next turn schedules a new attempt
+        if not summary or is_error_reply(summary):
+            return
+        self.summary = summary
+        del self.history[:covered]
+        self._record({"op": "summary", "summary": summary, "covered": covered})
+
+    def _record(self, rec: Dict, required: bool = False) -> None:
+        if self.journal is None:
+            return
+        try:
+            self.journal(rec)
+        except Exception:
+            # a refused record makes the journal resync this session from `state` next time
+            # (see core.convlog); only a turn the caller is about to see must not be lost
+            if required:
+                raise
+
+    def set_system_prompt(self, prompt: Optional[str]) -> None:
+        if prompt != self.system_prompt:
+            self.system_prompt = prompt
+            self._record({"op": "system_prompt", "value": prompt})
+
+    def _maybe_compact(self) -> None:
+        if self._summarizer is None or self._pending is not None:
+            return
+        if not self._summarizer.due(self.history):
+            return
+        covered = len(self.history) - self._summarizer.keep_messages
+        self._pending = (self._summarizer.submit(self.summary, self.history[:covered]), covered)
 
     def _build_handover(self) -> str:
+        if self.summary:
+            return self.summary[:600]
         turns = self.history[-8:]  # approx 4 user/assistant pairs
         text = []
         for m in turns:
@@ -24,19 +78,111 @@ class ConversationManager:
             s = s[-600:]
         return s
 
-    def handle(self, user_text: str) -> str:
-        agent_id = select_agent(user_text, self.agents.all_specs(), self.active)
+    def state(self) -> Dict:
+        """Plain-data snapshot for persisting a session; a summary still in flight is dropped."""
+        return {
+            "history": list(self.history),
+            "active": self.active,
+            "summary": self.summary,
+            "system_prompt": self.system_prompt,
+        }
+
+    @classmethod
+    def from_state(cls, agents: AgentRegistry, state: Dict, max_history: Optional[int] = None) -> "ConversationManager":
+        cm = cls(agents, system_prompt=state.get("system_prompt"), max_history=max_history)
+        cm.history = list(state.get("history") or [])
+        cm.active = state.get("active") if state.get("active") in {s.get("id") for s in agents.all_specs()} else None
+        cm.summary = state.get("summary")
+        return cm
+
+    def _prepare(self, user_text: str) -> Tuple[str, Agent, List[Message]]:
+        self._apply_summary()
+        with trace.span("route"):
+            agent_id = select_agent(user_text, self.agents.all_specs(), self.active, self.agents.routing_index())
         handover = None
         if self.active and agent_id != self.active and self.history:
-            handover = self._build_handover()
+            with trace.span("handover"):
+                handover = self._build_handover()
 
         agent: Agent = self.agents.get(agent_id)
-        msgs = self.history + [{"role": "user", "content": user_text}]
-        msgs = agent.before_call(msgs, {"handover": handover} if handover else None)
-        reply = agent.call(msgs)
+        # On an agent switch the handover already carries the summary
+        prefix = []
+        if self.system_prompt:
+            prefix.append({"role": "system", "content": self.system_prompt})
+        if self.summary and not handover:
+            prefix.append({"role": "system", "content": f"Summary of earlier conversation: {self.summary}"})
+        msgs = prefix + self.history + [{"role": "user", "content": user_text}]
+        with trace.span("before_call"):
+            msgs = agent.before_call(msgs, {"handover": handover} if handover else None)
+        with trace.span("context_fit"):
+            msgs = agent.window.fit(msgs)
+        return agent_id, agent, msgs
+
+    def _commit(self, agent_id: str, agent: Agent, user_text: str, reply: str) -> None:
+        with trace.span("commit"):
+            self._commit_turn(agent_id, agent, user_text, reply)
+
+    def _commit_turn(self, agent_id: str, agent: Agent, user_text: str, reply: str) -> None:
+        active = self.active
         self.history.append({"role": "user", "content": user_text})
         self.history.append({"role": "assistant", "content": reply})
-        agent.after_call(user_text, reply)
         self.active = agent_id
+        try:
+            self._record({"op": "turn", "agent": agent_id, "user": user_text, "reply": reply}, required=True)
+        except Exception:
+            # not journaled, so not kept: the caller gets the error and can resend
+            del self.history[-2:]
+            self.active = active
+            raise
+        agent.after_call(user_text, reply)
+        self._maybe_compact()
+        if self.max_history and len(self.history) > self.max_history:
+            drop = len(self.history) - self.max_history
+            del self.history[:drop]
+            self._record({"op": "trim", "drop": drop})
+            if self._pending is not None:
+                future, covered = self._pending
+                self._pending = (future, covered - drop) if covered > drop else None
+
+    def handle(self, user_text: str) -> str:
+        agent_id, agent, msgs = self._prepare(user_text)
+        with trace.span("agent_call"):
+            reply = agent.call(msgs)
+        # a failed turn stays out of the history, like a failed stream
+        if not is_error_reply(reply):
+            self._commit(agent_id, agent, user_text, reply)
+        return reply
+
+    async def ahandle(self, user_text: str) -> str:
+        agent_id, agent, msgs = self._prepare(user_text)
+        with trace.span("agent_call"):
+            reply = await agent.acall(msgs)
+        if not is_error_reply(reply):
+            self._commit(agent_id, agent, user_text, reply)
         return reply
 
+    def stream(self, user_text: str) -> Iterator[Delta]:
+        """Sync twin of `astream`, for the CLI."""
+        agent_id, agent, msgs = self._prepare(user_text)
+        parts: List[str] = []
+        failed = False
+        for delta in agent.stream(msgs):
+            if delta.text:
+                parts.append(delta.text)
+            failed = failed or delta.finish_reason == "error"
+            yield delta
+        if not failed:
+            self._commit(agent_id, agent, user_text, "".join(parts))
+
+    async def astream(self, user_text: str) -> AsyncIterator[Delta]:
+        """Stream the reply; the turn joins the history only once the stream completes cleanly."""
+        agent_id, agent, msgs = self._prepare(user_text)
+        parts: List[str] = []
+        failed = False
+        async for delta in agent.astream(msgs):
+            if delta.text:
+                parts.append(delta.text)
+            failed = failed or delta.finish_reason == "error"
+            yield delta
+        if not failed:
+            self._commit(agent_id, agent, user_text, "".join(parts))
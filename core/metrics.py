@@ -0,0 +1,263 @@
+"""In-process metrics exported in the Prometheus text format.
+
+Recording is lock-free on the hot path. Each thread updates its own shard (a
+plain dict keyed by metric and label values), so a counter increment is one
+dict lookup and an add, with no lock and no contention. Shards are only
+merged when `render` is called, e.g. by ``GET /api/metrics``. Gauges are
+stored as per-thread deltas, so an increment on one thread and the matching
+decrement on another still sum correctly.
+
+Agents record requests, errors, latency, time-to-first-token, tokens/sec,
+cache lookups and in-flight calls labelled by agent, provider and model.
+Schedulers record queue waits, and the web server records per-route HTTP
+metrics. `register_collector` adds series computed at scrape time, such as
+scheduler occupancy and circuit breaker state.
+"""
+
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0, 320.0)
+
+_local = threading.local()
+_shards: List[Dict] = []
+_shards_lock = threading.Lock()
+_metrics: List["_Metric"] = []
+_collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]] = []
+
+
+def _shard() -> Dict:
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = {}
+        with _shards_lock:  # once per thread
+            _shards.append(shard)
+        return shard
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        _metrics.append(self)
+
+    def _merged(self) -> Dict[Tuple[str, ...], object]:
+        raise NotImplementedError
+
+    def _lines(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, value: float = 1.0) -> None:
+        shard = _shard()
+        key = (self, labels)
+        shard[key] = shard.get(key, 0.0) + value
+
+    def _merged(self) -> Dict[Tuple[str, ...], float]:
+        out: Dict[Tuple[str, ...], float] = {}
+        for shard in _snapshot():
+            for (metric, labels), value in shard:
+                if metric is self:
+                    out[labels] = out.get(labels, 0.0) + value
+        return out
+
+    def value(self, *labels: str) -> float:
+        return self._merged().get(labels, 0.0)
+
+    def _lines(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in sorted(self._merged().items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def add(self, delta: float, *labels: str) -> None:
+        self.inc(*labels, value=delta)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = _shard()
+        key = (self, labels)
+        counts = shard.get(key)
+        if counts is None:
+            # one slot per bucket, +Inf, then sum and count
+            counts = shard[key] = [0.0] * (len(self.buckets) + 3)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def _merged(self) -> Dict[Tuple[str, ...], List[float]]:
+        out: Dict[Tuple[str, ...], List[float]] = {}
+        for shard in _snapshot():
+            for (metric, labels), counts in shard:
+                if metric is self:
+                    total = out.setdefault(labels, [0.0] * len(counts))
+                    for i, c in enumerate(list(counts)):
+                        total[i] += c
+        return out
+
+    def count(self, *labels: str) -> int:
+        counts = self._merged().get(labels)
+        return int(counts[-1]) if counts else 0
+
+    def _lines(self) -> List[str]:
+        lines: List[str] = []
+        for labels, counts in sorted(self._merged().items()):
+            running = 0.0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                running += c
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {_num(running)}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(counts[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {_num(counts[-1])}")
+        return lines
+
+
+def _snapshot() -> List[List]:
+    with _shards_lock:
+        shards = list(_shards)
+    # dict -> list copies run without releasing the GIL, so writers never see a torn dict
+    return [list(s.items()) for s in shards]
+
+
+def register_collector(fn: Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]) -> None:
+    """`fn()` yields (name, type, help, labels, value) samples computed at scrape time."""
+    _collectors.append(fn)
+
+
+def render() -> str:
+    out: List[str] = []
+    for metric in _metrics:
+        lines = metric._lines()
+        if lines:
+            out += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"] + lines
+    # samples of one family must be contiguous, whatever order collectors yield them in
+    families: Dict[str, List[str]] = {}
+    for collect in _collectors:
+        for name, kind, help, labels, value in collect():
+            if name not in families:
+                families[name] = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            families[name].append(f"{name}{_labels(list(labels), list(labels.values()))} {_num(value)}")
+    for lines in families.values():
+        out += lines
+    return "\n".join(out) + "\n"
+
+
+def reset() -> None:
+    """Zero every series (tests)."""
+    with _shards_lock:
+        for shard in _shards:
+            shard.clear()
+
+
+AGENT_LABELS = ("agent", "provider", "model")
+
+REQUESTS = Counter("chat_requests_total", "Chat calls started.", AGENT_LABELS)
+ERRORS = Counter("chat_errors_total", "Chat calls that raised or returned an error reply.", AGENT_LABELS)
+LATENCY = Histogram("chat_request_duration_seconds", "End-to-end chat call latency.", AGENT_LABELS)
+TTFT = Histogram("chat_time_to_first_token_seconds", "Time from call start to the first streamed token.", AGENT_LABELS)
+TOKENS_PER_SEC = Histogram("chat_tokens_per_second", "Decode throughput of streamed replies.", AGENT_LABELS, RATE_BUCKETS)
+IN_FLIGHT = Gauge("chat_in_flight", "Chat calls currently running.", AGENT_LABELS)
+CACHE = Counter("chat_cache_lookups_total", "Reply cache lookups by result (hit or miss).", ("agent", "result"))
+QUEUE_WAIT = Histogram("scheduler_queue_wait_seconds", "Time spent waiting for a provider slot.", ("provider",))
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency, until the last body byte is sent.", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_in_flight", "HTTP requests being handled.", ("method",))
+
+
+def _cache_ratio():
+    lookups: Dict[str, List[float]] = {}
+    for (agent, result), value in CACHE._merged().items():
+        lookups.setdefault(agent, [0.0, 0.0])[result == "hit"] += value
+    for agent, (misses, hits) in sorted(lookups.items()):
+        if hits + misses:
+            yield "chat_cache_hit_ratio", "gauge", "Share of cache lookups that were hits.", {"agent": agent}, hits / (hits + misses)
+
+
+register_collector(_cache_ratio)
+
+
+class track:
+    """Times one chat call: counts it, tracks it as in flight and records latency and errors.
+
+    Usable around sync and async code alike (`__enter__`/`__exit__` never block).
+    """
+
+    __slots__ = ("labels", "start", "first", "tokens", "failed")
+
+    def __init__(self, agent: str, provider: str, model: str):
+        self.labels = (agent, provider, model)
+        self.first: Optional[float] = None
+        self.tokens = 0
+        self.failed = False
+
+    def __enter__(self) -> "track":
+        REQUESTS.inc(*self.labels)
+        IN_FLIGHT.add(1, *self.labels)
+        self.start = time.perf_counter()
+        return self
+
+    def fail(self) -> None:
+        self.failed = True
+
+    def reply(self, text: str) -> str:
+        """Mark string replies like ``[error:qwen] ...`` (providers that don't raise) as errors."""
+        if isinstance(text, str) and text.startswith("[error"):
+            self.failed = True
+        return text
+
+    def delta(self, delta) -> None:
+        if delta.text:
+            if self.first is None:
+                self.first = time.perf_counter()
+                TTFT.observe(self.first - self.start, *self.labels)
+            self.tokens += 1
+        if delta.usage and delta.usage.get("completion_tokens"):
+            self.tokens = int(delta.usage["completion_tokens"])
+        if delta.finish_reason == "error":
+            self.failed = True
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = time.perf_counter()
+        IN_FLIGHT.add(-1, *self.labels)
+        LATENCY.observe(end - self.start, *self.labels)
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.failed = True
+        if self.failed:
+            ERRORS.inc(*self.labels)
+        elif self.first is not None and end > self.first and self.tokens:
+            TOKENS_PER_SEC.observe(self.tokens / (end - self.first), *self.labels)
@@ -1,30 +1,61 @@
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional
 
 from .agent import Agent
 from .types import AgentSpec
+from router.index import RouterIndex
 
 
 class ProviderRegistry:
     def __init__(self):
         self._providers: Dict[str, object] = {}
+        self._factories: Dict[str, Callable[[], object]] = {}
 
     def register(self, name: str, provider: object) -> None:
         self._providers[name] = provider
+        self._factories.pop(name, None)
+
+    def register_lazy(self, name: str, factory: Callable[[], object]) -> None:
+        """Build (and import) the provider only when something first asks for it."""
+        if name not in self._providers:
+            self._factories[name] = factory
 
     def get(self, name: str) -> object:
+        if name not in self._providers and name in self._factories:
+            self._providers[name] = self._factories.pop(name)()
         return self._providers[name]
 
+    def names(self) -> List[str]:
+        return sorted(set(self._providers) | set(self._factories))
+
+    def loaded(self) -> List[str]:
+        return sorted(self._providers)
+
 
 class AgentRegistry:
-    def __init__(self):
+    def __init__(self, config: Optional[Dict] = None):
         self._agents: Dict[str, Agent] = {}
         self._specs: Dict[str, AgentSpec] = {}
+        # Top-level agents.yml settings other than the agent list (default, summary, ...)
+        self.config: Dict = config or {}
+        self._router: Optional[RouterIndex] = None
 
     def register(self, agent: Agent) -> None:
         spec = agent.spec
         aid = spec.get("id", "")
         self._agents[aid] = agent
         self._specs[aid] = spec
+        self._router = None
+
+    def routing_index(self) -> RouterIndex:
+        # Built once per registry change, so per-turn routing is just lookups
+        if self._router is None:
+            cfg = self.config.get("router") or {}
+            self._router = RouterIndex(
+                self.all_specs(),
+                threshold=float(cfg.get("threshold", 0.6)),
+                default=self.config.get("default"),
+            )
+        return self._router
 
     def get(self, agent_id: str) -> Agent:
         return self._agents[agent_id]
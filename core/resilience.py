@@ -0,0 +1,228 @@
+"""Retries with capped, jittered backoff and per-upstream circuit breakers.
+
+Providers wrap each upstream request in `call`/`acall` with the upstream's
+name ("openrouter", "ollama", "openai"). Transient failures (connection
+errors, timeouts, 408/425/429/5xx) are retried, honouring ``Retry-After``.
+Consecutive transient failures open that upstream's breaker; while open,
+calls fail fast with `CircuitOpenError` so a composite provider can move on
+to its fallback. After ``reset_timeout`` one probe request is let through
+(half-open) and its outcome closes or re-opens the breaker.
+"""
+
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+from . import metrics
+
+T = TypeVar("T")
+
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"circuit open for {name}; retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def _status(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(exc: BaseException) -> bool:
+    status = _status(exc)
+    if status is not None:
+        return status in TRANSIENT_STATUS
+    if isinstance(exc, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    # SDK errors that wrap transport failures (e.g. openai.APIConnectionError)
+    return type(exc).__name__ in {"APIConnectionError", "APITimeoutError"}
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None  # unparseable hint: fall back to the backoff schedule
+    return max(0.0, when.timestamp() - time.time()) if when else None
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.25, max_delay: float = 4.0, max_retry_after: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt: int, exc: BaseException) -> Optional[float]:
+        """Seconds to wait before retry `attempt` (1-based), or None to give up."""
+        if attempt >= self.max_attempts or not is_transient(exc):
+            return None
+        hinted = retry_after(exc)
+        if hinted is not None:
+            return None if hinted > self.max_retry_after else hinted
+        # full jitter keeps a crowd of clients from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+DEFAULT_POLICY = RetryPolicy(
+    max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "3")),
+    base_delay=float(os.getenv("RETRY_BASE_DELAY", "0.25")),
+    max_delay=float(os.getenv("RETRY_MAX_DELAY", "4.0")),
+)
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            waited = time.monotonic() - self.opened_at
+            if self.state == self.OPEN and waited >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(self.name, max(0.0, self.reset_timeout - waited))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self) -> Dict:
+        return {"state": self.state, "failures": self.failures, "trips": self.trips}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name: str) -> CircuitBreaker:
+    b = _breakers.get(name)
+    if b is None:
+        with _breakers_lock:
+            b = _breakers.get(name)
+            if b is None:
+                b = _breakers[name] = CircuitBreaker(
+                    name,
+                    failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+                    reset_timeout=float(os.getenv("CIRCUIT_RESET_SECONDS", "30")),
+                )
+    return b
+
+
+def breaker_states() -> Dict[str, Dict]:
+    return {name: b.snapshot() for name, b in list(_breakers.items())}
+
+
+def _collect_breakers():
+    for name, snap in sorted(breaker_states().items()):
+        yield "circuit_open", "gauge", "1 while the upstream's circuit breaker is open.", {"upstream": name}, float(snap["state"] == CircuitBreaker.OPEN)
+        yield "circuit_trips_total", "counter", "Times the upstream's circuit breaker opened.", {"upstream": name}, snap["trips"]
+
+
+metrics.register_collector(_collect_breakers)
+
+
+def reset() -> None:
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def _settle(b: CircuitBreaker, exc: BaseException) -> None:
+    # Only upstream health problems count against the breaker, not e.g. a 400 for a bad request
+    if is_transient(exc):
+        b.record_failure()
+    else:
+        b.record_success()
+
+
+def call(name: str, fn: Callable[[], T], policy: Optional[RetryPolicy] = None) -> T:
+    policy = policy or DEFAULT_POLICY
+    b = breaker(name)
+    attempt = 0
+    while True:
+        attempt += 1
+        b.before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            _settle(b, e)
+            wait = policy.delay(attempt, e)
+            if wait is None or b.state == b.OPEN:
+                raise
+            time.sleep(wait)
+            continue
+        b.record_success()
+        return result
+
+
+async def acall(name: str, fn: Callable[[], Awaitable[T]], policy: Optional[RetryPolicy] = None) -> T:
+    policy = policy or DEFAULT_POLICY
+    b = breaker(name)
+    attempt = 0
+    while True:
+        attempt += 1
+        b.before_call()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            b.release()  # cancellation says nothing about upstream health
+            raise
+        except Exception as e:
+            _settle(b, e)
+            wait = policy.delay(attempt, e)
+            if wait is None or b.state == b.OPEN:
+                raise
+            await asyncio.sleep(wait)
+            continue
+        b.record_success()
+        return result
@@ -0,0 +1,335 @@
+"""Per-provider admission control: max in-flight slots, a token bucket and a queue that is fair across callers."""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Deque, Dict, Iterator, Optional
+
+from .stream import Delta
+from . import metrics, trace
+
+current_caller: ContextVar[str] = ContextVar("current_caller", default="anonymous")
+
+
+class QueueFullError(RuntimeError):
+    def __init__(self, name: str, retry_in: float = 1.0):
+        super().__init__(f"{name} is busy; retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token; returns how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class _Waiter:
+    def __init__(self, caller: str):
+        self.caller = caller
+        self.granted = False
+        self.event: Optional[threading.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional[asyncio.Future] = None
+
+    def grant(self) -> None:
+        self.granted = True
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class Scheduler:
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int = 8,
+        max_queue: int = 64,
+        queue_timeout: float = 30.0,
+        rate: float = 0.0,
+        burst: Optional[float] = None,
+    ):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _options(cfg: Dict) -> Dict:
+        return {
+            "max_in_flight": int(cfg.get("max_in_flight", 8)),
+            "max_queue": int(cfg.get("max_queue", 64)),
+            "queue_timeout": float(cfg.get("queue_timeout", 30.0)),
+            "rate": float(cfg.get("rate", 0.0)),
+            "burst": float(cfg["burst"]) if cfg.get("burst") is not None else None,
+        }
+
+    @classmethod
+    def from_config(cls, name: str, cfg: Dict) -> "Scheduler":
+        return cls(name, **cls._options(cfg))
+
+    def reconfigure(self, cfg: Dict) -> None:
+        """Apply new limits in place, so providers already wrapped with this scheduler pick them up."""
+        opts = self._options(cfg)
+        with self._lock:
+            self.max_in_flight = max(1, opts["max_in_flight"])
+            self.max_queue = opts["max_queue"]
+            self.queue_timeout = opts["queue_timeout"]
+            self.bucket = TokenBucket(opts["rate"], opts["burst"]) if opts["rate"] > 0 else None
+            self._dispatch()
+
+    # --- slot bookkeeping -------------------------------------------------
+
+    def saturated(self) -> bool:
+        return self.queued >= self.max_queue and self.in_flight >= self.max_in_flight
+
+    def _enqueue(self, waiter: _Waiter) -> bool:
+        """Take a free slot (True) or queue `waiter` (False); raises when the queue is full."""
+        with self._lock:
+            if self.in_flight < self.max_in_flight and not self.queued:
+                self.in_flight += 1
+                return True
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(self.name)
+            self._queues.setdefault(waiter.caller, deque()).append(waiter)
+            self.queued += 1
+            return False
+
+    def _dispatch(self) -> None:
+        # round-robin over callers: serve one waiter, then move that caller to the back
+        while self.in_flight < self.max_in_flight and self._queues:
+            caller, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(caller)
+            else:
+                del self._queues[caller]
+            self.queued -= 1
+            self.in_flight += 1
+            waiter.grant()
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Drop a waiter that gave up; True if it had been granted a slot meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            queue = self._queues[waiter.caller]
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.caller]
+            self.queued -= 1
+            return False
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def _timed_out(self) -> QueueFullError:
+        with self._lock:
+            self.rejected += 1
+        return QueueFullError(self.name)
+
+    def _waited(self, start: float) -> None:
+        waited = time.perf_counter() - start
+        metrics.QUEUE_WAIT.observe(waited, self.name)
+        tr = trace.current()
+        if tr is not None:
+            tr.add("queue_wait", start, waited)
+
+    # --- sync -------------------------------------------------------------
+
+    def acquire(self, caller: Optional[str] = None) -> None:
+        start = time.perf_counter()
+        waiter = _Waiter(caller or current_caller.get())
+        waiter.event = threading.Event()
+        if not self._enqueue(waiter):
+            if not waiter.event.wait(self.queue_timeout) and not self._abandon(waiter):
+                raise self._timed_out()
+        if self.bucket is not None:
+            time.sleep(self.bucket.reserve())
+        self._waited(start)
+
+    @contextmanager
+    def slot(self, caller: Optional[str] = None) -> Iterator[None]:
+        self.acquire(caller)
+        try:
+            yield
+        finally:
+            self.release()
+
+    # --- async ------------------------------------------------------------
+
+    async def aacquire(self, caller: Optional[str] = None) -> None:
+        start = time.perf_counter()
+        waiter = _Waiter(caller or current_caller.get())
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        if not self._enqueue(waiter):
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    raise self._timed_out()
+            except asyncio.CancelledError:
+                if self._abandon(waiter):
+                    self.release()
+                raise
+        if self.bucket is not None:
+            try:
+                await asyncio.sleep(self.bucket.reserve())
+            except asyncio.CancelledError:
+                self.release()
+                raise
+        self._waited(start)
+
+    @asynccontextmanager
+    async def aslot(self, caller: Optional[str] = None) -> AsyncIterator[None]:
+        await self.aacquire(caller)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+        }
+
+
+class ScheduledProvider:
+    """Wraps a provider so every chat/achat/astream call holds a scheduler slot."""
+
+    def __init__(self, provider: object, scheduler: Scheduler):
+        self.provider = provider
+        self.scheduler = scheduler
+
+    def __getattr__(self, name: str):
+        return getattr(self.provider, name)
+
+    def chat(self, *args, **kw):
+        with self.scheduler.slot():
+            return self.provider.chat(*args, **kw)
+
+    def stream(self, *args, **kw) -> Iterator[Delta]:
+        with self.scheduler.slot():
+            stream = getattr(self.provider, "stream", None)
+            if stream is None:
+                yield Delta(text=self.provider.chat(*args, **kw), finish_reason="stop")
+                return
+            yield from stream(*args, **kw)
+
+    async def _achat(self, *args, **kw):
+        achat = getattr(self.provider, "achat", None)
+        if achat is None:
+            return await asyncio.to_thread(self.provider.chat, *args, **kw)
+        return await achat(*args, **kw)
+
+    async def achat(self, *args, **kw):
+        async with self.scheduler.aslot():
+            return await self._achat(*args, **kw)
+
+    async def astream(self, *args, **kw) -> AsyncIterator[Delta]:
+        # the slot is held until the stream finishes or is closed
+        async with self.scheduler.aslot():
+            astream = getattr(self.provider, "astream", None)
+            if astream is None:
+                yield Delta(text=await self._achat(*args, **kw), finish_reason="stop")
+                return
+            async for delta in astream(*args, **kw):
+                yield delta
+
+
+_schedulers: Dict[str, Scheduler] = {}
+_env_limits: Optional[Dict[str, Dict]] = None
+
+
+def _parse_env_limits() -> Dict[str, Dict]:
+    global _env_limits
+    if _env_limits is None:
+        limits: Dict[str, Dict] = {}
+        for item in os.getenv("PROVIDER_LIMITS", "").split(";"):
+            name, _, pairs = item.strip().partition(":")
+            for pair in pairs.split(","):
+                key, _, value = pair.strip().partition("=")
+                if name and key and value:
+                    limits.setdefault(name.strip(), {})[key.strip()] = value.strip()
+        _env_limits = limits
+    return _env_limits
+
+
+def configure(name: str, cfg: Optional[Dict] = None) -> Scheduler:
+    merged = dict(cfg or {}, **_parse_env_limits().get(name, {}))
+    sched = _schedulers.get(name)
+    if sched is None:
+        sched = _schedulers[name] = Scheduler.from_config(name, merged)
+    else:
+        sched.reconfigure(merged)
+    return sched
+
+
+def get(name: str) -> Optional[Scheduler]:
+    sched = _schedulers.get(name)
+    if sched is None and name in _parse_env_limits():
+        sched = configure(name)
+    return sched
+
+
+def scheduled(name: str, provider: object) -> object:
+    """`provider` behind the scheduler configured for `name`, or unchanged if none is."""
+    sched = get(name)
+    return ScheduledProvider(provider, sched) if sched is not None else provider
+
+
+def states() -> Dict[str, Dict]:
+    return {name: s.snapshot() for name, s in list(_schedulers.items())}
+
+
+def _collect_schedulers():
+    for name, snap in sorted(states().items()):
+        labels = {"provider": name}
+        yield "scheduler_in_flight", "gauge", "Provider calls holding a slot.", labels, snap["in_flight"]
+        yield "scheduler_queued", "gauge", "Provider calls waiting for a slot.", labels, snap["queued"]
+        yield "scheduler_rejected_total", "counter", "Provider calls rejected by a full queue or timeout.", labels, snap["rejected"]
+
+
+metrics.register_collector(_collect_schedulers)
+
+
+def reset() -> None:
+    global _env_limits
+    _schedulers.clear()
+    _env_limits = None
@@ -0,0 +1,226 @@
+"""Semantic reply cache: nearest-neighbour lookup over embedded user turns.
+
+The last user message is embedded (by default with `HashingEmbedder`, a
+deterministic offline hashing-trick embedder) into a fixed-capacity float32
+matrix. Lookup is one matrix-vector product of cosine scores; a reply is
+reused when the best score reaches the agent's threshold. With a ``path`` the
+matrix is a memory-mapped ``.npy`` file plus a JSONL sidecar of replies, so a
+restart reopens the index instead of re-embedding everything.
+
+The ``model`` argument of `lookup`/`add` partitions the index: a query only
+matches entries added under the same value. `core.agent.Agent` passes the
+agent, model and system prompt there, and skips the cache for turns that
+follow an assistant reply, whose meaning depends on the history.
+
+Agents opt in via ``policies.semantic_cache`` in agents.yml, e.g.
+``semantic_cache: { threshold: 0.92, capacity: 4096, path: ".run/semcache" }``;
+``embedder: "module:function"`` swaps in any text -> unit vector function of
+the configured ``dim``. Requires numpy.
+"""
+
+import hashlib
+import importlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+# numpy is slow to import, so it is loaded on first use (see `load_numpy`)
+np = None  # type: ignore
+_numpy_missing = False
+
+from .types import Message
+
+_WORD = re.compile(r"\w+")
+
+
+def load_numpy():
+    """The numpy module, imported on first call; None if it is not installed."""
+    global np, _numpy_missing
+    if np is None and not _numpy_missing:
+        try:
+            import numpy
+        except Exception:
+            _numpy_missing = True
+        else:
+            np = numpy
+    return np
+
+
+def _hash64(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashingEmbedder:
+    """Signed feature hashing of unigrams and bigrams, L2-normalized."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        load_numpy()
+
+    def __call__(self, text: str) -> "np.ndarray":
+        words = _WORD.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for f in features:
+            h = _hash64(f)
+            vec[h % self.dim] += 1.0 if h >> 63 else -1.0
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+
+
+def last_user_text(messages: List[Message]) -> str:
+    for m in reversed(messages):
+        if m.get("role") == "user":
+            return m.get("content") or ""
+    return ""
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        capacity: int = 4096,
+        dim: int = 256,
+        path: Optional[str] = None,
+        embedder: Optional[Callable[[str], "np.ndarray"]] = None,
+    ):
+        if load_numpy() is None:
+            raise RuntimeError("semantic_cache requires numpy. Run: pip install numpy")
+        self.threshold = threshold
+        self.capacity = capacity
+        self.dim = dim
+        self.path = path
+        self.embed = embedder or HashingEmbedder(dim)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._models = np.zeros(capacity, dtype=np.int64)
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._replies: List[Optional[str]] = [None] * capacity
+        self._meta_lines = 0
+        if path:
+            self._vectors = self._open_matrix(path + ".npy")
+            self._load_meta(path + ".jsonl")
+        else:
+            self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+
+    def _open_matrix(self, file: str) -> "np.ndarray":
+        if os.path.dirname(file):
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+        if os.path.exists(file):
+            mat = np.lib.format.open_memmap(file, mode="r+")
+            if mat.shape == (self.capacity, self.dim) and mat.dtype == np.float32:
+                return mat
+            del mat  # capacity/dim changed in config: start over
+            if os.path.exists(self.path + ".jsonl"):
+                os.remove(self.path + ".jsonl")
+        return np.lib.format.open_memmap(file, mode="w+", dtype=np.float32, shape=(self.capacity, self.dim))
+
+    def _load_meta(self, file: str) -> None:
+        if not os.path.exists(file):
+            return
+        with open(file, "r", encoding="utf-8") as f:
+            for line in f:
+                self._meta_lines += 1
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn final line after a crash
+                row = rec["row"]
+                if 0 <= row < self.capacity:
+                    self._models[row] = rec["model"]
+                    self._replies[row] = rec["reply"]
+                    self._last_used[row] = rec["ts"]
+                    self._valid[row] = True
+
+    def lookup(self, model: str, text: str) -> Optional[str]:
+        return self.lookup_many(model, [text])[0]
+
+    def lookup_many(self, model: str, texts: List[str]) -> List[Optional[str]]:
+        queries = np.stack([self.embed(t) for t in texts])
+        mid = _hash64(model) >> 1
+        with self._lock:
+            mask = self._valid & (self._models == mid)
+            if not mask.any():
+                self.misses += len(texts)
+                return [None] * len(texts)
+            # rows are unit vectors, so the dot product is the cosine similarity
+            scores = queries @ self._vectors.T
+            scores[:, ~mask] = -1.0
+            best = scores.argmax(axis=1)
+            out: List[Optional[str]] = []
+            now = time.time()
+            for qi, row in enumerate(best):
+                if scores[qi, row] >= self.threshold:
+                    self._last_used[row] = now
+                    self.hits += 1
+                    out.append(self._replies[row])
+                else:
+                    self.misses += 1
+                    out.append(None)
+            return out
+
+    def add(self, model: str, text: str, reply: str) -> None:
+        vec = self.embed(text)
+        mid = _hash64(model) >> 1
+        with self._lock:
+            free = np.flatnonzero(~self._valid)
+            # evict the least recently used row once full
+            row = int(free[0]) if free.size else int(self._last_used.argmin())
+            now = time.time()
+            self._vectors[row] = vec
+            self._models[row] = mid
+            self._replies[row] = reply
+            self._last_used[row] = now
+            self._valid[row] = True
+            if self.path:
+                # the vector must be on disk before a meta row points at it, or a crash
+                # leaves a reply indexed under a zeroed vector
+                self.flush()
+                self._append_meta({"row": row, "model": int(mid), "ts": now, "reply": reply})
+
+    def _append_meta(self, rec: Dict) -> None:
+        with open(self.path + ".jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._meta_lines += 1
+        if self._meta_lines > 2 * self.capacity:
+            self._compact_meta()
+
+    def _compact_meta(self) -> None:
+        tmp = self.path + ".jsonl.tmp"
+        rows = np.flatnonzero(self._valid)
+        with open(tmp, "w", encoding="utf-8") as f:
+            for row in rows:
+                rec = {"row": int(row), "model": int(self._models[row]), "ts": float(self._last_used[row]), "reply": self._replies[row]}
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path + ".jsonl")
+        self._meta_lines = len(rows)
+
+    def flush(self) -> None:
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+
+    def __len__(self) -> int:
+        return int(self._valid.sum())
+
+
+def _resolve(ref: str) -> Callable:
+    module, _, attr = ref.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def build_semantic_cache(cfg: Optional[Dict]) -> Optional[SemanticCache]:
+    if not cfg:
+        return None
+    embedder = cfg.get("embedder")
+    return SemanticCache(
+        threshold=float(cfg.get("threshold", 0.92)),
+        capacity=int(cfg.get("capacity", 4096)),
+        dim=int(cfg.get("dim", 256)),
+        path=cfg.get("path"),
+        embedder=_resolve(embedder) if embedder else None,
+    )
@@ -0,0 +1,247 @@
+"""Server-side conversation sessions, so clients send only the new message.
+
+`SessionStore` keeps one `ConversationManager` per session id in an LRU with
+an idle TTL and a hard cap on live sessions. Evicted sessions are counted and,
+when a ``path`` is configured, spilled to SQLite and transparently restored on
+their next request. With a `ConversationLog` every turn is also journaled as
+it happens, so sessions survive a restart and come back on first access.
+"""
+
+import asyncio
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .convlog import ConversationLog
+from .manager import ConversationManager
+from .registry import AgentRegistry
+
+_VALID_ID = re.compile(r"^[A-Za-z0-9_-]{8,128}$")
+
+
+def new_session_id() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def valid_session_id(sid: Optional[str]) -> bool:
+    return bool(sid) and bool(_VALID_ID.match(sid))
+
+
+class Session:
+    def __init__(self, sid: str, manager: ConversationManager):
+        self.id = sid
+        self.manager = manager
+        # one turn at a time per session; concurrent sends would interleave history
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionSpill:
+    def __init__(self, path: str, max_age: float = 7 * 24 * 3600):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def load(self, sid: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state FROM sessions WHERE id = ? AND updated > ?", (sid, time.time() - self.max_age)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, sid: str, state: Dict) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (id, state, updated) VALUES (?, ?, ?)",
+                (sid, json.dumps(state, ensure_ascii=False), time.time()),
+            )
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._db.execute("DELETE FROM sessions WHERE updated <= ?", (time.time() - self.max_age,))
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class SessionStore:
+    def __init__(
+        self,
+        agents: AgentRegistry,
+        max_sessions: int = 1000,
+        idle_ttl: float = 3600.0,
+        max_messages: Optional[int] = 200,
+        path: Optional[str] = None,
+        log: Optional[ConversationLog] = None,
+    ):
+        self.agents = agents
+        self.log = log
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_messages = max_messages
+        self.spill = SessionSpill(path) if path else None
+        self.evictions = 0
+        self.restored = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        # evicted states still being written to the spill; a restore reads them from here
+        self._spilling: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, sid: Optional[str] = None, system_prompt: Optional[str] = None) -> Session:
+        """The session for `sid`, restored from the spill or created fresh (with a new id if `sid` is unusable)."""
+        minted = not valid_session_id(sid)
+        sid = new_session_id() if minted else sid
+        session = self._live(sid)
+        if session is None:
+            session = self._admit(sid, self._restore(sid, minted))
+        session = self._touch(session, system_prompt)
+        self._spill(self._evict(session.last_used))
+        return session
+
+    async def aget(self, sid: Optional[str] = None, system_prompt: Optional[str] = None) -> Session:
+        """`get` for async handlers: restoring from the log or spill runs on a worker thread, off the loop."""
+        minted = not valid_session_id(sid)
+        sid = new_session_id() if minted else sid
+        session = self._live(sid)
+        if session is None:
+            # a freshly minted id has nothing stored, so there is nothing to look up
+            manager = self._restore(sid, True) if minted else await asyncio.to_thread(self._restore, sid)
+            session = self._admit(sid, manager)
+        session = self._touch(session, system_prompt)
+        evicted = self._evict(session.last_used)
+        if evicted:
+            await asyncio.to_thread(self._spill, evicted)
+        return session
+
+    def _live(self, sid: str) -> Optional[Session]:
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is not None:
+                self._sessions.move_to_end(sid)
+        return session
+
+    def _admit(self, sid: str, manager: ConversationManager) -> Session:
+        with self._lock:
+            # another request may have created it while we were reading the spill
+            session = self._sessions.setdefault(sid, Session(sid, manager))
+            self._sessions.move_to_end(sid)
+        return session
+
+    def _touch(self, session: Session, system_prompt: Optional[str]) -> Session:
+        if system_prompt is not None:
+            session.manager.set_system_prompt(system_prompt or None)
+        session.last_used = time.monotonic()
+        return session
+
+    def _restore(self, sid: str, minted: bool = False) -> ConversationManager:
+        state = None
+        if not minted:
+            with self._lock:
+                state = self._spilling.get(sid)
+            # the log has every journaled turn; a spill row may predate a crash
+            if state is None and self.log is not None:
+                state = self.log.load(sid)
+            if state is None and self.spill is not None:
+                state = self.spill.load(sid)
+        if state is not None:
+            manager = ConversationManager.from_state(self.agents, state, max_history=self.max_messages)
+            self.restored += 1
+        else:
+            manager = ConversationManager(self.agents, max_history=self.max_messages)
+        if self.log is not None:
+            log = self.log
+            manager.journal = lambda rec: log.append(sid, rec, manager.state)
+        return manager
+
+    def _evict(self, now: float) -> List[Tuple[str, Dict]]:
+        """Drop idle and over-cap sessions; returns the (id, state) pairs the caller must `_spill`."""
+        evicted = []
+        with self._lock:
+            while self._sessions:
+                sid, oldest = next(iter(self._sessions.items()))
+                idle = now - oldest.last_used > self.idle_ttl
+                if not idle and len(self._sessions) <= self.max_sessions:
+                    break
+                if oldest.lock.locked():
+                    # mid-turn; refresh so the sweep moves on instead of spinning
+                    self._sessions.move_to_end(sid)
+                    if all(s.lock.locked() for s in self._sessions.values()):
+                        break
+                    continue
+                del self._sessions[sid]
+                evicted.append((sid, oldest.manager.state()))
+            self.evictions += len(evicted)
+            if self.spill is None:
+                return []
+            self._spilling.update(evicted)
+        return evicted
+
+    def _spill(self, evicted: List[Tuple[str, Dict]]) -> None:
+        for sid, state in evicted:
+            self.spill.save(sid, state)
+            with self._lock:
+                if self._spilling.get(sid) is state:
+                    del self._spilling[sid]
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._sessions.pop(sid, None)
+        if self.spill is not None:
+            self.spill.delete(sid)
+        if self.log is not None:
+            self.log.append(sid, {"op": "delete"})
+
+    def close(self) -> None:
+        """Spill every live session (on shutdown) so none are lost."""
+        with self._lock:
+            live = list(self._sessions.values())
+            self._sessions.clear()
+        if self.spill is not None:
+            for session in live:
+                self.spill.save(session.id, session.manager.state())
+            self.spill.close()
+        if self.log is not None:
+            self.log.close()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict:
+        return {
+            "live": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "evictions": self.evictions,
+            "restored": self.restored,
+            "spill": self.spill is not None,
+            "log": self.log.stats() if self.log is not None else None,
+        }
+
+
+def build_session_store(agents: AgentRegistry) -> SessionStore:
+    log_dir = os.getenv("SESSION_LOG_DIR")
+    return SessionStore(
+        agents,
+        max_sessions=int(os.getenv("SESSION_MAX", "1000")),
+        idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "3600")),
+        max_messages=int(os.getenv("SESSION_MAX_MESSAGES", "200")) or None,
+        path=os.getenv("SESSION_STORE_PATH") or None,
+        log=ConversationLog(log_dir, fsync_interval=float(os.getenv("SESSION_LOG_FSYNC", "0.05"))) if log_dir else None,
+    )
@@ -0,0 +1,151 @@
+"""Coalesce identical in-flight requests onto one upstream call.
+
+Concurrent callers using the same key (see `core.cache.cache_key`) share a
+single provider call. Streams are shared too: a late joiner first gets the
+deltas produced so far, then follows the live tail.
+"""
+
+import asyncio
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from .stream import Delta
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Thread-based coalescing for the synchronous `Agent.call` path."""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """asyncio coalescing for `Agent.acall` and the web routes."""
+
+    def __init__(self):
+        self._calls: Dict[str, "asyncio.Future"] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        fut = self._calls.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(self._run(key, fn))
+            self._calls[key] = fut
+        # shield: one impatient caller cancelling must not cancel the shared call
+        return await asyncio.shield(fut)
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        try:
+            return await fn()
+        finally:
+            self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+class _SharedStream:
+    def __init__(self):
+        self.deltas: List[Delta] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.task: Optional["asyncio.Task"] = None
+        self.followers = 0
+
+    def push(self, delta: Delta) -> None:
+        self.deltas.append(delta)
+        self._wake()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        self.error = error
+        self.finished = True
+        self._wake()
+
+    def _wake(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class StreamFlight:
+    """Share one upstream stream between identical concurrent requests; it is cancelled once nobody follows it."""
+
+    def __init__(self):
+        self._streams: Dict[str, _SharedStream] = {}
+
+    def stream(self, key: str, open_stream: Callable[[], AsyncIterator[Delta]]) -> AsyncIterator[Delta]:
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = self._streams[key] = _SharedStream()
+            shared.task = asyncio.ensure_future(self._pump(key, shared, open_stream))
+        shared.followers += 1
+        return self._follow(shared)
+
+    async def _pump(self, key: str, shared: _SharedStream, open_stream: Callable[[], AsyncIterator[Delta]]) -> None:
+        try:
+            async for delta in open_stream():
+                shared.push(delta)
+        except Exception as e:
+            shared.close(e)
+        else:
+            shared.close()
+        finally:
+            self._streams.pop(key, None)
+            if not shared.finished:
+                # cancelled: wake anyone still waiting instead of leaving them blocked
+                shared.close(RuntimeError("shared stream was cancelled"))
+
+    async def _follow(self, shared: _SharedStream) -> AsyncIterator[Delta]:
+        pos = 0
+        try:
+            while True:
+                # Replay whatever was produced before we joined, then wait for the tail
+                while pos < len(shared.deltas):
+                    yield shared.deltas[pos]
+                    pos += 1
+                if shared.finished:
+                    if shared.error is not None:
+                        raise shared.error
+                    return
+                await shared.changed.wait()
+        finally:
+            shared.followers -= 1
+            if shared.followers == 0 and not shared.finished and shared.task is not None:
+                shared.task.cancel()  # every client left: free the upstream and its scheduler slot
+
+    def in_flight(self) -> int:
+        return len(self._streams)
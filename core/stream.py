@@ -1,7 +1,10 @@
-from typing import Dict, Any, Iterator, Optional
+import time
+from typing import Dict, Any, Optional
 
 
 class Delta:
+    __slots__ = ("text", "finish_reason", "usage")
+
     def __init__(self, text: str = "", finish_reason: Optional[str] = None, usage: Optional[Dict[str, Any]] = None):
         self.text = text
         self.finish_reason = finish_reason
@@ -10,20 +13,67 @@ class Delta:
 
 def normalize_openai_sse(obj: Dict[str, Any]) -> Optional[Delta]:
     choices = obj.get("choices") or []
+    usage = obj.get("usage")
     if not choices:
-        return None
+        return Delta(usage=usage) if usage else None
     delta = choices[0].get("delta") or {}
     content = delta.get("content")
     finish = choices[0].get("finish_reason")
-    if content or finish:
-        return Delta(text=content or "", finish_reason=finish)
+    if content or finish or usage:
+        return Delta(text=content or "", finish_reason=finish, usage=usage)
     return None
 
 
 def normalize_ollama_ndjson(obj: Dict[str, Any]) -> Optional[Delta]:
     # When streaming generate: each line has `response` tokens until done=true
+    # (/api/chat nests the token under `message.content` instead)
     if obj.get("done"):
-        return Delta(text="", finish_reason=obj.get("done_reason"))
-    txt = obj.get("response") or ""
+        usage = None
+        if "eval_count" in obj:
+            prompt = obj.get("prompt_eval_count") or 0
+            completion = obj.get("eval_count") or 0
+            usage = {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+        return Delta(text="", finish_reason=obj.get("done_reason") or "stop", usage=usage)
+    txt = obj.get("response") or (obj.get("message") or {}).get("content") or ""
     return Delta(text=txt)
 
+
+class StreamStats:
+    """Time-to-first-token and decode throughput for one streamed reply."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first: Optional[float] = None
+        self.end: Optional[float] = None
+        self.chunks = 0
+        self.usage: Optional[Dict[str, Any]] = None
+
+    def observe(self, delta: Delta) -> None:
+        if delta.text:
+            if self.first is None:
+                self.first = time.perf_counter()
+            self.chunks += 1
+        if delta.usage:
+            self.usage = delta.usage
+        self.end = time.perf_counter()
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return self.first - self.start if self.first is not None else None
+
+    @property
+    def tokens(self) -> int:
+        # providers that report usage give exact counts; otherwise each chunk is about one token
+        reported = (self.usage or {}).get("completion_tokens")
+        return int(reported) if reported else self.chunks
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        if self.first is None or self.end is None or self.end <= self.first:
+            return None
+        return self.tokens / (self.end - self.first)
+
+    def summary(self) -> str:
+        ttft = f"{self.ttft:.2f}s" if self.ttft is not None else "n/a"
+        rate = f"{self.tokens_per_sec:.1f} tok/s" if self.tokens_per_sec is not None else "n/a tok/s"
+        return f"ttft {ttft}, {rate}, {self.tokens} tokens"
@@ -0,0 +1,185 @@
+"""Incremental byte-level parsers for OpenAI-style SSE and Ollama NDJSON streams, fed raw body chunks."""
+
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional
+
+from . import trace
+from .stream import Delta, normalize_ollama_ndjson, normalize_openai_sse
+
+_decoder = json.JSONDecoder()
+
+
+class LineBuffer:
+    """Splits a byte stream into lines; a line may keep a trailing ``\r``."""
+
+    __slots__ = ("_pending",)
+
+    def __init__(self):
+        self._pending: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        if b"\n" not in chunk:
+            if chunk:
+                self._pending.append(chunk)
+            return []
+        lines = chunk.split(b"\n")
+        if self._pending:
+            self._pending.append(lines[0])
+            lines[0] = b"".join(self._pending)
+            self._pending.clear()
+        tail = lines.pop()
+        if tail:
+            self._pending.append(tail)
+        return lines
+
+    def close(self) -> Optional[bytes]:
+        """The trailing line if the stream did not end with a newline."""
+        rest = b"".join(self._pending)
+        self._pending.clear()
+        return rest or None
+
+
+def _skip_spaces(text: str, i: int) -> int:
+    n = len(text)
+    while i < n and text[i] in " \t":
+        i += 1
+    return i
+
+
+class OpenAISSEParser:
+    __slots__ = ("_lines", "done")
+
+    def __init__(self):
+        self._lines = LineBuffer()
+        self.done = False
+
+    def _parse(self, line: bytes) -> Optional[Delta]:
+        # comments (": OPENROUTER PROCESSING"), event names and blank separators carry no data
+        if not line.startswith(b"data:"):
+            return None
+        text = line.decode("utf-8")
+        i = _skip_spaces(text, 5)
+        if i >= len(text) or text[i] == "\r":
+            return None
+        if text.startswith("[DONE]", i):
+            self.done = True
+            return None
+        return normalize_openai_sse(_decoder.raw_decode(text, i)[0])
+
+    def feed(self, chunk: bytes) -> List[Delta]:
+        out: List[Delta] = []
+        if self.done:
+            return out
+        parse = self._parse
+        for line in self._lines.feed(chunk):
+            if not line:
+                continue
+            d = parse(line)
+            if self.done:
+                break
+            if d is not None:
+                out.append(d)
+        return out
+
+    def close(self) -> List[Delta]:
+        line = self._lines.close()
+        d = self._parse(line) if line is not None and not self.done else None
+        return [d] if d is not None else []
+
+
+class OllamaNDJSONParser:
+    """`on_done` receives the raw final object (e.g. for the ``context`` of /api/generate)."""
+
+    __slots__ = ("_lines", "done", "_on_done")
+
+    def __init__(self, on_done: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self._lines = LineBuffer()
+        self.done = False
+        self._on_done = on_done
+
+    def _parse(self, line: bytes) -> Optional[Delta]:
+        text = line.decode("utf-8")
+        i = _skip_spaces(text, 0)
+        if i >= len(text) or text[i] == "\r":
+            return None
+        obj = _decoder.raw_decode(text, i)[0]
+        d = normalize_ollama_ndjson(obj)
+        if d is not None and d.finish_reason:
+            self.done = True
+            if self._on_done is not None:
+                self._on_done(obj)
+        return d
+
+    def feed(self, chunk: bytes) -> List[Delta]:
+        out: List[Delta] = []
+        if self.done:
+            return out
+        parse = self._parse
+        for line in self._lines.feed(chunk):
+            if not line:
+                continue
+            d = parse(line)
+            if d is not None:
+                out.append(d)
+            if self.done:
+                break
+        return out
+
+    def close(self) -> List[Delta]:
+        line = self._lines.close()
+        d = self._parse(line) if line is not None and not self.done else None
+        return [d] if d is not None else []
+
+
+def _iter(parser, chunks: Iterable[bytes]) -> Iterator[Delta]:
+    tr = trace.current()
+    if tr is not None:
+        chunks = trace.timed_chunks(chunks)
+    for chunk in chunks:
+        if tr is None:
+            yield from parser.feed(chunk)
+        else:
+            with trace.span("parse"):
+                deltas = parser.feed(chunk)
+            yield from deltas
+        if parser.done:
+            return
+    yield from parser.close()
+
+
+async def _aiter(parser, chunks: AsyncIterable[bytes]) -> AsyncIterator[Delta]:
+    tr = trace.current()
+    if tr is not None:
+        chunks = trace.atimed_chunks(chunks)
+    async for chunk in chunks:
+        if tr is None:
+            deltas = parser.feed(chunk)
+        else:
+            with trace.span("parse"):
+                deltas = parser.feed(chunk)
+        for d in deltas:
+            yield d
+        if parser.done:
+            return
+    for d in parser.close():
+        yield d
+
+
+def iter_openai_sse_bytes(chunks: Iterable[bytes]) -> Iterator[Delta]:
+    return _iter(OpenAISSEParser(), chunks)
+
+
+def iter_ollama_ndjson_bytes(
+    chunks: Iterable[bytes], on_done: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Iterator[Delta]:
+    return _iter(OllamaNDJSONParser(on_done), chunks)
+
+
+def aiter_openai_sse_bytes(chunks: AsyncIterable[bytes]) -> AsyncIterator[Delta]:
+    return _aiter(OpenAISSEParser(), chunks)
+
+
+def aiter_ollama_ndjson_bytes(
+    chunks: AsyncIterable[bytes], on_done: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> AsyncIterator[Delta]:
+    return _aiter(OllamaNDJSONParser(on_done), chunks)
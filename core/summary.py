@@ -0,0 +1,53 @@
+"""Rolling conversation summaries computed off the request path."""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from .agent import Agent
+from .registry import AgentRegistry
+from .types import Message
+
+# Shared by every ConversationManager so many sessions don't each spawn a thread.
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summarizer")
+
+SUMMARY_PROMPT = (
+    "You compress chat transcripts. Summarize the conversation so far for an assistant "
+    "continuing it: keep names, facts, decisions, user preferences and open questions. "
+    "Reply with the summary only, in at most {max_words} words."
+)
+
+
+class Summarizer:
+    def __init__(self, agent: Agent, trigger_messages: int = 16, keep_messages: int = 6, max_words: int = 150):
+        self.agent = agent
+        self.trigger_messages = trigger_messages
+        self.keep_messages = keep_messages
+        self.max_words = max_words
+
+    @classmethod
+    def from_config(cls, agents: AgentRegistry) -> Optional["Summarizer"]:
+        cfg: Dict = agents.config.get("summary") or {}
+        agent_id = cfg.get("agent")
+        if not agent_id:
+            return None
+        return cls(
+            agents.get(agent_id),
+            trigger_messages=int(cfg.get("trigger_messages", 16)),
+            keep_messages=int(cfg.get("keep_messages", 6)),
+            max_words=int(cfg.get("max_words", 150)),
+        )
+
+    def due(self, history: List[Message]) -> bool:
+        return len(history) >= max(self.trigger_messages, self.keep_messages + 2)
+
+    def submit(self, previous: Optional[str], turns: List[Message]) -> "Future[str]":
+        return _executor.submit(self.summarize, previous, list(turns))
+
+    def summarize(self, previous: Optional[str], turns: List[Message]) -> str:
+        lines = [f"Summary so far: {previous}"] if previous else []
+        lines.extend(f"{m.get('role', '')}: {m.get('content', '')}" for m in turns)
+        msgs = [
+            {"role": "system", "content": SUMMARY_PROMPT.format(max_words=self.max_words)},
+            {"role": "user", "content": "\n".join(lines)},
+        ]
+        return self.agent.call(msgs).strip()
@@ -0,0 +1,154 @@
+"""Lightweight per-turn tracing: where did the time in one turn go?
+
+`start` opens a `Trace` and makes it current through a ContextVar. The
+ContextVar follows the turn into awaited coroutines, tasks and
+`asyncio.to_thread` workers. Code along the pipeline wraps its stages in
+``with span("name"):``, which records a monotonic start and duration on the
+current trace. With no trace active, `span` returns a shared no-op object, so
+the instrumentation costs one ContextVar lookup.
+
+The CLI prints `Trace.format` after each turn with ``--profile``. The web
+server sends `Trace.server_timing` as a ``Server-Timing`` header when
+``SERVER_TIMING=1``.
+"""
+
+import re
+import secrets
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+_TOKEN = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NOOP = _NoSpan()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace: "Trace", name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.trace.add(self.name, self.start, time.perf_counter() - self.start)
+
+
+class Trace:
+    def __init__(self, name: str = "turn", trace_id: Optional[str] = None):
+        self.name = name
+        self.id = trace_id or secrets.token_hex(8)
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        # (name, start, duration); list.append is atomic, so worker threads can record too
+        self.spans: List[Tuple[str, float, float]] = []
+        self._token = None
+
+    def add(self, name: str, start: float, duration: float) -> None:
+        self.spans.append((name, start, duration))
+
+    def __enter__(self) -> "Trace":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.end = time.perf_counter()
+        _current.reset(self._token)
+
+    @property
+    def total(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def breakdown(self) -> List[Tuple[str, float, int]]:
+        """(stage, seconds, count) per span name, in order of first appearance."""
+        out: Dict[str, List[float]] = {}
+        for name, _, duration in sorted(self.spans, key=lambda s: s[1]):
+            entry = out.setdefault(name, [0.0, 0])
+            entry[0] += duration
+            entry[1] += 1
+        return [(name, seconds, int(count)) for name, (seconds, count) in out.items()]
+
+    def format(self) -> str:
+        total = self.total
+        lines = [f"[profile {self.id}] {self.name} {total * 1e3:.1f} ms"]
+        for name, seconds, count in self.breakdown():
+            share = 100.0 * seconds / total if total else 0.0
+            times = f" x{count}" if count > 1 else ""
+            lines.append(f"  {name:<24} {seconds * 1e3:9.2f} ms {share:5.1f}%{times}")
+        return "\n".join(lines)
+
+    def server_timing(self) -> str:
+        parts = [f"{_TOKEN.sub('_', name)};dur={seconds * 1e3:.2f}" for name, seconds, _ in self.breakdown()]
+        parts.append(f"total;dur={self.total * 1e3:.2f}")
+        return ", ".join(parts)
+
+
+def start(name: str = "turn", trace_id: Optional[str] = None) -> Trace:
+    """A new trace; use as ``with trace.start() as tr:`` to make it current."""
+    return Trace(name, trace_id)
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+def span(name: str):
+    tr = _current.get()
+    if tr is None:
+        return _NOOP
+    return _Span(tr, name)
+
+
+def timed_chunks(chunks: Iterable, name: str = "network_wait") -> Iterable:
+    """Pass `chunks` through, adding the time spent waiting for each one as a `name` span."""
+    tr = _current.get()
+    if tr is None:
+        return chunks
+    return _timed(tr, iter(chunks), name)
+
+
+def _timed(tr: Trace, it: Iterator, name: str) -> Iterator:
+    while True:
+        t = time.perf_counter()
+        try:
+            chunk = next(it)
+        except StopIteration:
+            tr.add(name, t, time.perf_counter() - t)
+            return
+        tr.add(name, t, time.perf_counter() - t)
+        yield chunk
+
+
+def atimed_chunks(chunks, name: str = "network_wait"):
+    tr = _current.get()
+    if tr is None:
+        return chunks
+    return _atimed(tr, chunks.__aiter__(), name)
+
+
+async def _atimed(tr: Trace, it, name: str):
+    while True:
+        t = time.perf_counter()
+        try:
+            chunk = await it.__anext__()
+        except StopAsyncIteration:
+            tr.add(name, t, time.perf_counter() - t)
+            return
+        tr.add(name, t, time.perf_counter() - t)
+        yield chunk
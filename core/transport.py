@@ -0,0 +1,125 @@
+"""Shared HTTP clients so providers reuse pooled keep-alive connections.
+
+Clients are kept per origin so each upstream host gets its own connection
+pool. ``HTTP_POOL_SIZE`` sets the default pool size and ``HTTP_POOL_SIZES``
+overrides it per host, e.g. ``openrouter.ai=64,127.0.0.1:11434=4``. HTTP/2 is
+negotiated over TLS when the optional ``h2`` package is installed.
+"""
+
+import asyncio
+import importlib.util
+import os
+import threading
+import weakref
+from typing import Dict, Optional
+
+import httpx
+
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+_pool_sizes: Optional[Dict[str, int]] = None
+_clients: Dict[str, httpx.Client] = {}
+# httpx async pools are bound to the loop that created them, so keep one set per loop.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+_lock = threading.Lock()
+
+
+def _origin(url: str) -> str:
+    u = httpx.URL(url)
+    return f"{u.scheme}://{u.netloc.decode('ascii')}"
+
+
+def _configured_sizes() -> Dict[str, int]:
+    global _pool_sizes
+    if _pool_sizes is None:
+        sizes: Dict[str, int] = {}
+        for item in os.getenv("HTTP_POOL_SIZES", "").split(","):
+            host, _, size = item.strip().partition("=")
+            if host and size.strip().isdigit():
+                sizes[host.strip().lower()] = int(size)
+        _pool_sizes = sizes
+    return _pool_sizes
+
+
+def configure_pool(host: str, size: int) -> None:
+    """Set the pool size for `host` (``name`` or ``name:port``); applies to clients created afterwards."""
+    _configured_sizes()[host.lower()] = size
+
+
+def pool_size(url: str) -> int:
+    u = httpx.URL(url)
+    sizes = _configured_sizes()
+    host = (u.host or "").lower()
+    for key in (f"{host}:{u.port}" if u.port else None, host):
+        if key and key in sizes:
+            return sizes[key]
+    return int(os.getenv("HTTP_POOL_SIZE", "20"))
+
+
+def _client_kwargs(url: str) -> Dict:
+    size = pool_size(url)
+    return {
+        "limits": httpx.Limits(max_connections=size, max_keepalive_connections=size, keepalive_expiry=60.0),
+        "timeout": httpx.Timeout(60.0, connect=10.0),
+        "http2": HTTP2,
+    }
+
+
+def get_client(url: str) -> httpx.Client:
+    origin = _origin(url)
+    client = _clients.get(origin)
+    if client is None or client.is_closed:
+        with _lock:
+            client = _clients.get(origin)
+            if client is None or client.is_closed:
+                client = httpx.Client(**_client_kwargs(origin))
+                _clients[origin] = client
+    return client
+
+
+def get_async_client(url: str) -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    per_loop = _async_clients.setdefault(loop, {})
+    origin = _origin(url)
+    client = per_loop.get(origin)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(**_client_kwargs(origin))
+        per_loop[origin] = client
+    return client
+
+
+def close() -> None:
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+async def aclose() -> None:
+    per_loop = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in per_loop.values():
+        await client.aclose()
+
+
+def send_stream(client: httpx.Client, request: httpx.Request) -> httpx.Response:
+    """Send `request` with a streamed body; raises (and closes) on an error status."""
+    resp = client.send(request, stream=True)
+    try:
+        resp.raise_for_status()
+    except httpx.HTTPStatusError:
+        resp.close()
+        raise
+    return resp
+
+
+async def asend_stream(client: httpx.AsyncClient, request: httpx.Request) -> httpx.Response:
+    resp = await client.send(request, stream=True)
+    try:
+        resp.raise_for_status()
+    except httpx.HTTPStatusError:
+        await resp.aclose()
+        raise
+    return resp
@@ -0,0 +1,172 @@
+"""Startup warm-up, so the first real request does not pay the cold-start costs.
+
+From a parsed ``agents.yml`` this plans a few cheap steps:
+- import optional heavy modules up front;
+- open a TLS connection to each remote upstream in use, so the pooled client
+  already holds a keep-alive connection;
+- send each configured local Ollama model an empty generate call, which loads
+  it into memory.
+
+Steps run concurrently and each one is bounded by ``WARMUP_TIMEOUT``. A
+failed step is logged and reported, but it does not block readiness; readiness
+only means warm-up has finished. Set ``WARMUP=0`` to skip warm-up entirely.
+"""
+
+import asyncio
+import importlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import transport
+
+# Imported lazily on the request path elsewhere; paying for them here is free
+OPTIONAL_IMPORTS = ("openai", "numpy")
+
+Step = Tuple[str, Callable[[], Any]]
+
+
+def enabled() -> bool:
+    return os.getenv("WARMUP", "1").lower() not in ("0", "false", "no")
+
+
+def timeout() -> float:
+    return float(os.getenv("WARMUP_TIMEOUT", "120"))
+
+
+def _providers_used(cfg: Dict) -> List[Tuple[str, Optional[str]]]:
+    """(provider, model) pairs referenced by agents and composite fallbacks."""
+    used = [(a.get("provider", "qwen"), a.get("model")) for a in cfg.get("agents") or [] if not a.get("fanout")]
+    for pcfg in (cfg.get("providers") or {}).values():
+        for fb in (pcfg or {}).get("fallbacks") or []:
+            fb = fb if isinstance(fb, dict) else {"provider": fb}
+            used.append((fb.get("provider", "qwen"), fb.get("model")))
+    return used
+
+
+def plan(cfg: Dict) -> List[Tuple[str, str, str, Optional[Dict[str, Any]]]]:
+    """The HTTP warm-up requests for `cfg`, as (name, method, url, json body)."""
+    used = _providers_used(cfg)
+    requests: List[Tuple[str, str, str, Optional[Dict[str, Any]]]] = []
+    if any(p == "qwen" for p, _ in used):
+        base = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+        requests.append(("connect:openrouter", "HEAD", base, None))
+    models = [m for p, m in used if p == "ollama" and m]
+    models += [m.strip() for m in os.getenv("WARMUP_OLLAMA_MODELS", "").split(",") if m.strip()]
+    if models:
+        from providers.ollama import keep_alive
+
+        url = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434") + "/api/generate"
+        for model in dict.fromkeys(models):
+            requests.append((f"preload:ollama/{model}", "POST", url, {"model": model, "keep_alive": keep_alive()}))
+    return requests
+
+
+def _import_optional(name: str) -> None:
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        pass
+
+
+def _check(resp, method: str) -> None:
+    # any answer to HEAD means the connection is up; a preload must succeed
+    if method != "HEAD":
+        resp.raise_for_status()
+
+
+def steps(cfg: Dict) -> List[Step]:
+    """Warm-up steps using the shared sync clients (CLI, sync providers)."""
+    out: List[Step] = [(f"import:{name}", lambda name=name: _import_optional(name)) for name in OPTIONAL_IMPORTS]
+    for name, method, url, body in plan(cfg):
+
+        def send(method=method, url=url, body=body):
+            _check(transport.get_client(url).request(method, url, json=body, timeout=timeout()), method)
+
+        out.append((name, send))
+    return out
+
+
+def asteps(cfg: Dict) -> List[Step]:
+    """Warm-up steps using the running loop's async clients (web server)."""
+    out: List[Step] = [(f"import:{name}", lambda name=name: _import_optional(name)) for name in OPTIONAL_IMPORTS]
+    for name, method, url, body in plan(cfg):
+
+        async def send(method=method, url=url, body=body):
+            resp = await transport.get_async_client(url).request(method, url, json=body, timeout=timeout())
+            _check(resp, method)
+
+        out.append((name, send))
+    return out
+
+
+class Warmup:
+    def __init__(self):
+        self.state = "pending"  # pending -> warming -> ready
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def skip(self) -> None:
+        self.state = "ready"
+
+    def _done(self, name: str, start: float, error: Optional[BaseException] = None) -> None:
+        result: Dict[str, Any] = {"ok": error is None, "seconds": round(time.perf_counter() - start, 3)}
+        if error is not None:
+            logging.warning("warm-up step %s failed: %s", name, error)
+            result["error"] = str(error) or type(error).__name__
+        self.steps[name] = result
+
+    def run(self, steps: List[Step]) -> None:
+        self.state = "warming"
+        start = time.perf_counter()
+
+        def one(name: str, fn: Callable[[], Any]) -> None:
+            t = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                self._done(name, t, e)
+            else:
+                self._done(name, t)
+
+        with ThreadPoolExecutor(max_workers=max(1, len(steps))) as pool:
+            for name, fn in steps:
+                pool.submit(one, name, fn)
+        self.seconds = round(time.perf_counter() - start, 3)
+        self.state = "ready"
+
+    def start(self, steps: List[Step]) -> threading.Thread:
+        """Run `steps` on a background thread (the CLI warms up while the user types)."""
+        thread = threading.Thread(target=self.run, args=(steps,), name="warmup", daemon=True)
+        thread.start()
+        return thread
+
+    async def arun(self, steps: List[Step]) -> None:
+        self.state = "warming"
+        start = time.perf_counter()
+
+        async def one(name: str, fn: Callable[[], Any]) -> None:
+            t = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(fn):
+                    await asyncio.wait_for(fn(), timeout())
+                else:
+                    await asyncio.wait_for(asyncio.to_thread(fn), timeout())
+            except Exception as e:
+                self._done(name, t, e)
+            else:
+                self._done(name, t)
+
+        await asyncio.gather(*(one(name, fn) for name, fn in steps))
+        self.seconds = round(time.perf_counter() - start, 3)
+        self.state = "ready"
+
+    def report(self) -> Dict[str, Any]:
+        return {"state": self.state, "seconds": self.seconds, "steps": dict(self.steps)}
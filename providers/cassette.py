@@ -0,0 +1,262 @@
+"""Record/replay ("cassette") provider wrappers, for replaying captured traffic offline."""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.cache import cache_key
+from core.stream import Delta
+
+
+class Cassette:
+    """A cassette file; ``readonly`` (for replay) requires it to exist and never writes to it."""
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        # (offset, length) of each payload, in file order
+        self._entries: List[Tuple[str, Tuple[int, int]]] = []
+        self._by_key: Dict[str, List[Tuple[int, int]]] = {}
+        self._by_provider: Dict[str, List[Tuple[int, int]]] = {}
+        self._records: Dict[int, Dict[str, Any]] = {}
+        self._cursors: Dict[Tuple[str, str], int] = {}
+        self._fd: Optional[int] = None
+        if not readonly:
+            self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._file = open(path, "rb")
+        self._index()
+
+    @staticmethod
+    def key(provider: str, model: str, messages: List[Dict[str, Any]]) -> str:
+        return cache_key(f"{provider}:{model}", messages)
+
+    def _index(self) -> None:
+        f = self._file
+        f.seek(0)
+        while True:
+            header = f.readline()
+            if not header:
+                return
+            provider, key, size = header.split()
+            entry = (f.tell(), int(size))
+            if sum(entry) > os.fstat(f.fileno()).st_size:
+                return  # torn tail from an interrupted write
+            self._add(provider.decode(), key.decode(), entry)
+            f.seek(entry[1], os.SEEK_CUR)
+
+    def _add(self, provider: str, key: str, entry: Tuple[int, int]) -> None:
+        self._entries.append((provider, entry))
+        self._by_key.setdefault(key, []).append(entry)
+        self._by_provider.setdefault(provider, []).append(entry)
+
+    def append(self, provider: str, key: str, record: Dict[str, Any]) -> None:
+        if self._fd is None:
+            raise ValueError(f"cassette {self.path} is open for replay only")
+        payload = zlib.compress(json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8"))
+        data = f"{provider} {key} {len(payload)}\n".encode() + payload
+        with self._lock:
+            # one write on an O_APPEND fd lands whole at the end, even with other processes appending
+            os.write(self._fd, data)
+            end = os.lseek(self._fd, 0, os.SEEK_CUR)
+            self._add(provider, key, (end - len(payload), len(payload)))
+
+    def _load(self, entry: Tuple[int, int]) -> Dict[str, Any]:
+        offset, size = entry
+        record = self._records.get(offset)
+        if record is None:
+            self._file.seek(offset)
+            record = self._records[offset] = json.loads(zlib.decompress(self._file.read(size)))
+        return record
+
+    def records(self, provider: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Every recording (for `provider`, if given) in recorded order, with its request and reply."""
+        for name, entry in list(self._entries):
+            if provider is None or name == provider:
+                with self._lock:
+                    record = self._load(entry)
+                yield dict(record, provider=name)
+
+    def next(self, provider: str, key: str, match: str = "exact") -> Optional[Dict[str, Any]]:
+        """The next recording for this call, cycling through repeats; None if there is none."""
+        if match == "exact":
+            scope, entries = key, self._by_key.get(key)
+        else:
+            scope, entries = provider, self._by_provider.get(provider)
+        if not entries:
+            return None
+        with self._lock:
+            i = self._cursors.get((match, scope), 0)
+            self._cursors[(match, scope)] = i + 1
+            return self._load(entries[i % len(entries)])
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._by_key.values())
+
+    def close(self) -> None:
+        self._file.close()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+@lru_cache(maxsize=None)
+def open_cassette(path: str, readonly: bool = False) -> Cassette:
+    """One shared `Cassette` per path, so all wrapped providers append to the same file."""
+    return Cassette(path, readonly)
+
+
+def _delta_row(start: float, d: Delta) -> List[Any]:
+    return [round(time.perf_counter() - start, 6), d.text, d.finish_reason, d.usage]
+
+
+class RecordingProvider:
+    """Passes calls through to `provider` and records them in `cassette` under `name`."""
+
+    def __init__(self, name: str, provider: object, cassette: Cassette):
+        self.name = name
+        self.provider = provider
+        self.cassette = cassette
+
+    def __getattr__(self, name: str):
+        return getattr(self.provider, name)
+
+    def _save(self, model: str, messages: List[Dict[str, Any]], kw: Dict[str, Any], record: Dict[str, Any]) -> None:
+        # the request travels with the reply, so a recording can be driven through the app again
+        record.update(model=model, messages=messages, kw=kw)
+        self.cassette.append(self.name, Cassette.key(self.name, model, messages), record)
+
+    def chat(self, model: str, messages: List[Dict[str, Any]], **kw) -> str:
+        start = time.perf_counter()
+        reply = self.provider.chat(model, messages, **kw)
+        self._save(model, messages, kw, {"reply": reply, "seconds": round(time.perf_counter() - start, 6)})
+        return reply
+
+    async def achat(self, model: str, messages: List[Dict[str, Any]], **kw) -> str:
+        start = time.perf_counter()
+        achat = getattr(self.provider, "achat", None)
+        if achat is None:
+            reply = await asyncio.to_thread(self.provider.chat, model, messages, **kw)
+        else:
+            reply = await achat(model, messages, **kw)
+        self._save(model, messages, kw, {"reply": reply, "seconds": round(time.perf_counter() - start, 6)})
+        return reply
+
+    def stream(self, model: str, messages: List[Dict[str, Any]], **kw) -> Iterator[Delta]:
+        start = time.perf_counter()
+        stream = getattr(self.provider, "stream", None)
+        if stream is None:
+            deltas: Iterator[Delta] = iter([Delta(text=self.provider.chat(model, messages, **kw), finish_reason="stop")])
+        else:
+            deltas = stream(model, messages, **kw)
+        rows = []
+        for delta in deltas:
+            rows.append(_delta_row(start, delta))
+            yield delta
+        # abandoned streams are not recorded; a replay would end early for no reason
+        self._save(model, messages, kw, {"deltas": rows})
+
+    async def astream(self, model: str, messages: List[Dict[str, Any]], **kw) -> AsyncIterator[Delta]:
+        astream = getattr(self.provider, "astream", None)
+        if astream is None:
+            yield Delta(text=await self.achat(model, messages, **kw), finish_reason="stop")
+            return
+        start = time.perf_counter()
+        rows = []
+        async for delta in astream(model, messages, **kw):
+            rows.append(_delta_row(start, delta))
+            yield delta
+        self._save(model, messages, kw, {"deltas": rows})
+
+
+def _as_deltas(record: Dict[str, Any]) -> List[List[Any]]:
+    if "deltas" in record:
+        return record["deltas"]
+    return [[record.get("seconds", 0.0), record.get("reply", ""), "stop", None]]
+
+
+def _as_reply(record: Dict[str, Any]) -> Tuple[str, float]:
+    if "deltas" in record:
+        rows = record["deltas"]
+        return "".join(r[1] for r in rows), (rows[-1][0] if rows else 0.0)
+    return record.get("reply", ""), record.get("seconds", 0.0)
+
+
+class ReplayProvider:
+    """Serves recordings for `name` from `cassette`; never touches the network."""
+
+    def __init__(self, name: str, cassette: Cassette, speed: float = 1.0, match: str = "exact"):
+        if match not in ("exact", "sequence"):
+            raise ValueError(f"unknown cassette match mode: {match}")
+        self.name = name
+        self.cassette = cassette
+        self.speed = speed
+        self.match = match
+
+    def _delay(self, seconds: float) -> float:
+        return seconds / self.speed if self.speed > 0 else 0.0
+
+    def _record(self, model: str, messages: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        return self.cassette.next(self.name, Cassette.key(self.name, model, messages), self.match)
+
+    def _missing(self, model: str) -> str:
+        return f"[error:cassette] no recording for {self.name}/{model}"
+
+    def chat(self, model: str, messages: List[Dict[str, Any]], **kw) -> str:
+        record = self._record(model, messages)
+        if record is None:
+            return self._missing(model)
+        reply, seconds = _as_reply(record)
+        time.sleep(self._delay(seconds))
+        return reply
+
+    async def achat(self, model: str, messages: List[Dict[str, Any]], **kw) -> str:
+        record = self._record(model, messages)
+        if record is None:
+            return self._missing(model)
+        reply, seconds = _as_reply(record)
+        await asyncio.sleep(self._delay(seconds))
+        return reply
+
+    def stream(self, model: str, messages: List[Dict[str, Any]], **kw) -> Iterator[Delta]:
+        record = self._record(model, messages)
+        if record is None:
+            yield Delta(text=self._missing(model), finish_reason="error")
+            return
+        start = time.perf_counter()
+        for at, text, finish_reason, usage in _as_deltas(record):
+            # sleep to the recorded offset rather than the gap, so pacing does not drift
+            wait = start + self._delay(at) - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            yield Delta(text=text, finish_reason=finish_reason, usage=usage)
+
+    async def astream(self, model: str, messages: List[Dict[str, Any]], **kw) -> AsyncIterator[Delta]:
+        record = self._record(model, messages)
+        if record is None:
+            yield Delta(text=self._missing(model), finish_reason="error")
+            return
+        start = time.perf_counter()
+        for at, text, finish_reason, usage in _as_deltas(record):
+            wait = start + self._delay(at) - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield Delta(text=text, finish_reason=finish_reason, usage=usage)
+
+
+def from_env(name: str, build: Callable[[], object]) -> object:
+    """The provider `build()` makes, wrapped for ``CASSETTE_RECORD``/``CASSETTE_REPLAY`` (never built on replay)."""
+    replay = os.getenv("CASSETTE_REPLAY")
+    if replay:
+        if not os.path.isfile(replay):
+            raise FileNotFoundError(f"CASSETTE_REPLAY: no cassette at {replay}")
+        speed = float(os.getenv("CASSETTE_SPEED", "1"))
+        return ReplayProvider(name, open_cassette(replay, readonly=True), speed, os.getenv("CASSETTE_MATCH", "exact"))
+    record = os.getenv("CASSETTE_RECORD")
+    if record:
+        return RecordingProvider(name, build(), open_cassette(record))
+    return build()
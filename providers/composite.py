@@ -0,0 +1,277 @@
+"""Composite provider: ordered fallbacks with optional hedged requests.
+
+Declared under ``providers:`` in agents.yml and referenced by agents like any
+other provider name::
+
+    providers:
+      resilient:
+        type: composite
+        fallbacks:
+          - { provider: "qwen" }
+          - { provider: "ollama", model: "qwen2.5:7b-instruct" }
+        hedge: { enabled: true, quantile: 0.95, min_delay: 0.5, initial_delay: 2.0, max_outstanding: 16 }
+
+Members are tried in order; a member fails when it raises or replies with an
+``[error:...]`` string. With hedging, if the current member has not answered
+(or, when streaming, produced its first delta) within the observed latency
+quantile, the next member is started too and the first good answer wins; the
+loser is cancelled. Full-reply latency and time to first delta are tracked
+separately, so each kind of call hedges on its own quantile.
+
+Sync calls run inline unless they may be hedged. A sync loser cannot be
+cancelled, so at most ``max_outstanding`` hedgeable calls per provider hold a
+worker thread; past that, calls run inline without a hedge.
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from core.stream import Delta
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+
+def _failed(reply: object) -> bool:
+    return not isinstance(reply, str) or reply.startswith("[error:")
+
+
+class _Member:
+    def __init__(self, name: str, provider: object, model: Optional[str]):
+        self.name = name
+        self.provider = provider
+        self.model = model
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.samples) < 20:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CompositeProvider:
+    def __init__(self, members: List[_Member], hedge: Optional[Dict] = None):
+        if not members:
+            raise ValueError("composite provider needs at least one fallback")
+        self.members = members
+        hedge = hedge or {}
+        self.hedge = bool(hedge.get("enabled", False))
+        self.quantile = float(hedge.get("quantile", 0.95))
+        self.min_delay = float(hedge.get("min_delay", 0.5))
+        self.initial_delay = float(hedge.get("initial_delay", 2.0))
+        # worker threads this provider may hold, counting losers that are still running
+        self._outstanding = threading.BoundedSemaphore(int(hedge.get("max_outstanding", 16)))
+        # full-completion latency hedges chat calls; time to first delta hedges streams
+        self.latency: Dict[str, LatencyWindow] = {m.name: LatencyWindow() for m in members}
+        self.ttft: Dict[str, LatencyWindow] = {m.name: LatencyWindow() for m in members}
+
+    @classmethod
+    def from_config(cls, cfg: Dict, registry) -> "CompositeProvider":
+        members = []
+        for entry in cfg.get("fallbacks") or []:
+            if isinstance(entry, str):
+                entry = {"provider": entry}
+            members.append(_Member(entry["provider"], registry.get(entry["provider"]), entry.get("model")))
+        return cls(members, cfg.get("hedge"))
+
+    def hedge_delay(self, member: _Member, streaming: bool = False) -> float:
+        q = (self.ttft if streaming else self.latency)[member.name].quantile(self.quantile)
+        return max(self.min_delay, q if q is not None else self.initial_delay)
+
+    def _model(self, member: _Member, model: str) -> str:
+        return member.model or model
+
+    # --- sync -------------------------------------------------------------
+
+    def _timed_chat(self, member: _Member, model: str, messages, **kw) -> str:
+        start = time.monotonic()
+        reply = member.provider.chat(self._model(member, model), messages, **kw)
+        if not _failed(reply):
+            self.latency[member.name].record(time.monotonic() - start)
+        return reply
+
+    def _inline_chat(self, member: _Member, model: str, messages, **kw) -> str:
+        try:
+            return self._timed_chat(member, model, messages, **kw)
+        except Exception as e:
+            return f"[error:{member.name}] {e}"
+
+    def _submit(self, member: _Member, model: str, messages, **kw) -> Optional[Future]:
+        """Run on a worker thread, or None when `max_outstanding` calls already hold one."""
+        if not self._outstanding.acquire(blocking=False):
+            return None
+        # a copy of the caller's context keeps its trace and fair-queueing caller in the worker
+        fut = _executor.submit(contextvars.copy_context().run, self._timed_chat, member, model, messages, **kw)
+        fut.add_done_callback(lambda _: self._outstanding.release())
+        return fut
+
+    def chat(self, model: str, messages, **kw) -> str:
+        errors: List[str] = []
+        i = 0
+        while i < len(self.members):
+            nxt = i + 1
+            primary = None
+            if self.hedge and nxt < len(self.members):
+                primary = self._submit(self.members[i], model, messages, **kw)
+            if primary is None:
+                # nothing to hedge with (or no room): no thread hop
+                reply = self._inline_chat(self.members[i], model, messages, **kw)
+                if not _failed(reply):
+                    return reply
+                errors.append(reply)
+                i = nxt
+                continue
+            pending = {primary: self.members[i]}
+            done, _ = wait(pending, timeout=self.hedge_delay(self.members[i]))
+            if not done:
+                m = self.members[nxt]
+                backup = self._submit(m, model, messages, **kw)
+                if backup is not None:
+                    pending[backup] = m
+                    nxt += 1
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    member = pending.pop(fut)
+                    try:
+                        reply = fut.result()
+                    except Exception as e:
+                        reply = f"[error:{member.name}] {e}"
+                    if not _failed(reply):
+                        for loser in pending:
+                            loser.cancel()  # a running thread can't be stopped; its result is dropped
+                        return reply
+                    errors.append(reply)
+            i = nxt
+        return "[error:composite] all providers failed: " + "; ".join(errors)
+
+    # --- async ------------------------------------------------------------
+
+    async def _timed_achat(self, member: _Member, model: str, messages, **kw) -> str:
+        start = time.monotonic()
+        achat = getattr(member.provider, "achat", None)
+        try:
+            if achat is not None:
+                reply = await achat(self._model(member, model), messages, **kw)
+            else:
+                reply = await asyncio.to_thread(member.provider.chat, self._model(member, model), messages, **kw)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return f"[error:{member.name}] {e}"
+        if not _failed(reply):
+            self.latency[member.name].record(time.monotonic() - start)
+        return reply
+
+    async def achat(self, model: str, messages, **kw) -> str:
+        errors: List[str] = []
+        i = 0
+        while i < len(self.members):
+            tasks = {asyncio.ensure_future(self._timed_achat(self.members[i], model, messages, **kw))}
+            nxt = i + 1
+            if self.hedge and nxt < len(self.members):
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(self.members[i]))
+                if not done:
+                    tasks.add(asyncio.ensure_future(self._timed_achat(self.members[nxt], model, messages, **kw)))
+                    nxt += 1
+            try:
+                while tasks:
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        reply = task.result()
+                        if not _failed(reply):
+                            return reply
+                        errors.append(reply)
+            finally:
+                for loser in tasks:
+                    loser.cancel()
+            i = nxt
+        return "[error:composite] all providers failed: " + "; ".join(errors)
+
+    # --- streaming --------------------------------------------------------
+
+    def _open_stream(self, member: _Member, model: str, messages, **kw) -> AsyncIterator[Delta]:
+        astream = getattr(member.provider, "astream", None)
+        if astream is not None:
+            return astream(self._model(member, model), messages, **kw)
+
+        async def single() -> AsyncIterator[Delta]:
+            yield Delta(text=await self._timed_achat(member, model, messages, **kw), finish_reason="stop")
+
+        return single()
+
+    async def _first(self, member: _Member, agen: AsyncIterator[Delta]) -> Tuple[Optional[Delta], str]:
+        start = time.monotonic()
+        try:
+            delta = await agen.__anext__()
+        except StopAsyncIteration:
+            return None, f"[error:{member.name}] empty stream"
+        except Exception as e:
+            return None, f"[error:{member.name}] {e}"
+        if delta.finish_reason == "error" or _failed(delta.text or ""):
+            return None, delta.text or f"[error:{member.name}] stream failed"
+        self.ttft[member.name].record(time.monotonic() - start)
+        return delta, ""
+
+    async def astream(self, model: str, messages, **kw) -> AsyncIterator[Delta]:
+        errors: List[str] = []
+        i = 0
+        while i < len(self.members):
+            streams = {}
+            m = self.members[i]
+            agen = self._open_stream(m, model, messages, **kw)
+            streams[asyncio.ensure_future(self._first(m, agen))] = agen
+            nxt = i + 1
+            if self.hedge and nxt < len(self.members):
+                done, _ = await asyncio.wait(list(streams), timeout=self.hedge_delay(m, streaming=True))
+                if not done:
+                    m2 = self.members[nxt]
+                    agen2 = self._open_stream(m2, model, messages, **kw)
+                    streams[asyncio.ensure_future(self._first(m2, agen2))] = agen2
+                    nxt += 1
+            winner = None
+            first: Optional[Delta] = None
+            pending = set(streams)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    delta, err = task.result()
+                    if delta is not None and winner is None:
+                        winner, first = streams[task], delta
+                    elif err:
+                        errors.append(err)
+            for task in pending:
+                task.cancel()
+            # let cancelled first-delta reads unwind before closing their generators
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task, agen in streams.items():
+                if agen is not winner:
+                    await _aclose(agen)
+            if winner is not None:
+                yield first
+                async for delta in winner:
+                    yield delta
+                return
+            i = nxt
+        yield Delta(text="[error:composite] all providers failed: " + "; ".join(errors), finish_reason="error")
+
+
+async def _aclose(agen) -> None:
+    aclose = getattr(agen, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
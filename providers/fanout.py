@@ -0,0 +1,201 @@
+"""Fan-out provider: one turn sent to several agents in parallel, then aggregated (first, majority or judge)."""
+
+import asyncio
+import contextvars
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from core.semantic_cache import last_user_text
+
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="fanout")
+
+STRATEGIES = ("first", "majority", "judge")
+JUDGE_PROMPT = (
+    "You are judging candidate answers to the user's last message. "
+    "Reply with only the number of the best candidate."
+)
+
+
+def _normalize(reply: str) -> str:
+    return " ".join(reply.lower().split()).rstrip(".!")
+
+
+class _Tally:
+    """Collects member replies in arrival order and says when the strategy is satisfied."""
+
+    def __init__(self, strategy: str, quorum: int, min_chars: int):
+        self.strategy = strategy
+        self.quorum = quorum
+        self.min_chars = min_chars
+        self.replies: List[Tuple[str, str]] = []  # acceptable (agent id, reply)
+        self.errors: List[str] = []
+        self.votes: Dict[str, int] = {}
+
+    def add(self, agent_id: str, reply: object) -> Optional[str]:
+        """The winning reply if this one settles it, else None."""
+        if not isinstance(reply, str) or reply.startswith("[error:") or len(reply.strip()) < self.min_chars:
+            self.errors.append(reply if isinstance(reply, str) and reply else f"[error:{agent_id}] unacceptable reply")
+            return None
+        self.replies.append((agent_id, reply))
+        if self.strategy == "first":
+            return reply
+        if self.strategy == "majority":
+            key = _normalize(reply)
+            self.votes[key] = self.votes.get(key, 0) + 1
+            if self.votes[key] >= self.quorum:
+                return next(r for _, r in self.replies if _normalize(r) == key)
+        return None
+
+    def plurality(self) -> str:
+        best = max(self.votes.values())
+        return next(r for _, r in self.replies if self.votes[_normalize(r)] == best)
+
+    def failed(self) -> str:
+        return "[error:fanout] all agents failed: " + "; ".join(self.errors)
+
+
+class FanoutProvider:
+    def __init__(
+        self,
+        members: List[object],
+        strategy: str = "first",
+        judge: Optional[object] = None,
+        quorum: Optional[int] = None,
+        min_chars: int = 1,
+        timeout: Optional[float] = None,
+    ):
+        if not members:
+            raise ValueError("fanout needs at least one agent")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown fanout strategy: {strategy}")
+        if strategy == "judge" and judge is None:
+            raise ValueError("fanout strategy 'judge' needs a judge agent")
+        self.members = members
+        self.strategy = strategy
+        self.judge = judge
+        self.quorum = quorum or len(members) // 2 + 1
+        self.min_chars = min_chars
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, cfg: Dict, agents) -> "FanoutProvider":
+        members = [agents.get(aid) for aid in cfg.get("agents") or []]
+        judge = agents.get(cfg["judge"]) if cfg.get("judge") else None
+        timeout = cfg.get("timeout")
+        return cls(
+            members,
+            cfg.get("strategy", "first"),
+            judge,
+            cfg.get("quorum"),
+            int(cfg.get("min_chars", 1)),
+            float(timeout) if timeout is not None else None,
+        )
+
+    def _tally(self) -> _Tally:
+        return _Tally(self.strategy, self.quorum, self.min_chars)
+
+    @staticmethod
+    def _prepare(agent, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        return agent.window.fit(agent.before_call(messages))
+
+    def _judge_messages(self, messages: List[Dict[str, str]], replies: List[Tuple[str, str]]) -> List[Dict[str, str]]:
+        candidates = "\n\n".join(f"Candidate {i}:\n{reply}" for i, (_, reply) in enumerate(replies, 1))
+        return [
+            {"role": "system", "content": JUDGE_PROMPT},
+            {"role": "user", "content": f"User message:\n{last_user_text(messages)}\n\n{candidates}"},
+        ]
+
+    @staticmethod
+    def _pick(verdict: str, replies: List[Tuple[str, str]]) -> str:
+        match = re.search(r"\d+", verdict or "")
+        i = int(match.group()) if match else 1
+        # an unusable verdict falls back to the earliest reply
+        return replies[i - 1][1] if 1 <= i <= len(replies) else replies[0][1]
+
+    def _decide(self, tally: _Tally) -> Optional[str]:
+        """Result once no more replies will come; None means the judge has to pick."""
+        if not tally.replies:
+            return tally.failed()
+        if self.strategy == "majority":
+            return tally.plurality()
+        if self.strategy == "judge" and len(tally.replies) > 1:
+            return None
+        return tally.replies[0][1]
+
+    # --- sync -------------------------------------------------------------
+
+    def _member_call(self, agent, messages, stop: threading.Event, **kw) -> str:
+        try:
+            prepared = self._prepare(agent, messages)
+            if stop.is_set():
+                return f"[error:{agent.spec.get('id', '')}] cancelled"  # decided already; keep the slot free
+            return agent.call(prepared, **kw)
+        except Exception as e:
+            return f"[error:{agent.spec.get('id', '')}] {e}"
+
+    def chat(self, model: str, messages, **kw) -> str:
+        tally = self._tally()
+        stop = threading.Event()
+        pending = {
+            _executor.submit(contextvars.copy_context().run, self._member_call, a, messages, stop, **kw): a
+            for a in self.members
+        }
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        try:
+            while pending:
+                left = None if deadline is None else max(0.0, deadline - time.monotonic())
+                done, _ = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+                if not done:
+                    break  # timed out: decide with what has arrived
+                for fut in done:
+                    agent = pending.pop(fut)
+                    winner = tally.add(agent.spec.get("id", ""), fut.result())
+                    if winner is not None:
+                        return winner
+        finally:
+            stop.set()
+            for fut in pending:
+                fut.cancel()  # a call already in flight can't be stopped; its result is dropped
+        decided = self._decide(tally)
+        if decided is not None:
+            return decided
+        verdict = self.judge.call(self._prepare(self.judge, self._judge_messages(messages, tally.replies)))
+        return self._pick(verdict, tally.replies)
+
+    # --- async ------------------------------------------------------------
+
+    async def _member_acall(self, agent, messages, **kw) -> str:
+        try:
+            return await agent.acall(self._prepare(agent, messages), **kw)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return f"[error:{agent.spec.get('id', '')}] {e}"
+
+    async def achat(self, model: str, messages, **kw) -> str:
+        tally = self._tally()
+        tasks = {asyncio.ensure_future(self._member_acall(a, messages, **kw)): a for a in self.members}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout if self.timeout is not None else None
+        pending = set(tasks)
+        try:
+            while pending:
+                left = None if deadline is None else max(0.0, deadline - loop.time())
+                done, pending = await asyncio.wait(pending, timeout=left, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    winner = tally.add(tasks[task].spec.get("id", ""), task.result())
+                    if winner is not None:
+                        return winner
+        finally:
+            for task in pending:
+                task.cancel()
+        decided = self._decide(tally)
+        if decided is not None:
+            return decided
+        verdict = await self.judge.acall(self._prepare(self.judge, self._judge_messages(messages, tally.replies)))
+        return self._pick(verdict, tally.replies)
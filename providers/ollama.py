@@ -1,49 +1,276 @@
-from typing import List, Dict, Any, Optional, Iterator
+"""Ollama provider.
+
+With ``OLLAMA_REUSE_CONTEXT=1`` chat and streaming go through /api/generate
+and keep the ``context`` token array Ollama returns after each reply. The next
+turn of the same conversation sends only its new user message plus that
+context, so the model skips re-prefilling the whole history. Contexts are
+keyed by a fingerprint of the exact conversation they encode: edited, trimmed
+or summarized history misses and the prompt is rebuilt in full, as it is when
+Ollama rejects a stale context. ``OLLAMA_KEEP_ALIVE`` (default ``30m``) is sent
+with every request so the model stays loaded between turns.
+"""
+
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator
+import hashlib
+import json
 import os
-import requests
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import httpx
+
+from core import resilience, trace, transport
+from core.stream import Delta
+from core.stream_parser import aiter_ollama_ndjson_bytes, iter_ollama_ndjson_bytes
+
+DEFAULT_SYSTEM = (
+    "You are a helpful assistant. Answer concisely in complete sentences. "
+    "Do not repeat the user's words unless explicitly asked."
+)
+
+
+def keep_alive() -> Any:
+    raw = os.getenv("OLLAMA_KEEP_ALIVE", "30m").strip()
+    try:
+        return int(raw)  # bare numbers are seconds; -1 keeps the model loaded indefinitely
+    except ValueError:
+        return raw or None
+
+
+def _turn(m: Dict[str, Any]) -> str:
+    prefix = "Assistant" if m.get("role") == "assistant" else "User"
+    return f"{prefix}: {m.get('content', '')}\n"
+
+
+def flatten_prompt(messages: List[Dict[str, Any]]) -> str:
+    # Compose a clearer dialogue-style prompt to reduce parroting
+    sys_text = None
+    turns: List[str] = []
+    for m in messages:
+        if m.get("role") == "system":
+            sys_text = m.get("content", "")
+        else:
+            turns.append(_turn(m))
+    return f"System: {sys_text or DEFAULT_SYSTEM}\n" + "".join(turns) + "Assistant: "
+
+
+class ContextCache:
+    """Ollama ``context`` arrays by fingerprint of (model, conversation including the reply)."""
+
+    def __init__(self, max_entries: int = 256, max_tokens: int = 1536):
+        self.max_entries = max_entries
+        # past the model's num_ctx Ollama silently drops the oldest tokens, system prompt included
+        self.max_tokens = max_tokens
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(model: str, messages: List[Dict[str, Any]]) -> str:
+        turns = [(m.get("role"), m.get("content")) for m in messages]
+        return hashlib.sha256(json.dumps([model, turns], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def take(self, model: str, messages: List[Dict[str, Any]]) -> Optional[List[int]]:
+        """The context for everything before the trailing user message, removed from the cache."""
+        if len(messages) < 2 or messages[-1].get("role") != "user":
+            return None
+        key = self.fingerprint(model, messages[:-1])
+        with self._lock:
+            context = self._entries.pop(key, None)
+            if context is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return context
+
+    def put(self, model: str, messages: List[Dict[str, Any]], reply: str, context: List[int]) -> None:
+        if not context or len(context) > self.max_tokens:
+            return
+        key = self.fingerprint(model, list(messages) + [{"role": "assistant", "content": reply}])
+        with self._lock:
+            self._entries[key] = context
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+
+@lru_cache(maxsize=None)
+def context_cache() -> ContextCache:
+    num_ctx = int(os.getenv("OLLAMA_NUM_CTX", "2048"))
+    # leave room for the next user message and reply
+    return ContextCache(int(os.getenv("OLLAMA_CONTEXT_CACHE_SIZE", "256")), max_tokens=num_ctx * 3 // 4)
 
 
 class OllamaProvider:
-    def __init__(self):
+    def __init__(self, reuse_context: Optional[bool] = None):
         self.base_url = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
+        if reuse_context is None:
+            reuse_context = os.getenv("OLLAMA_REUSE_CONTEXT", "0").lower() in ("1", "true", "yes")
+        self.reuse_context = reuse_context
+        self.contexts = context_cache()
 
-    def chat(self, messages: List[Dict[str, Any]], model_override: Optional[str] = None) -> str:
+    @staticmethod
+    def _model(model: Optional[str]) -> str:
         # Default to a Qwen instruct if not specified
-        model = model_override or os.getenv("MODEL_NAME", "qwen2.5:7b-instruct")
+        return model or os.getenv("MODEL_NAME", "qwen2.5:7b-instruct")
+
+    def chat(self, model: str, messages: List[Dict[str, Any]], **kw) -> str:
+        if self.reuse_context:
+            return "".join(d.text for d in self.iter_generate(messages, model))
+        model = self._model(model)
+        url = f"{self.base_url}/api/chat"
+        payload = {"model": model, "messages": messages, "stream": False, "keep_alive": keep_alive()}
+        client = transport.get_client(url)
+
+        def post():
+            resp = client.post(url, json=payload, timeout=kw.get("timeout", 60))
+            resp.raise_for_status()
+            return resp
+
+        with trace.span("request"):
+            resp = resilience.call("ollama", post)
+        with trace.span("decode"):
+            data = resp.json()
+        return data.get("message", {}).get("content", "")
+
+    async def achat(self, model: str, messages: List[Dict[str, Any]], **kw) -> str:
+        if self.reuse_context:
+            return "".join([d.text async for d in self.aiter_generate(messages, model)])
+        model = self._model(model)
         url = f"{self.base_url}/api/chat"
-        payload = {"model": model, "messages": messages, "stream": False}
-        resp = requests.post(url, json=payload, timeout=60)
-        resp.raise_for_status()
-        data = resp.json()
+        payload = {"model": model, "messages": messages, "stream": False, "keep_alive": keep_alive()}
+        client = transport.get_async_client(url)
+
+        async def post():
+            resp = await client.post(url, json=payload, timeout=kw.get("timeout", 60))
+            resp.raise_for_status()
+            return resp
+
+        with trace.span("request"):
+            resp = await resilience.acall("ollama", post)
+        with trace.span("decode"):
+            data = resp.json()
         return data.get("message", {}).get("content", "")
 
-    def stream_generate(self, messages: List[Dict[str, Any]], model_override: Optional[str] = None):
-        model = model_override or os.getenv("MODEL_NAME", "qwen2.5:7b-instruct")
+    def stream(self, model: str, messages: List[Dict[str, Any]], **kw) -> Iterator[Delta]:
+        if self.reuse_context:
+            yield from self.iter_generate(messages, model)
+            return
+        model = self._model(model)
+        url = f"{self.base_url}/api/chat"
+        payload = {"model": model, "messages": messages, "stream": True, "keep_alive": keep_alive()}
+        client = transport.get_client(url)
+        request = client.build_request("POST", url, json=payload, timeout=None)
+        with trace.span("request"):
+            resp = resilience.call("ollama", lambda: transport.send_stream(client, request))
+        try:
+            yield from iter_ollama_ndjson_bytes(resp.iter_bytes())
+        finally:
+            resp.close()
+
+    async def astream(self, model: str, messages: List[Dict[str, Any]], **kw) -> AsyncIterator[Delta]:
+        if self.reuse_context:
+            async for delta in self.aiter_generate(messages, model):
+                yield delta
+            return
+        model = self._model(model)
+        url = f"{self.base_url}/api/chat"
+        payload = {"model": model, "messages": messages, "stream": True, "keep_alive": keep_alive()}
+        client = transport.get_async_client(url)
+        request = client.build_request("POST", url, json=payload, timeout=None)
+        with trace.span("request"):
+            resp = await resilience.acall("ollama", lambda: transport.asend_stream(client, request))
+        try:
+            async for delta in aiter_ollama_ndjson_bytes(resp.aiter_bytes()):
+                yield delta
+        finally:
+            await resp.aclose()
+
+    def _generate_payload(self, model: str, messages: List[Dict[str, Any]], context: Optional[List[int]] = None) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"model": model, "stream": True, "keep_alive": keep_alive()}
+        if context:
+            payload["prompt"] = _turn(messages[-1]) + "Assistant: "
+            payload["context"] = context
+        else:
+            payload["prompt"] = flatten_prompt(messages)
+        if os.getenv("OLLAMA_NUM_CTX"):
+            payload["options"] = {"num_ctx": int(os.environ["OLLAMA_NUM_CTX"])}
+        return payload
+
+    def stream_generate(self, messages: List[Dict[str, Any]], model_override: Optional[str] = None) -> httpx.Response:
+        """Open a streamed /api/generate call with the whole conversation flattened into the prompt."""
         url = f"{self.base_url}/api/generate"
-        # Compose a clearer dialogue-style prompt to reduce parroting
-        sys_text = None
-        turns: List[str] = []
-        for m in messages:
-            role = m.get("role", "user")
-            content = m.get("content", "")
-            if role == "system":
-                sys_text = content
-            elif role == "assistant":
-                turns.append(f"Assistant: {content}\n")
-            else:
-                turns.append(f"User: {content}\n")
-        if not sys_text:
-            sys_text = (
-                "You are a helpful assistant. Answer concisely in complete sentences. "
-                "Do not repeat the user's words unless explicitly asked."
-            )
-        prompt = f"System: {sys_text}\n" + "".join(turns) + "Assistant: "
-        payload = {"model": model, "prompt": prompt, "stream": True}
-        # Use no overall timeout for the stream; the client can cancel
-        resp = requests.post(url, json=payload, stream=True, timeout=None)
-        resp.raise_for_status()
-        return resp
+        payload = self._generate_payload(self._model(model_override), messages)
+        # Use no overall timeout for the stream; the client can cancel (and must close the response)
+        client = transport.get_client(url)
+        request = client.build_request("POST", url, json=payload, timeout=None)
+        return resilience.call("ollama", lambda: transport.send_stream(client, request))
+
+    def _open_generate(self, model: str, messages: List[Dict[str, Any]]) -> httpx.Response:
+        url = f"{self.base_url}/api/generate"
+        client = transport.get_client(url)
+        context = self.contexts.take(model, messages) if self.reuse_context else None
+        if context:
+            # one direct attempt: a rejected context is not an upstream failure worth retrying
+            request = client.build_request("POST", url, json=self._generate_payload(model, messages, context), timeout=None)
+            try:
+                return transport.send_stream(client, request)
+            except httpx.HTTPError:
+                self.contexts.invalidations += 1
+        request = client.build_request("POST", url, json=self._generate_payload(model, messages), timeout=None)
+        return resilience.call("ollama", lambda: transport.send_stream(client, request))
+
+    async def _aopen_generate(self, model: str, messages: List[Dict[str, Any]]) -> httpx.Response:
+        url = f"{self.base_url}/api/generate"
+        client = transport.get_async_client(url)
+        context = self.contexts.take(model, messages) if self.reuse_context else None
+        if context:
+            request = client.build_request("POST", url, json=self._generate_payload(model, messages, context), timeout=None)
+            try:
+                return await transport.asend_stream(client, request)
+            except httpx.HTTPError:
+                self.contexts.invalidations += 1
+        request = client.build_request("POST", url, json=self._generate_payload(model, messages), timeout=None)
+        return await resilience.acall("ollama", lambda: transport.asend_stream(client, request))
+
+    def iter_generate(self, messages: List[Dict[str, Any]], model_override: Optional[str] = None) -> Iterator[Delta]:
+        """Deltas from /api/generate (reusing a cached context when allowed), closing the response when done or abandoned."""
+        model = self._model(model_override)
+        with trace.span("request"):
+            resp = self._open_generate(model, messages)
+        final: Dict[str, Any] = {}
+        parts: List[str] = []
+        try:
+            for delta in iter_ollama_ndjson_bytes(resp.iter_bytes(), on_done=final.update):
+                parts.append(delta.text)
+                yield delta
+        finally:
+            resp.close()
+        if self.reuse_context:
+            self.contexts.put(model, messages, "".join(parts), final.get("context") or [])
+
+    async def aiter_generate(self, messages: List[Dict[str, Any]], model_override: Optional[str] = None) -> AsyncIterator[Delta]:
+        model = self._model(model_override)
+        with trace.span("request"):
+            resp = await self._aopen_generate(model, messages)
+        final: Dict[str, Any] = {}
+        parts: List[str] = []
+        try:
+            async for delta in aiter_ollama_ndjson_bytes(resp.aiter_bytes(), on_done=final.update):
+                parts.append(delta.text)
+                yield delta
+        finally:
+            await resp.aclose()
+        if self.reuse_context:
+            self.contexts.put(model, messages, "".join(parts), final.get("context") or [])
 
 
+@lru_cache(maxsize=None)
 def provider_instance():
     return OllamaProvider()
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import List, Dict
 
 
@@ -6,6 +7,7 @@ class OpenAIProvider:
         return "[stub:openai] " + (messages[-1]["content"] if messages else "")
 
 
+@lru_cache(maxsize=None)
 def provider_instance():
     return OpenAIProvider()
 
@@ -1,8 +1,11 @@
-import json
 import os
 import sys
-from typing import List, Dict
-import urllib.request
+from functools import lru_cache
+from typing import AsyncIterator, Iterator, List, Dict
+
+from core import resilience, trace, transport
+from core.stream import Delta
+from core.stream_parser import aiter_openai_sse_bytes, iter_openai_sse_bytes
 
 
 class OpenRouterQwenProvider:
@@ -12,21 +15,52 @@ class OpenRouterQwenProvider:
         if not self.api_key:
             print("Missing OPENROUTER_API_KEY for Qwen provider", file=sys.stderr)
 
-    def chat(self, model: str, messages: List[Dict[str, str]], **kw) -> str:
-        url = f"{self.base_url}/chat/completions"
-        payload = {
+    def _payload(self, model: str, messages: List[Dict[str, str]]) -> Dict:
+        return {
             "model": model or "deepseek/deepseek-r1-0528-qwen3-8b:free",
             "messages": messages,
         }
-        data = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(url, data=data, method="POST")
-        req.add_header("Content-Type", "application/json")
-        req.add_header("Authorization", f"Bearer {self.api_key}")
+
+    def chat(self, model: str, messages: List[Dict[str, str]], **kw) -> str:
+        url = f"{self.base_url}/chat/completions"
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        timeout = kw.get("timeout", 20)
+        client = transport.get_client(url)
+
+        def post():
+            resp = client.post(url, json=self._payload(model, messages), headers=headers, timeout=timeout)
+            resp.raise_for_status()
+            return resp
+
+        try:
+            with trace.span("request"):
+                resp = resilience.call("openrouter", post)
+            with trace.span("decode"):
+                parsed = resp.json()
+        except Exception as e:
+            return f"[error:qwen] {e}"
+
+        try:
+            return parsed["choices"][0]["message"]["content"]
+        except Exception:
+            return "[error:qwen] malformed response"
+
+    async def achat(self, model: str, messages: List[Dict[str, str]], **kw) -> str:
+        url = f"{self.base_url}/chat/completions"
+        headers = {"Authorization": f"Bearer {self.api_key}"}
         timeout = kw.get("timeout", 20)
+        client = transport.get_async_client(url)
+
+        async def post():
+            resp = await client.post(url, json=self._payload(model, messages), headers=headers, timeout=timeout)
+            resp.raise_for_status()
+            return resp
+
         try:
-            with urllib.request.urlopen(req, timeout=timeout) as resp:
-                body = resp.read()
-                parsed = json.loads(body)
+            with trace.span("request"):
+                resp = await resilience.acall("openrouter", post)
+            with trace.span("decode"):
+                parsed = resp.json()
         except Exception as e:
             return f"[error:qwen] {e}"
 
@@ -35,6 +69,47 @@ class OpenRouterQwenProvider:
         except Exception:
             return "[error:qwen] malformed response"
 
+    def stream(self, model: str, messages: List[Dict[str, str]], **kw) -> Iterator[Delta]:
+        url = f"{self.base_url}/chat/completions"
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        payload = dict(self._payload(model, messages), stream=True, stream_options={"include_usage": True})
+        client = transport.get_client(url)
+        request = client.build_request("POST", url, json=payload, headers=headers, timeout=kw.get("timeout", 20))
+        try:
+            with trace.span("request"):
+                resp = resilience.call("openrouter", lambda: transport.send_stream(client, request))
+        except Exception as e:
+            yield Delta(text=f"[error:qwen] {e}", finish_reason="error")
+            return
+        try:
+            yield from iter_openai_sse_bytes(resp.iter_bytes())
+        except Exception as e:
+            yield Delta(text=f"[error:qwen] {e}", finish_reason="error")
+        finally:
+            resp.close()
+
+    async def astream(self, model: str, messages: List[Dict[str, str]], **kw) -> AsyncIterator[Delta]:
+        url = f"{self.base_url}/chat/completions"
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        payload = dict(self._payload(model, messages), stream=True, stream_options={"include_usage": True})
+        timeout = kw.get("timeout", 20)
+        client = transport.get_async_client(url)
+        request = client.build_request("POST", url, json=payload, headers=headers, timeout=timeout)
+        try:
+            with trace.span("request"):
+                resp = await resilience.acall("openrouter", lambda: transport.asend_stream(client, request))
+        except Exception as e:
+            yield Delta(text=f"[error:qwen] {e}", finish_reason="error")
+            return
+        try:
+            async for delta in aiter_openai_sse_bytes(resp.aiter_bytes()):
+                yield delta
+        except Exception as e:
+            yield Delta(text=f"[error:qwen] {e}", finish_reason="error")
+        finally:
+            await resp.aclose()
+
 
+@lru_cache(maxsize=None)
 def provider_instance():
     return OpenRouterQwenProvider()
@@ -0,0 +1,97 @@
+"""Precomputed routing index over agent specs; routing a turn never calls an LLM.
+
+Each spec's ``routing`` block may list ``tags`` and ``keywords`` (matched as
+words against the user turn through an inverted index weighted by IDF) and
+``examples`` (sample user messages embedded into a per-agent centroid when
+numpy is available). A turn only switches away from the active agent (or, on
+the first turn, the default one) when the winner's confidence reaches ``threshold``.
+"""
+
+import math
+import re
+from typing import Callable, Dict, List, Optional, Set
+
+from core.types import AgentSpec
+from core.semantic_cache import HashingEmbedder, load_numpy
+
+_WORD = re.compile(r"\w+")
+
+
+def _words(text: str) -> Set[str]:
+    return set(_WORD.findall(text.lower()))
+
+
+class RouterIndex:
+    def __init__(
+        self,
+        specs: List[AgentSpec],
+        threshold: float = 0.6,
+        default: Optional[str] = None,
+        embedder: Optional[Callable] = None,
+    ):
+        self.threshold = threshold
+        self.ids = [s.get("id", "") for s in specs]
+        self.default = default if default in self.ids else (self.ids[0] if self.ids else None)
+        self.inverted: Dict[str, Dict[str, float]] = {}
+
+        vocab: Dict[str, Set[str]] = {}
+        self._has_keywords: Set[str] = set()
+        for spec in specs:
+            routing = spec.get("routing") or {}
+            terms = list(routing.get("tags") or []) + list(routing.get("keywords") or [])
+            vocab[spec.get("id", "")] = set().union(*[_words(t) for t in terms]) if terms else set()
+            if terms:
+                self._has_keywords.add(spec.get("id", ""))
+        df: Dict[str, int] = {}
+        for words in vocab.values():
+            for w in words:
+                df[w] = df.get(w, 0) + 1
+        n = max(1, len(vocab))
+        for aid, words in vocab.items():
+            for w in words:
+                # rarer words are better evidence for a single agent
+                self.inverted.setdefault(w, {})[aid] = math.log(1 + n / df[w])
+
+        self.centroids = None
+        self.centroid_ids: List[str] = []
+        self.embed = None
+        examples = {s.get("id", ""): (s.get("routing") or {}).get("examples") or [] for s in specs}
+        np = load_numpy() if any(examples.values()) else None
+        if np is not None:
+            self.embed = embedder or HashingEmbedder()
+            rows = []
+            for aid, texts in examples.items():
+                if not texts:
+                    continue
+                c = np.mean([self.embed(t) for t in texts], axis=0)
+                norm = float(np.linalg.norm(c))
+                rows.append(c / norm if norm else c)
+                self.centroid_ids.append(aid)
+            self.centroids = np.stack(rows)
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Per-agent confidence in [0, 1] for this turn."""
+        kw: Dict[str, float] = {}
+        for w in _words(text):
+            for aid, weight in self.inverted.get(w, {}).items():
+                kw[aid] = kw.get(aid, 0.0) + weight
+        total = sum(kw.values())
+        out = {aid: s / total for aid, s in kw.items()} if total else {}
+        if self.centroids is not None:
+            sims = self.centroids @ self.embed(text)
+            for aid, sim in zip(self.centroid_ids, sims):
+                sim = max(0.0, float(sim))
+                # blend keyword share with cosine similarity when the agent has both signals
+                out[aid] = 0.5 * out.get(aid, 0.0) + 0.5 * sim if aid in self._has_keywords else sim
+        return out
+
+    def route(self, text: str, active: Optional[str]) -> str:
+        if not self.ids:
+            raise RuntimeError("No agent specs available")
+        scores = self.scores(text)
+        best = max(scores, key=scores.get) if scores else None
+        # the first turn leaves the default agent on the same evidence a switch needs
+        current = active or self.default
+        if best and best != current and scores[best] >= self.threshold and scores[best] > scores.get(current, 0.0):
+            return best
+        return current
@@ -1,12 +1,19 @@
 from typing import List, Optional
 
 from core.types import AgentSpec
+from router.index import RouterIndex
 
 
-def select_agent(text: str, agent_specs: List[AgentSpec], active: Optional[str]) -> str:
-    if active:
-        return active
+def select_agent(
+    text: str,
+    agent_specs: List[AgentSpec],
+    active: Optional[str],
+    index: Optional[RouterIndex] = None,
+) -> str:
     if not agent_specs:
+        if active:
+            return active
         raise RuntimeError("No agent specs available")
-    return agent_specs[0].get("id", "")
-
+    if index is None:
+        index = RouterIndex(agent_specs)
+    return index.route(text, active)
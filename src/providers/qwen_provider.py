@@ -5,9 +5,11 @@ from __future__ import annotations
 
 import os
 from types import ModuleType
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 
-import requests
+from core import resilience, trace, transport
+from core.stream import Delta
+from core.stream_parser import aiter_openai_sse_bytes, iter_openai_sse_bytes
 
 # Try to load config to ensure .env is read if available
 _config_module: Optional[ModuleType]
@@ -28,22 +30,95 @@ class QwenProvider:
         self.model = getattr(_config, "MODEL_NAME", None) or os.getenv(
             "MODEL_NAME", "deepseek/deepseek-r1-0528-qwen3-8b:free"
         )
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+        base = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
+        self.base_url = f"{base}/chat/completions"
 
-    def chat(
-        self, messages: List[Dict[str, Any]], model_override: str | None = None
-    ) -> str:
+    def _headers(self) -> Dict[str, str]:
         if not self.api_key:
             raise RuntimeError(
                 "OPENROUTER_API_KEY is not set. Set it in OS env or in a .env file."
             )
-        headers = {
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
+
+    def chat(
+        self, messages: List[Dict[str, Any]], model_override: str | None = None
+    ) -> str:
+        headers = self._headers()
+        model = model_override or self.model
+        payload = {"model": model, "messages": messages}
+        client = transport.get_client(self.base_url)
+
+        def post():
+            resp = client.post(self.base_url, json=payload, headers=headers, timeout=30)
+            resp.raise_for_status()
+            return resp
+
+        with trace.span("request"):
+            resp = resilience.call("openrouter", post)
+        with trace.span("decode"):
+            data = resp.json()
+        return data["choices"][0]["message"]["content"]
+
+    async def achat(
+        self, messages: List[Dict[str, Any]], model_override: str | None = None
+    ) -> str:
+        headers = self._headers()
         model = model_override or self.model
         payload = {"model": model, "messages": messages}
-        resp = requests.post(self.base_url, json=payload, headers=headers, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
+        client = transport.get_async_client(self.base_url)
+
+        async def post():
+            resp = await client.post(self.base_url, json=payload, headers=headers, timeout=30)
+            resp.raise_for_status()
+            return resp
+
+        with trace.span("request"):
+            resp = await resilience.acall("openrouter", post)
+        with trace.span("decode"):
+            data = resp.json()
         return data["choices"][0]["message"]["content"]
+
+    def _stream_payload(self, messages: List[Dict[str, Any]], model_override: str | None) -> Dict[str, Any]:
+        return {
+            "model": model_override or self.model,
+            "messages": messages,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+
+    def stream(
+        self, messages: List[Dict[str, Any]], model_override: str | None = None
+    ) -> Iterator[Delta]:
+        headers = self._headers()
+        client = transport.get_client(self.base_url)
+        request = client.build_request(
+            "POST", self.base_url, json=self._stream_payload(messages, model_override), headers=headers, timeout=30
+        )
+        with trace.span("request"):
+            resp = resilience.call("openrouter", lambda: transport.send_stream(client, request))
+        try:
+            yield from iter_openai_sse_bytes(resp.iter_bytes())
+        finally:
+            resp.close()
+
+    async def astream(
+        self, messages: List[Dict[str, Any]], model_override: str | None = None
+    ) -> AsyncIterator[Delta]:
+        headers = self._headers()
+        client = transport.get_async_client(self.base_url)
+        request = client.build_request(
+            "POST", self.base_url, json=self._stream_payload(messages, model_override), headers=headers, timeout=30
+        )
+        # Only opening the stream is retried; once tokens flow a failure is final
+        with trace.span("request"):
+            resp = await resilience.acall(
+                "openrouter", lambda: transport.asend_stream(client, request)
+            )
+        try:
+            async for delta in aiter_openai_sse_bytes(resp.aiter_bytes()):
+                yield delta
+        finally:
+            await resp.aclose()
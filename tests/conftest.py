@@ -10,3 +10,16 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+import pytest
+
+from core import resilience
+
+
+@pytest.fixture(autouse=True)
+def _fresh_breakers(monkeypatch):
+    # Circuit breakers are process-wide; keep tests independent and retries instant
+    resilience.reset()
+    monkeypatch.setattr(resilience, "DEFAULT_POLICY", resilience.RetryPolicy(base_delay=0.0, max_delay=0.0))
+    yield
+    resilience.reset()
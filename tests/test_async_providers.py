@@ -0,0 +1,69 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+from core import transport
+from core.agent import Agent
+from providers.ollama import OllamaProvider
+from providers.openrouter_qwen import OpenRouterQwenProvider
+from src.providers.qwen_provider import QwenProvider
+
+
+def mock_client(handler):
+    async def wrapped(request):
+        return await handler(request)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(wrapped))
+
+
+def test_qwen_provider_achat_runs_concurrently(monkeypatch):
+    async def handler(request):
+        await asyncio.sleep(0.2)
+        body = json.loads(request.content)
+        return httpx.Response(200, json={"choices": [{"message": {"content": body["model"]}}]})
+
+    async def main():
+        monkeypatch.setattr(transport, "get_async_client", lambda url: mock_client(handler))
+        provider = QwenProvider()
+        provider.api_key = "token"
+        start = time.perf_counter()
+        replies = await asyncio.gather(*[provider.achat([], model_override=f"m{i}") for i in range(20)])
+        return replies, time.perf_counter() - start
+
+    replies, elapsed = asyncio.run(main())
+    assert replies == [f"m{i}" for i in range(20)]
+    assert elapsed < 1.0
+
+
+def test_openrouter_achat_returns_error_string(monkeypatch):
+    async def handler(request):
+        return httpx.Response(500, json={"error": "boom"})
+
+    async def main():
+        monkeypatch.setattr(transport, "get_async_client", lambda url: mock_client(handler))
+        return await OpenRouterQwenProvider().achat("m", [{"role": "user", "content": "hi"}])
+
+    assert asyncio.run(main()).startswith("[error:qwen]")
+
+
+def test_ollama_achat_reads_message(monkeypatch):
+    async def handler(request):
+        assert request.url.path == "/api/chat"
+        return httpx.Response(200, json={"message": {"content": "local"}})
+
+    async def main():
+        monkeypatch.setattr(transport, "get_async_client", lambda url: mock_client(handler))
+        return await OllamaProvider().achat("", [{"role": "user", "content": "hi"}])
+
+    assert asyncio.run(main()) == "local"
+
+
+def test_agent_acall_offloads_sync_provider():
+    class SyncProvider:
+        def chat(self, model, messages, **kw):
+            return f"{model}:{messages[-1]['content']}"
+
+    agent = Agent({"id": "a", "model": "m"}, SyncProvider())
+    assert asyncio.run(agent.acall([{"role": "user", "content": "x"}])) == "m:x"
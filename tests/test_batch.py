@@ -0,0 +1,129 @@
+import asyncio
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+import webserver
+from core import batch, scheduler
+from core.agent import Agent
+from core.registry import AgentRegistry
+from core.sessions import SessionStore
+
+
+class SlowEcho:
+    def __init__(self, busy_once=False):
+        self.busy_once = busy_once
+        self.calls = 0
+
+    async def achat(self, model, messages, **kw):
+        self.calls += 1
+        if self.busy_once and self.calls == 1:
+            raise scheduler.QueueFullError("fake", retry_in=0.0)
+        text = messages[-1]["content"]
+        await asyncio.sleep(0.05 if text != "fast" else 0.0)
+        if text == "boom":
+            return "[error:fake] boom"
+        return f"echo {text}"
+
+    def chat(self, model, messages, **kw):
+        raise AssertionError("batch runs async")
+
+
+def make_agents(provider=None):
+    agents = AgentRegistry()
+    agents.register(Agent({"id": "main", "model": "m", "policies": {"coalesce": False}}, provider or SlowEcho()))
+    return agents
+
+
+def run(agents, records, concurrency):
+    results = []
+
+    async def main():
+        runner = batch.BatchRunner(agents, results.append, concurrency)
+        for record in records:
+            await runner.submit(record)
+        return await runner.join()
+
+    return asyncio.run(main()), results
+
+
+def test_conversations_run_concurrently_and_finish_in_completion_order():
+    records = [{"id": f"r{i}", "message": f"q{i}"} for i in range(20)]
+    records.insert(3, {"id": "quick", "message": "fast"})
+    start = time.perf_counter()
+    stats, results = run(make_agents(), records, concurrency=10)
+    assert time.perf_counter() - start < 0.5  # 21 calls of 50 ms, ten at a time
+    assert stats == {"submitted": 21, "skipped": 0, "ok": 21, "failed": 0}
+    assert results[0]["id"] == "quick"  # finished first, written first
+    assert {r["id"]: r["reply"] for r in results}["r7"] == "echo q7"
+
+
+def test_turns_errors_and_busy_retry():
+    lines = [b'{"id": "t", "turns": ["a", "b"], "system_prompt": "s"}', b"not json", b"", b'{"message": "boom"}']
+    records = [r for r in (batch.parse_line(line, i) for i, line in enumerate(lines, 1)) if r is not None]
+    provider = SlowEcho(busy_once=True)
+    stats, results = run(make_agents(provider), records, concurrency=4)
+    by_id = {r["id"]: r for r in results}
+    assert by_id["t"]["replies"] == ["echo a", "echo b"] and by_id["t"]["agent"] == "main"
+    assert by_id["2"]["error"].startswith("invalid JSON")
+    assert by_id["4"]["error"] == "[error:fake] boom"
+    assert stats["ok"] == 1 and stats["failed"] == 2
+
+
+def test_run_file_resumes_after_a_crash(tmp_path):
+    src = tmp_path / "in.jsonl"
+    src.write_text("".join(json.dumps({"id": f"r{i}", "message": f"q{i}"}) + "\n" for i in range(4)))
+    out = tmp_path / "out.jsonl"
+    # a previous run finished r0, failed r1 and died while writing r2
+    out.write_bytes(b'{"id": "r0", "reply": "old"}\n{"id": "r1", "error": "x"}\n{"id": "r2", "re')
+
+    stats = batch.run_file(make_agents(), str(src), str(out), concurrency=2)
+
+    assert stats["skipped"] == 1 and stats["ok"] == 3
+    rows = [json.loads(line) for line in out.read_text().splitlines()]
+    assert rows[:2] == [{"id": "r0", "reply": "old"}, {"id": "r1", "error": "x"}]
+    assert sorted(r["id"] for r in rows[2:]) == ["r1", "r2", "r3"]
+
+
+def test_batch_endpoint_spools_the_job_and_resumes_it(monkeypatch, tmp_path):
+    monkeypatch.setenv("WARMUP", "0")
+    monkeypatch.setattr(webserver, "sessions", SessionStore(make_agents()))
+    monkeypatch.setattr(webserver, "BATCH_DIR", str(tmp_path))
+    body = "".join(json.dumps({"id": f"r{i}", "message": f"q{i}"}) + "\n" for i in range(5))
+
+    def wait_done(client, job):
+        for _ in range(100):
+            resp = client.get(f"/api/chat/batch/{job}")
+            if resp.headers["X-Batch-Status"] == "done":
+                return resp
+            time.sleep(0.02)
+        raise AssertionError("batch job did not finish")
+
+    with TestClient(webserver.app) as client:
+        resp = client.post("/api/chat/batch?job=nightly&concurrency=5", content=body)
+        # answered before any conversation has run
+        assert resp.status_code == 202 and resp.json()["job"] == "nightly"
+        assert resp.headers["Location"] == "/api/chat/batch/nightly"
+        assert client.post("/api/chat/batch?job=nightly", content=body).status_code == 409
+        done = wait_done(client, "nightly")
+        assert done.headers["content-type"].startswith("application/x-ndjson")
+        assert sorted(json.loads(line)["id"] for line in done.text.splitlines()) == [f"r{i}" for i in range(5)]
+
+        assert client.post("/api/chat/batch?job=nightly", content=body).status_code == 202
+        again = wait_done(client, "nightly")
+        assert again.headers["X-Batch-Skipped"] == "5" and len(again.text.splitlines()) == 5
+
+        unnamed = client.post("/api/chat/batch", content=body).json()["job"]
+        assert len(wait_done(client, unnamed).text.splitlines()) == 5
+        assert client.post("/api/chat/batch?job=../etc", content=body).status_code == 400
+        assert client.get("/api/chat/batch/missing").status_code == 404
+
+
+def test_batch_stats_keep_only_recent_finished_jobs(monkeypatch):
+    monkeypatch.setattr(webserver, "BATCH_KEEP_STATS", 1)
+    monkeypatch.setattr(webserver, "_batch_stats", webserver.OrderedDict())
+    monkeypatch.setattr(webserver, "_batch_tasks", {"live": object()})
+    for job in ["live", "a", "b", "c"]:
+        webserver._keep_stats(job, {"ok": 1})
+    assert list(webserver._batch_stats) == ["live", "b", "c"]
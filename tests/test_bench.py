@@ -0,0 +1,51 @@
+from fastapi.testclient import TestClient
+
+from bench.load_bench import compare, percentile, summarize
+from bench.standin import Behaviour, create_app
+from core.stream_parser import iter_ollama_ndjson_bytes, iter_openai_sse_bytes
+
+
+def standin(**kw):
+    return TestClient(create_app(Behaviour(latency=0.0, tokens_per_sec=0, tokens=3, **kw)))
+
+
+def test_standin_serves_openai_json_and_sse():
+    client = standin()
+    body = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+    reply = client.post("/api/v1/chat/completions", json=body).json()
+    assert reply["choices"][0]["message"]["content"] == "tok0 tok1 tok2 "
+
+    resp = client.post("/api/v1/chat/completions", json=dict(body, stream=True, stream_options={"include_usage": True}))
+    deltas = list(iter_openai_sse_bytes([resp.content]))
+    assert "".join(d.text for d in deltas) == "tok0 tok1 tok2 "
+    assert deltas[-1].usage["completion_tokens"] == 3
+
+
+def test_standin_serves_ollama_ndjson_and_preloads():
+    client = standin()
+    resp = client.post("/api/generate", json={"model": "m", "prompt": "hi"})
+    final = {}
+    assert "".join(d.text for d in iter_ollama_ndjson_bytes([resp.content], on_done=final.update)) == "tok0 tok1 tok2 "
+    assert final["context"] == [0, 1, 2]
+    assert client.post("/api/generate", json={"model": "m"}).json()["done"] is True
+    assert client.head("/api/v1").status_code == 200
+
+
+def test_standin_injects_errors():
+    client = standin(error_rate=1.0, error_status=429)
+    resp = client.post("/api/v1/chat/completions", json={"messages": []})
+    assert resp.status_code == 429
+
+
+def test_summary_percentiles_and_regression_check():
+    assert percentile([], 50) is None
+    assert percentile([float(i) for i in range(1, 101)], 95) == 95.0
+    base = {"scenarios": {"web": summarize([0.1] * 10, [], 0, 1.0)}}
+    same = {"scenarios": {"web": summarize([0.1] * 10, [], 0, 1.0)}}
+    slow = {"scenarios": {"web": summarize([0.2] * 10, [], 1, 2.0)}}
+    assert base["scenarios"]["web"]["rps"] == 10.0 and base["scenarios"]["web"]["latency_p95_ms"] == 100.0
+    assert compare(base, same, 0.1) == []
+    problems = compare(base, slow, 0.1)
+    assert any(p.startswith("web: rps") for p in problems)
+    assert any("latency_p95_ms" in p for p in problems)
+    assert any("errors" in p for p in problems)
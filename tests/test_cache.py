@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+from core.agent import Agent
+from core.cache import MemoryCache, SQLiteCache, build_cache, cache_key
+
+
+class CountingProvider:
+    def __init__(self, reply="answer"):
+        self.calls = 0
+        self.reply = reply
+
+    def chat(self, model, messages, **kw):
+        self.calls += 1
+        return self.reply
+
+
+def test_cache_key_is_stable_and_normalized():
+    a = cache_key("m", [{"role": "user", "content": "  What is Qwen?\n"}])
+    b = cache_key("m", [{"role": "user", "content": "What is Qwen?"}])
+    assert a == b
+    assert a != cache_key("other", [{"role": "user", "content": "What is Qwen?"}])
+    # inner whitespace is content (code, formatting), sampling options change the reply
+    assert cache_key("m", [{"role": "user", "content": "if x:\n    y"}]) != cache_key("m", [{"role": "user", "content": "if x: y"}])
+    assert cache_key("m", [{"role": "user", "content": "What is Qwen?"}], {"temperature": 0.9}) != b
+    assert cache_key("m", [{"role": "user", "content": "What is Qwen?"}], {"timeout": 5}) == b
+
+
+def test_memory_cache_lru_and_ttl():
+    cache = MemoryCache(max_entries=2, ttl=0.05)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")  # evicts b, the least recently used
+    assert cache.get("b") is None
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats.as_dict()["hits"] == 1
+    assert cache.stats.as_dict()["misses"] == 2
+
+
+def test_sqlite_backend_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first = MemoryCache(backend=SQLiteCache(path))
+    second = MemoryCache(backend=SQLiteCache(path))
+    first.set("k", "shared reply")
+    assert second.get("k") == "shared reply"
+    assert second.stats.hits == 1
+
+
+def test_async_access_reads_and_writes_the_sqlite_backend_off_the_loop(tmp_path):
+    threads = []
+
+    class Recording(SQLiteCache):
+        def get(self, key):
+            threads.append(threading.current_thread())
+            return super().get(key)
+
+        def set(self, key, value):
+            threads.append(threading.current_thread())
+            super().set(key, value)
+
+    path = str(tmp_path / "cache.sqlite")
+    first, second = MemoryCache(backend=Recording(path)), MemoryCache(backend=Recording(path))
+
+    async def main():
+        await first.aset("k", "shared reply")
+        return await second.aget("k"), await second.aget("k")
+
+    assert asyncio.run(main()) == ("shared reply", "shared reply")
+    assert len(threads) == 2 and threading.main_thread() not in threads  # the second aget is a memory hit
+
+
+def test_agent_call_uses_opt_in_cache():
+    provider = CountingProvider()
+    agent = Agent({"id": "a", "model": "m", "policies": {"cache": {"ttl": 60}}}, provider)
+    msgs = [{"role": "user", "content": "faq"}]
+    assert agent.call(msgs) == agent.call(msgs) == "answer"
+    assert provider.calls == 1
+    assert agent.cache.stats.as_dict()["hit_ratio"] == 0.5
+
+    plain = Agent({"id": "b", "model": "m"}, provider)
+    plain.call(msgs)
+    assert plain.cache is None and provider.calls == 2
+
+
+def test_agents_share_the_sqlite_cache_across_processes(tmp_path):
+    spec = {"id": "a", "model": "m", "policies": {"cache": {"ttl": 60, "path": str(tmp_path / "cache.sqlite")}}}
+    msgs = [{"role": "user", "content": "faq"}]
+    first, second = CountingProvider(), CountingProvider()
+    Agent(spec, first).call(msgs)
+    # a fresh agent and provider, as in another worker or after a restart
+    assert Agent(spec, second).call(msgs) == "answer"
+    assert second.calls == 0
+
+
+def test_error_replies_are_not_cached():
+    provider = CountingProvider("[error:qwen] timeout")
+    agent = Agent({"id": "a", "model": "m", "policies": {"cache": {"ttl": 60}}}, provider)
+    agent.call([{"role": "user", "content": "x"}])
+    agent.call([{"role": "user", "content": "x"}])
+    assert provider.calls == 2
+    assert build_cache(None) is None
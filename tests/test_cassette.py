@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import pytest
+
+from core.agent import Agent
+from core.manager import ConversationManager
+from core.registry import AgentRegistry
+from core.stream import Delta
+from providers import cassette
+from providers.cassette import Cassette, RecordingProvider, ReplayProvider
+
+MSGS = [{"role": "user", "content": "hi"}]
+
+
+class SlowProvider:
+    def __init__(self):
+        self.calls = 0
+
+    def chat(self, model, messages, **kw):
+        self.calls += 1
+        time.sleep(0.05)
+        return f"reply {self.calls} to {messages[-1]['content']}"
+
+    def stream(self, model, messages, **kw):
+        self.calls += 1
+        for text in ("a", "b"):
+            time.sleep(0.05)
+            yield Delta(text=text)
+        yield Delta(finish_reason="stop", usage={"completion_tokens": 2})
+
+
+def test_records_and_replays_calls_and_stream_timing(tmp_path):
+    path = str(tmp_path / "traffic.cas")
+    inner = SlowProvider()
+    rec = RecordingProvider("qwen", inner, Cassette(path))
+    assert rec.chat("m", MSGS) == "reply 1 to hi"
+    assert rec.chat("m", MSGS) == "reply 2 to hi"
+    assert "".join(d.text for d in rec.stream("m", MSGS)) == "ab"
+    rec.cassette.close()
+
+    tape = Cassette(path)
+    assert len(tape) == 3
+    replay = ReplayProvider("qwen", tape, speed=1.0)
+    start = time.perf_counter()
+    assert replay.chat("m", MSGS) == "reply 1 to hi"
+    assert time.perf_counter() - start >= 0.04  # original timing
+    assert asyncio.run(replay.achat("m", MSGS)) == "reply 2 to hi"
+
+    fast = ReplayProvider("qwen", Cassette(path), speed=0)
+    deltas = list(fast.stream("m", [{"role": "user", "content": "other"}]))
+    assert deltas[0].finish_reason == "error" and deltas[0].text.startswith("[error:cassette]")
+    start = time.perf_counter()
+    fast.chat("m", MSGS)
+    fast.chat("m", MSGS)
+    deltas = list(fast.stream("m", MSGS))  # a streamed recording
+    assert time.perf_counter() - start < 0.03
+    assert "".join(d.text for d in deltas) == "ab" and deltas[-1].usage == {"completion_tokens": 2}
+    assert inner.calls == 3
+
+
+def test_sequence_match_and_torn_tail(tmp_path):
+    path = str(tmp_path / "traffic.cas")
+    rec = RecordingProvider("ollama", SlowProvider(), Cassette(path))
+    rec.chat("m", [{"role": "user", "content": "one"}])
+    rec.chat("m", [{"role": "user", "content": "two"}])
+    rec.cassette.close()
+    with open(path, "ab") as f:
+        f.write(b"ollama deadbeef 999\nxx")  # interrupted write
+
+    replay = ReplayProvider("ollama", Cassette(path), speed=0, match="sequence")
+    other = [{"role": "user", "content": "unrelated"}]
+    assert [replay.chat("m", other) for _ in range(3)] == ["reply 1 to one", "reply 2 to two", "reply 1 to one"]
+
+
+def test_records_carry_the_request_and_writers_share_a_file(tmp_path):
+    path = str(tmp_path / "traffic.cas")
+    # two workers recording into one cassette
+    first = RecordingProvider("qwen", SlowProvider(), Cassette(path))
+    second = RecordingProvider("qwen", SlowProvider(), Cassette(path))
+    first.chat("m", [{"role": "user", "content": "one"}], temperature=0.2)
+    second.chat("m", [{"role": "user", "content": "two"}])
+    first.chat("m", [{"role": "user", "content": "three"}])
+
+    tape = Cassette(path, readonly=True)
+    records = list(tape.records("qwen"))
+    assert [r["messages"][-1]["content"] for r in records] == ["one", "two", "three"]
+    assert records[0]["kw"] == {"temperature": 0.2} and records[1]["reply"] == "reply 1 to two"
+    with pytest.raises(ValueError):
+        tape.append("qwen", "k", {})
+    with pytest.raises(FileNotFoundError):
+        Cassette(str(tmp_path / "typo.cas"), readonly=True)
+
+
+def test_replay_through_manager_from_env(tmp_path, monkeypatch):
+    path = str(tmp_path / "traffic.cas")
+
+    def manager(provider):
+        agents = AgentRegistry()
+        agents.register(Agent({"id": "main", "model": "m", "policies": {"coalesce": False}}, provider))
+        return ConversationManager(agents)
+
+    cassette.open_cassette.cache_clear()
+    monkeypatch.setenv("CASSETTE_RECORD", path)
+    recorded = manager(cassette.from_env("qwen", SlowProvider))
+    first = [recorded.handle(text) for text in ("hello", "again")]
+
+    monkeypatch.delenv("CASSETTE_RECORD")
+    monkeypatch.setenv("CASSETTE_REPLAY", path)
+    monkeypatch.setenv("CASSETTE_SPEED", "0")
+    cassette.open_cassette.cache_clear()
+
+    def unreachable():
+        raise AssertionError("replay must not build the real provider")
+
+    replayed = manager(cassette.from_env("qwen", unreachable))
+    assert [replayed.handle(text) for text in ("hello", "again")] == first
+    monkeypatch.setenv("CASSETTE_REPLAY", path + ".missing")
+    with pytest.raises(FileNotFoundError):
+        cassette.from_env("qwen", unreachable)
+    cassette.open_cassette.cache_clear()
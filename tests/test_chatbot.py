@@ -14,8 +14,10 @@ from chatbot import (
     ollama_infer,
     parse_args,
     qwen_infer,
+    print_stream,
     run_inference,
     run_once,
+    stream_inference,
 )
 from src.providers import qwen_provider
 
@@ -120,6 +122,24 @@ def test_run_once_executes_single_prompt(monkeypatch, capsys):
     assert "single reply" in out
 
 
+def test_run_once_streams_tokens_and_reports_stats(capsys):
+    run_once("mock", None, "system prompt", "Hello", stream=True)
+    captured = capsys.readouterr()
+    assert 'I hear you saying "Hello".' in captured.out
+    assert "ttft" in captured.err and "tok/s" in captured.err
+
+
+def test_print_stream_returns_full_text(capsys):
+    deltas = [chatbot.Delta(text="a"), chatbot.Delta(text="b"), chatbot.Delta(finish_reason="stop")]
+    assert print_stream(iter(deltas)) == "ab"
+    assert capsys.readouterr().out == "ab\n"
+
+
+def test_stream_inference_mock_matches_blocking_reply():
+    messages = [Message("user", "Hi")]
+    assert "".join(d.text for d in stream_inference("mock", None, messages)) == mock_infer(messages)
+
+
 def test_openai_infer_requires_api_key(monkeypatch):
     with pytest.raises(RuntimeError, match="OPENAI_API_KEY is not set"):
         openai_infer("gpt", [Message("user", "hi")])
@@ -180,9 +200,9 @@ def test_ollama_infer_requires_model():
         ollama_infer(None, [Message("user", "hi")])
 
 
-def test_ollama_infer_requires_requests(monkeypatch):
-    monkeypatch.setattr(chatbot, "requests", None)
-    with pytest.raises(RuntimeError, match="requests"):
+def test_ollama_infer_requires_httpx(monkeypatch):
+    monkeypatch.setattr(chatbot, "transport", None)
+    with pytest.raises(RuntimeError, match="httpx"):
         ollama_infer("model", [Message("user", "hi")])
 
 
@@ -197,15 +217,15 @@ def test_ollama_infer_success(monkeypatch):
         def json(self):
             return self._payload
 
-    class FakeRequests:
+    class FakeClient:
         def __init__(self):
             self.calls = []
 
-        def post(self, url, data=None, headers=None, timeout=None):
+        def post(self, url, content=None, headers=None, timeout=None):
             self.calls.append(
                 {
                     "url": url,
-                    "data": data,
+                    "data": content,
                     "headers": headers,
                     "timeout": timeout,
                 }
@@ -220,14 +240,16 @@ def test_ollama_infer_success(monkeypatch):
                 }
             )
 
-    fake_requests = FakeRequests()
-    monkeypatch.setattr(chatbot, "requests", fake_requests)
+    fake_client = FakeClient()
+    monkeypatch.setattr(
+        chatbot, "transport", SimpleNamespace(get_client=lambda url: fake_client)
+    )
     monkeypatch.setenv("OLLAMA_BASE_URL", "http://ollama.local")
 
     result = ollama_infer("model", [Message("user", "hi")])
     assert result == "hello"
 
-    call = fake_requests.calls[0]
+    call = fake_client.calls[0]
     assert call["url"].startswith("http://ollama.local")
     assert call["timeout"] == 120
 
@@ -245,6 +267,9 @@ def test_qwen_infer_uses_provider(monkeypatch):
 
     result = qwen_infer("qwen-model", [Message("user", "hi")])
     assert result == "qwen says hi"
+    qwen_infer("qwen-model", [Message("user", "again")])
+    provider = chatbot._shared_providers[FakeProvider]
+    assert len(provider.calls) == 2
 
 
 def test_qwen_provider_requires_api_key(monkeypatch):
@@ -275,7 +300,9 @@ def test_qwen_provider_chat_success(monkeypatch):
         assert timeout == 30
         return FakeResponse()
 
-    monkeypatch.setattr(module.requests, "post", fake_post)
+    monkeypatch.setattr(
+        module.transport, "get_client", lambda url: SimpleNamespace(post=fake_post)
+    )
 
     result = provider.chat([{"role": "user", "content": "hi"}])
     assert result == "generated"
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+
+from core import scheduler
+from core.registry import ProviderRegistry
+from core.stream import Delta
+from providers.composite import CompositeProvider, _Member
+
+
+class FakeProvider:
+    def __init__(self, reply="ok", delay=0.0, error=None):
+        self.reply = reply
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.cancelled = False
+
+    def chat(self, model, messages, **kw):
+        self.calls.append(model)
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.reply
+
+    async def achat(self, model, messages, **kw):
+        self.calls.append(model)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return self.reply
+
+
+def composite(*providers, hedge=None):
+    return CompositeProvider([_Member(f"p{i}", p, None) for i, p in enumerate(providers)], hedge)
+
+
+def test_falls_back_on_error_string_and_exception():
+    first = FakeProvider("[error:qwen] 503")
+    second = FakeProvider(error=RuntimeError("refused"))
+    third = FakeProvider("from ollama")
+    assert composite(first, second, third).chat("m", []) == "from ollama"
+    assert first.calls == second.calls == third.calls == ["m"]
+
+
+def test_all_failures_are_reported():
+    reply = composite(FakeProvider("[error:qwen] down")).chat("m", [])
+    assert reply.startswith("[error:composite]") and "down" in reply
+
+
+def test_sync_hedge_takes_faster_backup():
+    slow, fast = FakeProvider("slow", delay=1.0), FakeProvider("fast", delay=0.05)
+    provider = composite(slow, fast, hedge={"enabled": True, "min_delay": 0.1, "initial_delay": 0.1})
+    start = time.monotonic()
+    assert provider.chat("m", []) == "fast"
+    assert time.monotonic() - start < 0.6
+
+
+def test_sync_hedges_keep_the_callers_context():
+    seen = []
+
+    class Recording(FakeProvider):
+        def chat(self, model, messages, **kw):
+            seen.append(scheduler.current_caller.get())
+            return super().chat(model, messages, **kw)
+
+    provider = composite(Recording("slow", delay=0.3), Recording("fast"), hedge={"enabled": True, "min_delay": 0.05, "initial_delay": 0.05})
+    token = scheduler.current_caller.set("alice")
+    try:
+        assert provider.chat("m", []) == "fast"
+    finally:
+        scheduler.current_caller.reset(token)
+    assert seen == ["alice", "alice"]
+
+
+def test_sync_calls_run_inline_without_a_hedge_and_hedges_are_capped():
+    threads = []
+
+    class Recording(FakeProvider):
+        def chat(self, model, messages, **kw):
+            threads.append(threading.current_thread())
+            return super().chat(model, messages, **kw)
+
+    assert composite(Recording("[error:a] down"), Recording("ok")).chat("m", []) == "ok"
+    assert threads == [threading.main_thread()] * 2
+
+    slow = Recording("slow", delay=0.5)
+    provider = composite(slow, Recording("fast"), hedge={"enabled": True, "min_delay": 0.05, "initial_delay": 0.05, "max_outstanding": 2})
+    assert provider.chat("m", []) == "fast"  # the slow loser still holds a slot
+    threads.clear()
+    assert provider.chat("m", []) == "slow"  # one slot left: no room for a hedge
+    assert len(threads) == 1
+
+
+def test_async_hedge_cancels_loser():
+    slow, fast = FakeProvider("slow", delay=1.0), FakeProvider("fast", delay=0.05)
+    provider = composite(slow, fast, hedge={"enabled": True, "min_delay": 0.1, "initial_delay": 0.1})
+
+    async def main():
+        reply = await provider.achat("m", [])
+        await asyncio.sleep(0)
+        return reply
+
+    assert asyncio.run(main()) == "fast"
+    assert slow.cancelled
+
+
+def test_no_hedge_when_primary_is_fast():
+    primary, backup = FakeProvider("primary", delay=0.01), FakeProvider("backup")
+    provider = composite(primary, backup, hedge={"enabled": True, "min_delay": 0.2})
+    assert asyncio.run(provider.achat("m", [])) == "primary"
+    assert backup.calls == []
+
+
+def test_stream_fails_over_before_first_delta():
+    class Broken:
+        async def astream(self, model, messages, **kw):
+            yield Delta(text="[error:qwen] 429", finish_reason="error")
+
+    class Working:
+        async def astream(self, model, messages, **kw):
+            yield Delta(text="he")
+            yield Delta(text="llo", finish_reason="stop")
+
+    async def main():
+        return [d.text async for d in composite(Broken(), Working()).astream("m", [])]
+
+    assert asyncio.run(main()) == ["he", "llo"]
+
+
+def test_stream_hedge_uses_first_delta_latency_only():
+    class Streaming(FakeProvider):
+        async def astream(self, model, messages, **kw):
+            yield Delta(text="x", finish_reason="stop")
+
+    provider = composite(Streaming(), hedge={"enabled": True, "min_delay": 0.0})
+
+    async def main():
+        return [[d.text async for d in provider.astream("m", [])] for _ in range(20)]
+
+    for _ in range(20):
+        provider.latency["p0"].record(5.0)  # slow full completions
+    assert asyncio.run(main()) == [["x"]] * 20
+    assert provider.hedge_delay(provider.members[0]) == 5.0
+    assert provider.hedge_delay(provider.members[0], streaming=True) < 0.1
+
+
+def test_from_config_resolves_members_and_models():
+    registry = ProviderRegistry()
+    registry.register("qwen", FakeProvider("[error:qwen] down"))
+    registry.register("ollama", FakeProvider("local"))
+    cfg = {"fallbacks": ["qwen", {"provider": "ollama", "model": "qwen2.5:7b-instruct"}]}
+    provider = CompositeProvider.from_config(cfg, registry)
+    assert provider.chat("remote-model", []) == "local"
+    assert registry.get("ollama").calls == ["qwen2.5:7b-instruct"]
@@ -0,0 +1,59 @@
+from core.agent import Agent
+from core.context import ContextWindow, _estimate, estimate_tokens
+from core.manager import ConversationManager
+from core.registry import AgentRegistry
+
+
+def test_fit_keeps_system_and_newest_turns():
+    msgs = [{"role": "system", "content": "sys"}]
+    for i in range(10):
+        msgs.append({"role": "user", "content": f"question number {i} " * 5})
+        msgs.append({"role": "assistant", "content": f"answer number {i} " * 5})
+    msgs.append({"role": "user", "content": "latest"})
+    window = ContextWindow(max_tokens=120)
+
+    fitted = window.fit(msgs)
+
+    assert fitted[0] == msgs[0]
+    assert fitted[-1] == msgs[-1]
+    assert fitted == [msgs[0]] + msgs[-len(fitted) + 1:]
+    assert len(fitted) < len(msgs)
+    assert sum(estimate_tokens(m) for m in fitted) <= 120
+
+
+def test_fit_returns_input_when_under_budget():
+    msgs = [{"role": "user", "content": "hi"}]
+    assert ContextWindow(max_tokens=100).fit(msgs) is msgs
+
+
+def test_window_reads_policies_and_caches_estimates():
+    spec = {"id": "a", "policies": {"max_context_tokens": 1000, "max_tokens": 200}}
+    assert ContextWindow.for_spec(spec).budget == 800
+
+    _estimate.cache_clear()
+    m = {"role": "user", "content": "same text every time"}
+    estimate_tokens(m)
+    estimate_tokens(m)
+    info = _estimate.cache_info()
+    assert (info.misses, info.hits) == (1, 1)
+
+
+def test_manager_payload_stays_bounded():
+    seen = []
+
+    class RecordingProvider:
+        def chat(self, model, messages, **kw):
+            seen.append(messages)
+            return "ok " * 20
+
+    agents = AgentRegistry()
+    spec = {"id": "a", "model": "m", "system_template": "be nice", "policies": {"max_context_tokens": 200}}
+    agents.register(Agent(spec, RecordingProvider()))
+    cm = ConversationManager(agents)
+    for i in range(30):
+        cm.handle(f"message {i} with some padding text")
+
+    assert len(cm.history) == 60
+    assert seen[-1][0] == {"role": "system", "content": "be nice"}
+    assert seen[-1][-1]["content"] == "message 29 with some padding text"
+    assert sum(estimate_tokens(m) for m in seen[-1]) <= 200
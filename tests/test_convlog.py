@@ -0,0 +1,153 @@
+import json
+import os
+
+import pytest
+
+from core.agent import Agent
+from core.convlog import ConversationLog, LogFullError, apply_record
+from core.registry import AgentRegistry
+from core.sessions import SessionStore
+
+
+class EchoProvider:
+    def chat(self, model, messages, **kw):
+        return f"echo {messages[-1]['content']}"
+
+
+def make_agents():
+    agents = AgentRegistry()
+    agents.register(Agent({"id": "main", "model": "m", "policies": {"coalesce": False}}, EchoProvider()))
+    return agents
+
+
+def contents(state):
+    return [m["content"] for m in state["history"]]
+
+
+def test_apply_record_replays_turns_summaries_and_trims():
+    state = None
+    for rec in [
+        {"op": "system_prompt", "value": "brief"},
+        {"op": "turn", "agent": "main", "user": "a", "reply": "1"},
+        {"op": "turn", "agent": "main", "user": "b", "reply": "2"},
+        {"op": "summary", "summary": "a then b", "covered": 2},
+        {"op": "turn", "agent": "main", "user": "c", "reply": "3"},
+        {"op": "trim", "drop": 2},
+    ]:
+        state = apply_record(state, rec)
+    assert contents(state) == ["c", "3"]
+    assert state["summary"] == "a then b" and state["system_prompt"] == "brief" and state["active"] == "main"
+    assert apply_record(state, {"op": "delete"}) is None
+
+
+def test_sessions_survive_a_restart(tmp_path):
+    agents = make_agents()
+    store = SessionStore(agents, log=ConversationLog(str(tmp_path)))
+    store.get("session-a", "be kind").manager.handle("hello")
+    store.get("session-b").manager.handle("other")
+    store.close()
+
+    log = ConversationLog(str(tmp_path))
+    assert log._index is None  # nothing is read until a session is asked for
+    reopened = SessionStore(agents, log=log)
+    manager = reopened.get("session-a").manager
+    assert contents(manager.state()) == ["hello", "echo hello"]
+    assert manager.system_prompt == "be kind"
+    manager.handle("again")
+    reopened.delete("session-b")
+    reopened.close()
+
+    final = ConversationLog(str(tmp_path))
+    assert contents(final.load("session-a")) == ["hello", "echo hello", "again", "echo again"]
+    assert final.load("session-b") is None
+    final.close()
+
+
+def test_writes_are_batched_and_fsynced_in_groups(tmp_path):
+    log = ConversationLog(str(tmp_path), fsync_interval=10.0)
+    for i in range(500):
+        log.append("s", {"op": "turn", "agent": "main", "user": str(i), "reply": ""})
+    log.flush()
+    assert log.stats()["appended"] == 500
+    assert log.fsyncs <= 3
+    assert len(log.load("s")["history"]) == 1000
+    log.close()
+
+
+def test_compaction_folds_into_snapshot_without_double_apply(tmp_path):
+    log = ConversationLog(str(tmp_path), compact_every=10)
+    for i in range(25):
+        log.append(f"s{i % 3}", {"op": "turn", "agent": "main", "user": str(i), "reply": "r"})
+    log.append("s2", {"op": "delete"})
+    log.flush()
+    assert log.compactions >= 1
+    assert len(log.load("s0")["history"]) == 2 * 9
+    log.close()
+
+    with open(os.path.join(str(tmp_path), "snapshot.jsonl"), "rb") as f:
+        header = json.loads(f.readline())
+    # a crash right after the snapshot swap would leave old segments behind; they must be skipped
+    stale = os.path.join(str(tmp_path), f"wal-{header['through']:08d}.jsonl")
+    with open(stale, "w") as f:
+        f.write(json.dumps({"sid": "s0", "op": "turn", "user": "dup", "reply": "dup"}) + "\n")
+    reopened = ConversationLog(str(tmp_path))
+    assert len(reopened.load("s0")["history"]) == 2 * 9
+    assert reopened.load("s2") is None
+    reopened.close()
+
+
+def test_index_is_carried_across_compaction(tmp_path):
+    log = ConversationLog(str(tmp_path), compact_every=4)
+    log.append("s", {"op": "turn", "agent": "main", "user": "0", "reply": "r"})
+    assert len(log.load("s")["history"]) == 2  # builds the index
+    for i in range(1, 7):
+        log.append("s", {"op": "turn", "agent": "main", "user": str(i), "reply": "r"})
+    log.flush()
+    assert log.compactions == 1 and log._index is not None
+    assert [m["content"] for m in log.load("s")["history"][::2]] == [str(i) for i in range(7)]
+    log.close()
+
+
+def test_torn_last_line_is_ignored_and_sealed(tmp_path):
+    log = ConversationLog(str(tmp_path))
+    log.append("s", {"op": "turn", "agent": "main", "user": "ok", "reply": "r"})
+    log.close()
+    (segment,) = [p for p in os.listdir(str(tmp_path)) if p.startswith("wal-")]
+    with open(os.path.join(str(tmp_path), segment), "a") as f:
+        f.write('{"sid": "s", "op": "tu')
+
+    log = ConversationLog(str(tmp_path))
+    log.append("s", {"op": "turn", "agent": "main", "user": "next", "reply": "r"})
+    assert contents(log.load("s")) == ["ok", "r", "next", "r"]
+    log.close()
+
+
+def test_full_queue_refuses_the_turn_and_resyncs(tmp_path):
+    log = ConversationLog(str(tmp_path), max_queue=1, put_timeout=0.05)
+    agents = make_agents()
+    store = SessionStore(agents, log=log)
+    manager = store.get("session-a").manager
+    refused = 0
+    with log._lock:  # stall the writer thread mid-batch
+        for i in range(5):
+            try:
+                manager.handle(str(i))
+            except LogFullError:
+                refused += 1
+    assert refused > 0 and log.dropped == refused
+    # a refused turn is not kept, so the caller can resend it
+    assert len(manager.history) == 2 * (5 - refused)
+    log.flush()
+    manager.handle("last")  # written as the full state, so replay catches up
+    log.flush()
+    assert contents(log.load("session-a")) == contents(manager.state())
+    log.close()
+
+
+def test_flush_fails_instead_of_hanging_when_the_writer_is_gone(tmp_path):
+    log = ConversationLog(str(tmp_path))
+    log.close()
+    with pytest.raises(RuntimeError):
+        log.flush()
+    with pytest.raises(LogFullError):
+        log.append("s", {"op": "turn", "agent": "main", "user": "x", "reply": "r"})
\ No newline at end of file
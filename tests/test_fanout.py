@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+
+import yaml
+
+import core.load
+from core import scheduler, trace
+from core.agent import Agent
+from core.load import build_registries
+from core.manager import ConversationManager
+from core.registry import AgentRegistry
+from providers.fanout import FanoutProvider
+
+
+class Timed:
+    def __init__(self, reply, delay):
+        self.reply = reply
+        self.delay = delay
+        self.cancelled = False
+        self.seen = []
+
+    def chat(self, model, messages, **kw):
+        self.seen.append(messages)
+        time.sleep(self.delay)
+        return self.reply
+
+    async def achat(self, model, messages, **kw):
+        self.seen.append(messages)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return self.reply
+
+
+def registry(**members):
+    agents = AgentRegistry()
+    for aid, provider in members.items():
+        agents.register(Agent({"id": aid, "model": aid, "policies": {"coalesce": False}}, provider))
+    return agents
+
+
+def fanout(agents, ids, **kw):
+    return FanoutProvider([agents.get(i) for i in ids], **kw)
+
+
+MSGS = [{"role": "user", "content": "2+2?"}]
+
+
+def test_first_acceptable_wins_and_cancels_the_rest():
+    slow = Timed("slow answer", 1.0)
+    agents = registry(broken=Timed("[error:x] down", 0.0), fast=Timed("fast answer", 0.05), slow=slow)
+    provider = fanout(agents, ["broken", "fast", "slow"])
+
+    start = time.perf_counter()
+    assert asyncio.run(provider.achat("", MSGS)) == "fast answer"
+    assert time.perf_counter() - start < 0.5 and slow.cancelled
+
+    start = time.perf_counter()
+    assert provider.chat("", MSGS) == "fast answer"
+    assert time.perf_counter() - start < 0.5
+
+
+def test_majority_returns_at_quorum_and_falls_back_to_plurality():
+    slow = Timed("5", 1.0)
+    agents = registry(a=Timed("Four.", 0.01), b=Timed("four", 0.05), c=slow)
+    provider = fanout(agents, ["a", "b", "c"], strategy="majority")
+    start = time.perf_counter()
+    assert asyncio.run(provider.achat("", MSGS)) == "Four."
+    assert time.perf_counter() - start < 0.5 and slow.cancelled
+
+    split = registry(a=Timed("4", 0.02), b=Timed("5", 0.01), c=Timed("[error:c] down", 0.0))
+    assert fanout(split, ["a", "b", "c"], strategy="majority").chat("", MSGS) == "5"
+
+
+def test_judge_picks_a_candidate_by_number():
+    judge = Timed("Candidate 2 is best", 0.0)
+    agents = registry(a=Timed("three", 0.01), b=Timed("four", 0.03), judge=judge)
+    provider = fanout(agents, ["a", "b"], strategy="judge", judge=agents.get("judge"))
+    assert asyncio.run(provider.achat("", MSGS)) == "four"
+    prompt = judge.seen[-1][-1]["content"]
+    assert "2+2?" in prompt and "Candidate 1:\nthree" in prompt
+    judge.reply = "no idea"
+    assert provider.chat("", MSGS) == "three"
+
+
+def test_timeout_decides_with_what_arrived_and_all_failed_is_an_error():
+    agents = registry(a=Timed("[error:a] down", 0.0), b=Timed("late", 1.0))
+    provider = fanout(agents, ["a", "b"], timeout=0.1)
+    reply = asyncio.run(provider.achat("", MSGS))
+    assert reply.startswith("[error:fanout] all agents failed") and "[error:a] down" in reply
+
+    # the timeout bounds the whole turn in sync mode too, however many replies trickle in
+    agents = registry(a=Timed("[error:a] down", 0.1), b=Timed("[error:b] down", 0.2), c=Timed("late", 1.0))
+    provider = fanout(agents, ["a", "b", "c"], timeout=0.25)
+    start = time.perf_counter()
+    assert provider.chat("", MSGS).startswith("[error:fanout] all agents failed")
+    assert time.perf_counter() - start < 0.38
+
+
+def test_sync_members_keep_the_callers_context_and_skip_once_decided():
+    seen = []
+
+    class Recording(Timed):
+        def chat(self, model, messages, **kw):
+            seen.append((scheduler.current_caller.get(), trace.current()))
+            return super().chat(model, messages, **kw)
+
+    late = Recording("late answer", 0.0)
+    agents = registry(fast=Recording("fast answer", 0.0), late=late)
+    provider = fanout(agents, ["fast", "late"])
+    gate = threading.Event()
+    prepare = provider._prepare
+
+    def slow_prepare(agent, messages):
+        if agent.spec["id"] == "late":
+            gate.wait(1.0)  # still preparing when the fast member wins
+        return prepare(agent, messages)
+
+    provider._prepare = slow_prepare
+    token = scheduler.current_caller.set("alice")
+    try:
+        with trace.start() as tr:
+            assert provider.chat("", MSGS) == "fast answer"
+    finally:
+        scheduler.current_caller.reset(token)
+    gate.set()
+    time.sleep(0.1)
+    assert seen == [("alice", tr)]
+    assert late.seen == []
+
+
+def test_fanout_agent_from_config_through_manager(tmp_path, monkeypatch):
+    cfg = {
+        "default": "panel",
+        "agents": [
+            {"id": "panel", "fanout": {"agents": ["one", "two"], "strategy": "first"}, "routing": {"tags": ["x"]}},
+            {"id": "one", "provider": "mock", "model": "m1", "system_template": "be brief"},
+            {"id": "two", "provider": "mock", "model": "m2"},
+        ],
+    }
+    path = tmp_path / "agents.yml"
+    path.write_text(yaml.safe_dump(cfg))
+    one, two = Timed("from one", 0.01), Timed("from two", 0.5)
+
+    members = {"m1": one, "m2": two}
+
+    class Mock:
+        def chat(self, model, messages, **kw):
+            return members[model].chat(model, messages)
+
+    monkeypatch.setattr(core.load, "_instance", lambda name, module: Mock())
+    monkeypatch.setattr(core.load, "discover_providers", lambda cfg=None: {"mock": "unused"})
+    agents = build_registries(str(path))
+    assert agents.get("panel").labels == ("panel", "fanout", "")
+
+    cm = ConversationManager(agents)
+    assert cm.handle("hello") == "from one"
+    assert cm.active == "panel"
+    assert one.seen[-1][0] == {"role": "system", "content": "be brief"}  # member template applied
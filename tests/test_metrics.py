@@ -0,0 +1,102 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+import webserver
+from core import metrics, scheduler
+from core.agent import Agent
+from core.stream import Delta
+
+
+def test_counters_from_many_threads_sum_without_locks():
+    counter = metrics.Counter("test_thread_total", "test", ("k",))
+
+    def work():
+        for _ in range(1000):
+            counter.inc("x")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counter.value("x") == 8000
+
+
+def test_histogram_renders_cumulative_buckets_and_escapes_labels():
+    hist = metrics.Histogram("test_latency_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 0.5, 3.0):
+        hist.observe(v, 'a"b')
+    text = metrics.render()
+    assert "# TYPE test_latency_seconds histogram" in text
+    assert 'test_latency_seconds_bucket{route="a\\"b",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{route="a\\"b",le="1"} 3' in text
+    assert 'test_latency_seconds_bucket{route="a\\"b",le="+Inf"} 4' in text
+    assert 'test_latency_seconds_count{route="a\\"b"} 4' in text
+
+
+def test_gauge_delta_on_another_thread_balances():
+    gauge = metrics.Gauge("test_gauge", "test")
+    gauge.add(1)
+    t = threading.Thread(target=gauge.add, args=(-1,))
+    t.start()
+    t.join()
+    assert gauge.value() == 0
+
+
+class FakeProvider:
+    def __init__(self, reply="ok"):
+        self.reply = reply
+
+    def chat(self, model, messages, **kw):
+        return self.reply
+
+    def stream(self, model, messages, **kw):
+        yield Delta(text="a")
+        yield Delta(text="b")
+        yield Delta(finish_reason="stop", usage={"completion_tokens": 2})
+
+
+def test_agent_records_requests_errors_cache_and_stream_timings():
+    labels = ("m-agent", "fake", "m1")
+    spec = {"id": "m-agent", "provider": "fake", "model": "m1", "policies": {"cache": {"ttl": 60}}}
+    agent = Agent(spec, FakeProvider())
+    msgs = [{"role": "user", "content": "hi"}]
+    agent.call(msgs)
+    agent.call(msgs)  # served from the cache
+    assert metrics.REQUESTS.value(*labels) == 2
+    assert metrics.LATENCY.count(*labels) == 2
+    assert metrics.CACHE.value("m-agent", "hit") == 1 and metrics.CACHE.value("m-agent", "miss") == 1
+    assert metrics.IN_FLIGHT.value(*labels) == 0
+
+    assert "".join(d.text for d in agent.stream(msgs)) == "ab"
+    assert metrics.TTFT.count(*labels) == 1
+    assert metrics.TOKENS_PER_SEC.count(*labels) == 1
+
+    failing = Agent({"id": "m-bad", "provider": "fake", "model": "m1", "policies": {"coalesce": False}}, FakeProvider("[error:fake] boom"))
+    failing.call(msgs)
+    assert metrics.ERRORS.value("m-bad", "fake", "m1") == 1
+    assert "chat_cache_hit_ratio{agent=\"m-agent\"} 0.5" in metrics.render()
+
+
+def test_metrics_endpoint_exports_http_and_scheduler_series():
+    scheduler.configure("metrics-test", {"max_in_flight": 2})
+    try:
+        client = TestClient(webserver.app)
+        client.get("/api/sessions")
+        resp = client.get("/api/metrics")
+    finally:
+        scheduler.reset()
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    body = resp.text
+    assert 'http_requests_total{method="GET",route="/api/sessions",status="200"}' in body
+    assert 'scheduler_in_flight{provider="metrics-test"} 0' in body
+    # every family's samples are contiguous
+    names = [line.split("{")[0].split(" ")[0] for line in body.splitlines() if line and not line.startswith("#")]
+    families = [n.rsplit("_bucket", 1)[0].rsplit("_sum", 1)[0].rsplit("_count", 1)[0] for n in names]
+    seen = []
+    for f in families:
+        if not seen or seen[-1] != f:
+            assert f not in seen, f
+            seen.append(f)
@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+import httpx
+
+from core import transport
+from providers.ollama import ContextCache, OllamaProvider
+
+
+def _ndjson(*objs):
+    return "".join(json.dumps(o) + "\n" for o in objs).encode()
+
+
+class FakeOllama:
+    """Answers /api/generate and records each payload; rejects contexts listed in `stale`."""
+
+    def __init__(self):
+        self.payloads = []
+        self.stale = set()
+        self.turn = 0
+
+    def __call__(self, request):
+        assert request.url.path == "/api/generate"
+        payload = json.loads(request.content)
+        self.payloads.append(payload)
+        if tuple(payload.get("context") or ()) in self.stale:
+            return httpx.Response(400, json={"error": "invalid context"})
+        self.turn += 1
+        return httpx.Response(
+            200,
+            content=_ndjson({"response": f"r{self.turn}", "done": False}, {"done": True, "context": list(range(self.turn * 3))}),
+        )
+
+
+def _provider(monkeypatch, fake):
+    sync = httpx.Client(transport=httpx.MockTransport(fake))
+    aclient = httpx.AsyncClient(transport=httpx.MockTransport(fake))
+    monkeypatch.setattr(transport, "get_client", lambda url: sync)
+    monkeypatch.setattr(transport, "get_async_client", lambda url: aclient)
+    provider = OllamaProvider(reuse_context=True)
+    provider.contexts = ContextCache()
+    return provider
+
+
+def test_second_turn_sends_only_new_message_with_context(monkeypatch):
+    monkeypatch.setenv("OLLAMA_KEEP_ALIVE", "-1")
+    fake = FakeOllama()
+    provider = _provider(monkeypatch, fake)
+    history = [{"role": "system", "content": "be brief"}, {"role": "user", "content": "hi"}]
+    reply = provider.chat("m", history)
+    assert reply == "r1"
+    assert fake.payloads[0]["prompt"] == "System: be brief\nUser: hi\nAssistant: "
+    assert "context" not in fake.payloads[0] and fake.payloads[0]["keep_alive"] == -1
+
+    history += [{"role": "assistant", "content": reply}, {"role": "user", "content": "more"}]
+    assert "".join(d.text for d in provider.stream("m", history)) == "r2"
+    assert fake.payloads[1]["prompt"] == "User: more\nAssistant: "
+    assert fake.payloads[1]["context"] == [0, 1, 2]
+    assert provider.contexts.hits == 1
+
+
+def test_edited_history_rebuilds_full_prompt(monkeypatch):
+    fake = FakeOllama()
+    provider = _provider(monkeypatch, fake)
+    provider.chat("m", [{"role": "user", "content": "hi"}])
+    edited = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "something else"}, {"role": "user", "content": "x"}]
+    provider.chat("m", edited)
+    assert "context" not in fake.payloads[1]
+    assert fake.payloads[1]["prompt"].startswith("System: ")
+    # another model never reuses this model's context either
+    provider.chat("other", [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "r1"}, {"role": "user", "content": "y"}])
+    assert "context" not in fake.payloads[2]
+
+
+def test_rejected_context_falls_back_to_full_prompt(monkeypatch):
+    fake = FakeOllama()
+    provider = _provider(monkeypatch, fake)
+    provider.chat("m", [{"role": "user", "content": "hi"}])
+    fake.stale.add((0, 1, 2))
+    reply = provider.chat("m", [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "r1"}, {"role": "user", "content": "again"}])
+    assert reply == "r2"
+    assert "context" in fake.payloads[1] and "context" not in fake.payloads[2]
+    assert provider.contexts.invalidations == 1
+
+
+def test_async_turns_reuse_context(monkeypatch):
+    fake = FakeOllama()
+    provider = _provider(monkeypatch, fake)
+
+    async def main():
+        first = await provider.achat("m", [{"role": "user", "content": "hi"}])
+        msgs = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": first}, {"role": "user", "content": "next"}]
+        return [d.text async for d in provider.astream("m", msgs)]
+
+    assert "".join(asyncio.run(main())) == "r2"
+    assert fake.payloads[1]["context"] == [0, 1, 2]
+
+
+def test_oversized_context_is_not_kept():
+    cache = ContextCache(max_tokens=4)
+    msgs = [{"role": "user", "content": "hi"}]
+    cache.put("m", msgs, "ok", list(range(5)))
+    assert cache.take("m", msgs + [{"role": "assistant", "content": "ok"}, {"role": "user", "content": "x"}]) is None
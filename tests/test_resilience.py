@@ -0,0 +1,109 @@
+import asyncio
+
+import httpx
+import pytest
+
+from core import resilience, transport
+from providers.openrouter_qwen import OpenRouterQwenProvider
+
+FAST = resilience.RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.0)
+
+
+def status_error(status, headers=None):
+    request = httpx.Request("POST", "http://upstream/chat")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status}", request=request, response=response)
+
+
+def flaky(*outcomes):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        outcome = outcomes[min(len(calls), len(outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return fn, calls
+
+
+def test_retries_transient_errors_then_succeeds():
+    fn, calls = flaky(status_error(503), httpx.ConnectError("refused"), "ok")
+    assert resilience.call("up", fn, FAST) == "ok"
+    assert len(calls) == 3
+    assert resilience.breaker("up").state == "closed"
+
+
+def test_does_not_retry_client_errors():
+    fn, calls = flaky(status_error(400), "ok")
+    with pytest.raises(httpx.HTTPStatusError):
+        resilience.call("up", fn, FAST)
+    assert len(calls) == 1
+    assert resilience.breaker("up").failures == 0
+
+
+def test_honours_retry_after_and_gives_up_when_too_long():
+    policy = resilience.RetryPolicy(max_attempts=3, max_retry_after=5)
+    assert policy.delay(1, status_error(429, {"Retry-After": "2"})) == 2.0
+    assert policy.delay(1, status_error(429, {"Retry-After": "60"})) is None
+    assert policy.delay(3, status_error(429, {"Retry-After": "1"})) is None
+    # a garbled hint falls back to jittered backoff instead of raising
+    assert resilience.retry_after(status_error(503, {"Retry-After": "soon"})) is None
+    assert 0 <= policy.delay(1, status_error(503, {"Retry-After": "soon"})) <= policy.max_delay
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = resilience.RetryPolicy(base_delay=1.0, max_delay=3.0, max_attempts=10)
+    delays = [policy.delay(6, httpx.ReadTimeout("slow")) for _ in range(50)]
+    assert all(0 <= d <= 3.0 for d in delays)
+    assert len(set(delays)) > 1
+
+
+def test_breaker_opens_fails_fast_and_recovers(monkeypatch):
+    b = resilience.breaker("up")
+    b.failure_threshold, b.reset_timeout = 2, 10.0
+    fn, calls = flaky(status_error(502))
+    for _ in range(2):
+        with pytest.raises(httpx.HTTPStatusError):
+            resilience.call("up", fn, resilience.RetryPolicy(max_attempts=1))
+    assert b.state == "open"
+
+    with pytest.raises(resilience.CircuitOpenError):
+        resilience.call("up", fn, FAST)
+    assert len(calls) == 2
+
+    # after the reset timeout one probe goes through and closes the breaker
+    b.opened_at -= 11
+    assert resilience.call("up", lambda: "ok", FAST) == "ok"
+    assert resilience.breaker_states()["up"] == {"state": "closed", "failures": 0, "trips": 1}
+
+
+def test_failed_half_open_probe_reopens():
+    b = resilience.breaker("up")
+    b.failure_threshold, b.reset_timeout = 1, 10.0
+    with pytest.raises(httpx.HTTPStatusError):
+        resilience.call("up", flaky(status_error(500))[0], resilience.RetryPolicy(max_attempts=1))
+    b.opened_at -= 11
+    with pytest.raises(httpx.HTTPStatusError):
+        resilience.call("up", flaky(status_error(500))[0], FAST)
+    assert b.state == "open"
+    assert b.trips == 2
+
+
+def test_provider_retries_transient_upstream_errors(monkeypatch):
+    seen = []
+
+    async def handler(request):
+        seen.append(request)
+        if len(seen) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "hello"}}]})
+
+    async def main():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(transport, "get_async_client", lambda url: client)
+        return await OpenRouterQwenProvider().achat("m", [{"role": "user", "content": "hi"}])
+
+    assert asyncio.run(main()) == "hello"
+    assert len(seen) == 2
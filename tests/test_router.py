@@ -0,0 +1,64 @@
+import time
+
+from core.agent import Agent
+from core.manager import ConversationManager
+from core.registry import AgentRegistry
+from router.index import RouterIndex
+from router.triage import select_agent
+
+SPECS = [
+    {"id": "general", "routing": {"tags": ["generic"]}},
+    {"id": "billing", "routing": {"tags": ["billing"], "keywords": ["invoice", "refund", "payment"]}},
+    {"id": "code", "routing": {"keywords": ["python", "stack trace", "bug"]}},
+]
+
+
+def test_routes_by_keywords_without_active_agent():
+    index = RouterIndex(SPECS)
+    assert index.route("I need a refund for my last invoice", None) == "billing"
+    assert index.route("python throws a weird stack trace", None) == "code"
+    assert index.route("hello there", None) == "general"  # no evidence: default
+    # incidental overlap split across agents is not enough to leave the default
+    assert index.route("a python question about my invoice", None) == "general"
+
+
+def test_switching_from_active_requires_confidence():
+    index = RouterIndex(SPECS, threshold=0.7)
+    assert index.route("refund please", "general") == "billing"
+    # evidence split between two agents stays below the threshold
+    assert index.route("python bug in the invoice payment", "general") == "general"
+    assert index.route("thanks!", "billing") == "billing"
+
+
+def test_example_centroids_route_paraphrases():
+    specs = [
+        {"id": "general", "routing": {"examples": ["tell me a joke", "what is the meaning of life"]}},
+        {"id": "travel", "routing": {"examples": ["book a flight to rome", "find a cheap flight and hotel"]}},
+    ]
+    index = RouterIndex(specs, threshold=0.3)
+    assert index.centroids.shape[0] == 2
+    assert index.route("please book a cheap flight", None) == "travel"
+    assert index.route("tell me something funny, a joke maybe", "travel") == "general"
+
+
+def test_routing_is_sub_millisecond():
+    index = RouterIndex(SPECS)
+    start = time.perf_counter()
+    for _ in range(1000):
+        select_agent("my payment failed and I want a refund", SPECS, "general", index)
+    assert (time.perf_counter() - start) / 1000 < 0.001
+
+
+def test_manager_uses_registry_index():
+    class Echo:
+        def chat(self, model, messages, **kw):
+            return model
+
+    agents = AgentRegistry({"default": "general"})
+    for spec in SPECS:
+        agents.register(Agent(dict(spec, model=spec["id"]), Echo()))
+    cm = ConversationManager(agents)
+    assert cm.handle("hi") == "general"
+    assert cm.handle("where is my invoice refund") == "billing"
+    assert cm.active == "billing"
+    assert cm.agents.routing_index() is cm.agents.routing_index()
@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import webserver
+from core import scheduler
+from core.load import build_registries
+from core.scheduler import QueueFullError, ScheduledProvider, Scheduler
+
+
+class SlowProvider:
+    model = "m"
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def _enter(self):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def _exit(self):
+        with self.lock:
+            self.active -= 1
+
+    def chat(self, model, messages, **kw):
+        self._enter()
+        time.sleep(0.05)
+        self._exit()
+        return "ok"
+
+    async def achat(self, model, messages, **kw):
+        self._enter()
+        await asyncio.sleep(0.05)
+        self._exit()
+        return "ok"
+
+
+def test_async_calls_respect_max_in_flight():
+    provider = SlowProvider()
+    wrapped = ScheduledProvider(provider, Scheduler("p", max_in_flight=2))
+
+    async def main():
+        return await asyncio.gather(*[wrapped.achat("m", []) for _ in range(8)])
+
+    assert asyncio.run(main()) == ["ok"] * 8
+    assert provider.peak == 2
+    assert wrapped.scheduler.in_flight == 0
+    assert wrapped.model == "m"
+
+
+def test_sync_calls_respect_max_in_flight():
+    provider = SlowProvider()
+    wrapped = ScheduledProvider(provider, Scheduler("p", max_in_flight=3))
+    threads = [threading.Thread(target=wrapped.chat, args=("m", [])) for _ in range(9)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert provider.peak == 3
+
+
+def test_queue_is_served_round_robin_across_callers():
+    sched = Scheduler("p", max_in_flight=1)
+    order = []
+
+    async def job(caller, tag):
+        async with sched.aslot(caller):
+            order.append(tag)
+
+    async def main():
+        await sched.aacquire("holder")
+        tasks = [asyncio.ensure_future(job("a", f"a{i}")) for i in range(3)]
+        tasks.append(asyncio.ensure_future(job("b", "b0")))
+        await asyncio.sleep(0.01)
+        assert sched.queued == 4
+        sched.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["a0", "b0", "a1", "a2"]
+
+
+def test_full_queue_rejects_immediately_and_cancel_frees_place():
+    sched = Scheduler("p", max_in_flight=1, max_queue=1)
+
+    async def main():
+        await sched.aacquire("x")
+        waiting = asyncio.ensure_future(sched.aacquire("y"))
+        await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        try:
+            await sched.aacquire("z")
+        except QueueFullError:
+            elapsed = time.perf_counter() - start
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        return elapsed
+
+    assert asyncio.run(main()) < 0.05
+    assert sched.snapshot()["rejected"] == 1
+    assert sched.queued == 0 and sched.in_flight == 1
+
+
+def test_queue_timeout_rejects():
+    sched = Scheduler("p", max_in_flight=1, queue_timeout=0.05)
+    sched.acquire("x")
+    try:
+        sched.acquire("y")
+    except QueueFullError:
+        pass
+    else:
+        raise AssertionError("expected QueueFullError")
+    assert sched.queued == 0
+
+
+def test_token_bucket_paces_calls():
+    sched = Scheduler("p", max_in_flight=10, rate=50, burst=1)
+
+    async def main():
+        start = time.perf_counter()
+        for _ in range(6):
+            async with sched.aslot():
+                pass
+        return time.perf_counter() - start
+
+    assert asyncio.run(main()) >= 0.09
+
+
+def test_limits_come_from_config_and_env(monkeypatch):
+    monkeypatch.setattr(scheduler, "_schedulers", {})
+    monkeypatch.setattr(scheduler, "_env_limits", None)
+    monkeypatch.setenv("PROVIDER_LIMITS", "ollama:max_in_flight=2;extra:max_queue=3")
+    agents = build_registries("agents/agents.yml")
+    assert isinstance(agents.get("bootstrap").provider, ScheduledProvider)
+    assert scheduler.get("qwen").max_in_flight == 16
+    assert scheduler.get("ollama").max_in_flight == 2
+    assert scheduler.get("ollama").max_queue == 16
+    assert scheduler.get("extra").max_queue == 3
+    assert scheduler.get("missing") is None
+
+
+def test_chat_endpoint_returns_503_when_queue_full(monkeypatch):
+    sched = Scheduler("qwen", max_in_flight=1, max_queue=0)
+    monkeypatch.setattr(webserver, "qwen", ScheduledProvider(SlowProvider(), sched))
+    sched.acquire("someone-else")
+    resp = TestClient(webserver.app).post("/api/chat/qwen", json={"messages": [{"role": "user", "content": "hi"}]})
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
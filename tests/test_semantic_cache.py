@@ -0,0 +1,78 @@
+import numpy as np
+
+from core.agent import Agent
+from core.semantic_cache import HashingEmbedder, SemanticCache
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embed = HashingEmbedder(dim=64)
+    a = embed("How do I reset my password?")
+    assert np.allclose(a, embed("How do I reset my password?"))
+    assert abs(float(np.linalg.norm(a)) - 1.0) < 1e-5
+    assert float(a @ embed("how do i reset my password")) > float(a @ embed("weather in Paris tomorrow"))
+
+
+def test_lookup_matches_paraphrase_above_threshold_only():
+    cache = SemanticCache(threshold=0.6, capacity=8, dim=256)
+    cache.add("m", "how do I reset my password", "Use the reset link.")
+    assert cache.lookup("m", "How do I reset my password please?") == "Use the reset link."
+    assert cache.lookup("m", "what is the capital of France") is None
+    assert cache.lookup("other-model", "how do I reset my password") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_capacity_evicts_least_recently_used():
+    cache = SemanticCache(threshold=0.99, capacity=2, dim=64)
+    cache.add("m", "first question", "1")
+    cache.add("m", "second question", "2")
+    assert cache.lookup("m", "first question") == "1"
+    cache.add("m", "third question", "3")
+    assert len(cache) == 2
+    assert cache.lookup("m", "second question") is None
+    assert cache.lookup_many("m", ["first question", "third question"]) == ["1", "3"]
+
+
+def test_index_survives_reopen_from_memmap(tmp_path):
+    path = str(tmp_path / "sem")
+    cache = SemanticCache(threshold=0.9, capacity=16, dim=64, path=path)
+    cache.add("m", "opening hours on sunday", "Closed on Sundays.")
+    cache.flush()
+
+    reopened = SemanticCache(threshold=0.9, capacity=16, dim=64, path=path)
+    assert isinstance(reopened._vectors, np.memmap)
+    assert reopened.lookup("m", "opening hours on sunday") == "Closed on Sundays."
+
+
+def test_agent_serves_semantic_hits():
+    calls = []
+
+    class Provider:
+        def chat(self, model, messages, **kw):
+            calls.append(messages)
+            return "cached answer"
+
+    spec = {"id": "a", "model": "m", "policies": {"semantic_cache": {"threshold": 0.6, "capacity": 8}}}
+    agent = Agent(spec, Provider())
+    agent.call([{"role": "user", "content": "what are your opening hours"}])
+    reply = agent.call([{"role": "user", "content": "What are your opening hours?"}])
+    assert reply == "cached answer"
+    assert len(calls) == 1
+
+
+def test_agent_scopes_semantic_hits_to_single_turn_requests_with_the_same_prompt():
+    calls = []
+
+    class Provider:
+        def chat(self, model, messages, **kw):
+            calls.append(messages)
+            return f"reply {len(calls)}"
+
+    spec = {"id": "a", "model": "m", "policies": {"semantic_cache": {"threshold": 0.6, "capacity": 8}}}
+    agent = Agent(spec, Provider())
+    agent.call([{"role": "system", "content": "You sell shoes."}, {"role": "user", "content": "tell me more"}])
+    # another system prompt, and a follow-up inside a conversation, both go upstream
+    agent.call([{"role": "system", "content": "You sell cars."}, {"role": "user", "content": "tell me more"}])
+    history = [{"role": "user", "content": "shoes?"}, {"role": "assistant", "content": "yes"}]
+    assert agent.call(history + [{"role": "user", "content": "tell me more"}]) == "reply 3"
+    assert agent.call([{"role": "system", "content": "You sell shoes."}, {"role": "user", "content": "Tell me more"}]) == "reply 1"
+    assert len(calls) == 3
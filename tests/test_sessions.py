@@ -0,0 +1,170 @@
+import asyncio
+import json
+import threading
+
+from fastapi.testclient import TestClient
+
+import webserver
+from core.agent import Agent
+from core.load import build_registries
+from core.manager import ConversationManager
+from core.registry import AgentRegistry
+from core.sessions import SessionStore
+from core.stream import Delta
+
+
+class EchoProvider:
+    def __init__(self):
+        self.seen = []
+
+    def chat(self, model, messages, **kw):
+        self.seen.append(messages)
+        return f"echo {messages[-1]['content']}"
+
+    async def astream(self, model, messages, **kw):
+        self.seen.append(messages)
+        for word in ["echo ", messages[-1]["content"]]:
+            yield Delta(text=word)
+        yield Delta(finish_reason="stop")
+
+
+def make_agents(provider=None):
+    agents = AgentRegistry()
+    agents.register(Agent({"id": "main", "model": "m", "policies": {"coalesce": False}}, provider or EchoProvider()))
+    return agents
+
+
+def test_manager_async_turns_share_history_and_system_prompt():
+    provider = EchoProvider()
+    cm = ConversationManager(make_agents(provider), system_prompt="be brief")
+
+    async def main():
+        first = await cm.ahandle("one")
+        streamed = [d.text async for d in cm.astream("two") if d.text]
+        return first, "".join(streamed)
+
+    assert asyncio.run(main()) == ("echo one", "echo two")
+    assert [m["content"] for m in cm.history] == ["one", "echo one", "two", "echo two"]
+    assert provider.seen[-1][0] == {"role": "system", "content": "be brief"}
+
+
+def test_failed_stream_is_not_added_to_history():
+    class Broken(EchoProvider):
+        async def astream(self, model, messages, **kw):
+            yield Delta(text="[error:qwen] down", finish_reason="error")
+
+    cm = ConversationManager(make_agents(Broken()))
+
+    async def main():
+        return [d async for d in cm.astream("hi")]
+
+    asyncio.run(main())
+    assert cm.history == []
+
+
+def test_failed_turn_is_not_kept_and_maps_to_an_http_error(monkeypatch):
+    class Flaky(EchoProvider):
+        def chat(self, model, messages, **kw):
+            if messages[-1]["content"] == "fail":
+                return "[error:qwen] timeout"
+            return super().chat(model, messages, **kw)
+
+    store = SessionStore(make_agents(Flaky()))
+    monkeypatch.setattr(webserver, "sessions", store)
+    client = TestClient(webserver.app)
+    sid = client.post("/api/chat/qwen", json={"message": "hello"}).headers["X-Session-Id"]
+    resp = client.post("/api/chat/qwen", json={"session_id": sid, "message": "fail"})
+    assert resp.status_code == 502 and resp.json()["detail"] == "[error:qwen] timeout"
+    assert [m["content"] for m in store.get(sid).manager.history] == ["hello", "echo hello"]
+
+
+def test_session_agents_can_pin_the_direct_route_model():
+    agents = build_registries("agents/agents.yml", models={"qwen": "configured/model"})
+    assert {s["model"] for s in agents.all_specs() if s.get("provider", "qwen") == "qwen"} == {"configured/model"}
+
+
+def test_max_history_bounds_raw_turns():
+    cm = ConversationManager(make_agents(), max_history=4)
+    for i in range(5):
+        cm.handle(f"t{i}")
+    assert [m["content"] for m in cm.history] == ["t3", "echo t3", "t4", "echo t4"]
+
+
+def test_store_evicts_least_recently_used_and_idle_sessions():
+    store = SessionStore(make_agents(), max_sessions=2, idle_ttl=60)
+    a = store.get("session-a")
+    store.get("session-b")
+    assert store.get("session-a") is a
+    store.get("session-c")
+    assert len(store) == 2
+    assert store.evictions == 1
+    assert store.get("session-b") is not None and store.evictions == 2  # b was recreated, evicting a
+
+    store.idle_ttl = 0
+    store.get("session-d")
+    assert len(store) == 1
+    assert store.stats()["evictions"] == 4
+
+
+def test_invalid_session_id_gets_a_fresh_one():
+    store = SessionStore(make_agents())
+    session = store.get("../../etc")
+    assert session.id != "../../etc" and len(session.id) >= 16
+
+
+def test_evicted_sessions_spill_to_sqlite_and_come_back(tmp_path):
+    path = str(tmp_path / "sessions.sqlite")
+    agents = make_agents()
+    store = SessionStore(agents, max_sessions=1, path=path)
+    store.get("session-a", "be kind").manager.handle("remember me")
+    store.get("session-b")  # evicts and spills session-a
+
+    restored = store.get("session-a").manager
+    assert [m["content"] for m in restored.history] == ["remember me", "echo remember me"]
+    assert restored.system_prompt == "be kind"
+    assert store.restored == 1
+
+    store.close()  # spills what is live so a new process can pick it up
+    reopened = SessionStore(agents, path=path)
+    assert reopened.get("session-a").manager.history[0]["content"] == "remember me"
+
+
+def test_async_store_spills_off_the_loop_and_skips_lookups_for_new_ids(tmp_path):
+    store = SessionStore(make_agents(), max_sessions=1, path=str(tmp_path / "sessions.sqlite"))
+    saves, loads = [], []
+    save, load = store.spill.save, store.spill.load
+    store.spill.save = lambda sid, state: (saves.append(threading.current_thread()), save(sid, state))
+    store.spill.load = lambda sid: (loads.append(sid), load(sid))[1]
+
+    async def main():
+        first = await store.aget(None)  # minted here: nothing to restore
+        await first.manager.ahandle("remember me")
+        await store.aget(None)  # evicts and spills the first session
+        return (await store.aget(first.id)).manager
+
+    restored = asyncio.run(main())
+    assert restored.history[0]["content"] == "remember me"
+    assert len(loads) == 1 and threading.main_thread() not in saves
+
+
+def test_endpoints_keep_history_server_side(monkeypatch):
+    provider = EchoProvider()
+    store = SessionStore(make_agents(provider))
+    monkeypatch.setattr(webserver, "sessions", store)
+    client = TestClient(webserver.app)
+
+    first = client.post("/api/chat/qwen", json={"message": "hello"})
+    sid = first.headers["X-Session-Id"]
+    assert first.json() == {"reply": "echo hello", "session_id": sid}
+
+    with client.stream("POST", "/api/chat/qwen/stream", json={"session_id": sid, "message": "again"}) as resp:
+        assert resp.headers["X-Session-Id"] == sid
+        body = "".join(resp.iter_text())
+    done = json.loads(body.split("event: done\ndata: ")[1])
+    assert done["session_id"] == sid
+
+    # the second request carried only the new message, but the provider saw the whole conversation
+    assert [m["content"] for m in provider.seen[-1]] == ["hello", "echo hello", "again"]
+    assert client.get("/api/sessions").json()["live"] == 1
+    client.delete(f"/api/sessions/{sid}")
+    assert len(store) == 0
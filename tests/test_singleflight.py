@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+
+from core.agent import Agent
+from core.singleflight import AsyncSingleFlight, SingleFlight, StreamFlight
+from core.stream import Delta
+
+
+class SlowProvider:
+    def __init__(self):
+        self.calls = 0
+
+    def chat(self, model, messages, **kw):
+        self.calls += 1
+        time.sleep(0.2)
+        return "shared"
+
+    async def achat(self, model, messages, **kw):
+        self.calls += 1
+        await asyncio.sleep(0.1)
+        return "shared"
+
+
+def test_sync_callers_share_one_call():
+    provider = SlowProvider()
+    agent = Agent({"id": "a", "model": "m"}, provider)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(agent.call([{"role": "user", "content": "hi"}])))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["shared"] * 8
+    assert provider.calls == 1
+
+
+def test_sync_errors_reach_every_waiter():
+    flight = SingleFlight()
+    errors = []
+    started = threading.Event()
+
+    def boom():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError("upstream down")
+
+    def run():
+        try:
+            flight.do("k", boom)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=run)
+    follower.start()
+    leader.join()
+    follower.join()
+    assert errors == ["upstream down", "upstream down"]
+    assert flight.in_flight() == 0
+
+
+def test_async_callers_share_one_call():
+    provider = SlowProvider()
+    agent = Agent({"id": "a", "model": "m"}, provider)
+
+    async def main():
+        return await asyncio.gather(*[agent.acall([{"role": "user", "content": "hi"}]) for _ in range(10)])
+
+    assert asyncio.run(main()) == ["shared"] * 10
+    assert provider.calls == 1
+    assert AsyncSingleFlight().in_flight() == 0
+
+
+def test_stream_late_joiner_gets_prefix_then_tail():
+    opened = []
+
+    async def upstream():
+        opened.append(1)
+        for tok in ["a", "b", "c", "d"]:
+            await asyncio.sleep(0.02)
+            yield Delta(text=tok)
+        yield Delta(finish_reason="stop")
+
+    async def collect(agen):
+        return "".join([d.text async for d in agen])
+
+    async def main():
+        flight = StreamFlight()
+        first = asyncio.ensure_future(collect(flight.stream("k", upstream)))
+        await asyncio.sleep(0.05)  # a couple of tokens already produced
+        second = await collect(flight.stream("k", upstream))
+        return await first, second, flight.in_flight()
+
+    first, second, in_flight = asyncio.run(main())
+    assert first == second == "abcd"
+    assert opened == [1]
+    assert in_flight == 0
+
+
+def test_stream_is_cancelled_when_every_follower_leaves_and_a_cancelled_pump_wakes_followers():
+    closed = []
+
+    async def upstream():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield Delta(text="x")
+        finally:
+            closed.append(1)
+
+    async def main():
+        flight = StreamFlight()
+        agen = flight.stream("k", upstream)
+        await agen.__anext__()
+        await agen.aclose()  # the only client disconnects
+        await asyncio.sleep(0.02)
+        left = flight.in_flight()
+
+        waiting = flight.stream("k2", upstream)
+        await waiting.__anext__()
+        flight._streams["k2"].task.cancel()  # e.g. shutdown
+        try:
+            await asyncio.wait_for(waiting.__anext__(), 1.0)
+        except RuntimeError as e:
+            return left, str(e)
+
+    left, error = asyncio.run(main())
+    assert left == 0 and closed == [1, 1]
+    assert "cancelled" in error
@@ -0,0 +1,59 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from core.load import discover_providers
+from core.registry import ProviderRegistry
+
+ROOT = Path(__file__).resolve().parents[1]
+HEAVY = ("httpx", "yaml", "dotenv", "numpy", "openai", "asyncio", "core.load", "src.providers.qwen_provider")
+
+
+def _imported(args):
+    """Module names imported by a fresh interpreter, from ``-X importtime`` (plus its stdout)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], cwd=ROOT, capture_output=True, text=True, timeout=60
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and line.count("|") == 2:
+            name = line.rsplit("|", 1)[1].strip()
+            if name != "package":
+                modules.add(name)
+    return modules, proc.stdout
+
+
+def test_mock_cli_skips_heavy_imports():
+    modules, out = _imported(["chatbot.py", "--provider", "mock", "--once", "hello"])
+    assert out.startswith("[mock]")
+    assert "core.stream" in modules  # sanity: the parse saw our own imports
+    loaded = [m for m in modules if m.split(".")[0] in HEAVY or m in HEAVY]
+    assert not loaded, loaded
+
+
+def test_registries_import_only_providers_agents_use():
+    code = (
+        "import sys; from core.load import build_registries; build_registries('agents/agents.yml'); "
+        "print(sorted(m for m in sys.modules if m.startswith(('providers.', 'numpy', 'openai'))))"
+    )
+    _, out = _imported(["-c", code])
+    assert out.strip() == "['providers.openrouter_qwen']"
+
+
+def test_discovery_reads_sources_without_importing():
+    found = discover_providers({"providers": {"local": {"module": "my_pkg.local"}}})
+    assert found["qwen"] == "providers.openrouter_qwen"
+    assert found["ollama"] == "providers.ollama"
+    assert found["local"] == "my_pkg.local"
+    assert "composite" not in found
+
+
+def test_lazy_provider_is_built_once_on_first_get():
+    built = []
+    registry = ProviderRegistry()
+    registry.register_lazy("p", lambda: built.append(1) or object())
+    assert registry.names() == ["p"] and registry.loaded() == []
+    first = registry.get("p")
+    assert registry.get("p") is first and built == [1]
+    assert registry.loaded() == ["p"]
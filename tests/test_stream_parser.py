@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+from core.stream_parser import (
+    LineBuffer,
+    aiter_ollama_ndjson_bytes,
+    aiter_openai_sse_bytes,
+    iter_ollama_ndjson_bytes,
+    iter_openai_sse_bytes,
+)
+
+SSE = (
+    ": OPENROUTER PROCESSING\r\n\r\n"
+    'data: {"choices":[{"delta":{"content":"héllo "}}]}\r\n\r\n'
+    'data:{"choices":[{"delta":{"content":"wörld"},"finish_reason":"stop"}]}\n\n'
+    'data: {"choices":[],"usage":{"total_tokens":7}}\n\n'
+    "data: [DONE]\n\n"
+    'data: {"choices":[{"delta":{"content":"ignored"}}]}\n\n'
+).encode("utf-8")
+
+
+def _split(body: bytes, size: int):
+    return [body[i : i + size] for i in range(0, len(body), size)]
+
+
+def test_line_buffer_joins_pieces_and_keeps_trailing_partial_line():
+    buf = LineBuffer()
+    assert buf.feed(b"ab") == []
+    assert buf.feed(b"c\nde") == [b"abc"]
+    assert buf.feed(b"f\n\ng") == [b"def", b""]
+    assert buf.close() == b"g"
+    assert buf.close() is None
+
+
+def test_sse_bytes_yields_text_finish_and_usage_for_every_chunk_size():
+    expected = [("héllo ", None, None), ("wörld", "stop", None), ("", None, {"total_tokens": 7})]
+    for size in (1, 2, 3, 7, 64, len(SSE)):
+        got = [(d.text, d.finish_reason, d.usage) for d in iter_openai_sse_bytes(_split(SSE, size))]
+        assert got == expected, size
+
+
+def test_sse_bytes_stops_at_done_without_reading_further_chunks():
+    consumed = []
+
+    def chunks():
+        for chunk in (b'data: {"choices":[{"delta":{"content":"a"}}]}\n', b"data: [DONE]\n", b"garbage"):
+            consumed.append(chunk)
+            yield chunk
+
+    assert [d.text for d in iter_openai_sse_bytes(chunks())] == ["a"]
+    assert len(consumed) == 2
+
+
+def test_ndjson_bytes_handles_split_characters_and_final_line_without_newline():
+    body = (
+        json.dumps({"message": {"content": "日本"}, "done": False}, ensure_ascii=False) + "\r\n\n"
+        + json.dumps({"response": "語"}, ensure_ascii=False) + "\n"
+        + '{"done": true, "eval_count": 3, "prompt_eval_count": 2}'
+    ).encode("utf-8")
+    got = [(d.text, d.finish_reason, d.usage) for d in iter_ollama_ndjson_bytes(_split(body, 1))]
+    assert got == [
+        ("日本", None, None),
+        ("語", None, None),
+        ("", "stop", {"prompt_tokens": 2, "completion_tokens": 3, "total_tokens": 5}),
+    ]
+
+
+def test_ndjson_bytes_stops_after_done_line():
+    body = b'{"response":"x"}\n{"done":true}\n{"response":"late"}\n'
+    assert [d.text for d in iter_ollama_ndjson_bytes([body])] == ["x", ""]
+
+
+def test_async_sse_bytes():
+    async def chunks():
+        for chunk in _split(SSE, 5):
+            yield chunk
+
+    async def collect():
+        return [d.text async for d in aiter_openai_sse_bytes(chunks())]
+
+    assert "".join(asyncio.run(collect())) == "héllo wörld"
+
+
+def test_async_ndjson_bytes_reads_chat_and_generate_shapes():
+    body = (
+        b'{"message":{"content":"a"},"done":false}\n'
+        b'{"response":"b","done":false}\n'
+        b'{"done":true,"done_reason":"stop","prompt_eval_count":3,"eval_count":2}\n'
+    )
+
+    async def chunks():
+        for chunk in _split(body, 9):
+            yield chunk
+
+    async def collect():
+        return [d async for d in aiter_ollama_ndjson_bytes(chunks())]
+
+    deltas = asyncio.run(collect())
+    assert [d.text for d in deltas] == ["a", "b", ""]
+    assert deltas[-1].finish_reason == "stop" and deltas[-1].usage["total_tokens"] == 5
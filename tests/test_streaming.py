@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+import webserver
+from core import transport
+from core.stream import Delta, StreamStats
+from providers.ollama import OllamaProvider
+
+
+def test_stream_endpoint_forwards_deltas_then_done(monkeypatch):
+    async def fake_astream(self, messages, model_override=None):
+        assert messages[0] == {"role": "system", "content": "be brief"}
+        yield Delta(text="Hi")
+        yield Delta(text=" there", finish_reason="stop", usage={"total_tokens": 4})
+
+    monkeypatch.setattr(webserver.QwenProvider, "astream", fake_astream)
+    client = TestClient(webserver.app)
+    resp = client.post(
+        "/api/chat/qwen/stream",
+        json={"messages": [{"role": "user", "content": "hey"}], "system_prompt": "be brief"},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    body = resp.text
+    assert body.index('data: {"text": "Hi"}') < body.index('data: {"text": " there"}')
+    assert 'event: done\ndata: {"finish_reason": "stop", "usage": {"total_tokens": 4}}' in body
+
+
+def test_stream_stats_prefers_reported_usage():
+    stats = StreamStats()
+    stats.observe(Delta(text="a"))
+    stats.observe(Delta(text="b"))
+    assert stats.tokens == 2 and stats.ttft is not None
+    stats.observe(Delta(finish_reason="stop", usage={"completion_tokens": 5}))
+    assert stats.tokens == 5
+    assert stats.tokens_per_sec > 0
+    assert "5 tokens" in stats.summary()
+
+
+def test_ollama_sync_stream_reads_ndjson(monkeypatch):
+    body = "".join(
+        json.dumps(obj) + "\n"
+        for obj in [{"message": {"content": "to"}, "done": False}, {"message": {"content": "ken"}, "done": False}, {"done": True, "eval_count": 2}]
+    )
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body.encode())))
+    monkeypatch.setattr(transport, "get_client", lambda url: client)
+    deltas = list(OllamaProvider().stream("m", [{"role": "user", "content": "hi"}]))
+    assert "".join(d.text for d in deltas) == "token"
+    assert deltas[-1].usage["completion_tokens"] == 2
@@ -0,0 +1,47 @@
+from core.agent import Agent
+from core.manager import ConversationManager
+from core.registry import AgentRegistry
+
+
+class ScriptedProvider:
+    def __init__(self):
+        self.seen = []
+
+    def chat(self, model, messages, **kw):
+        self.seen.append(messages)
+        if model == "cheap":
+            return "user likes tea"
+        return "reply"
+
+
+def make_manager(summary_cfg):
+    provider = ScriptedProvider()
+    agents = AgentRegistry({"summary": summary_cfg})
+    agents.register(Agent({"id": "main", "model": "big"}, provider))
+    agents.register(Agent({"id": "sum", "model": "cheap"}, provider))
+    return ConversationManager(agents), provider
+
+
+def test_summary_replaces_old_turns_once_ready():
+    cm, provider = make_manager({"agent": "sum", "trigger_messages": 6, "keep_messages": 2})
+    for i in range(3):
+        cm.handle(f"turn {i}")
+    assert cm._pending is not None
+    assert len(cm.history) == 6  # handle() never waits for the summary
+    cm._pending[0].result(timeout=5)
+
+    cm.handle("turn 3")
+
+    assert cm.summary == "user likes tea"
+    assert [m["content"] for m in cm.history] == ["turn 2", "reply", "turn 3", "reply"]
+    sent = provider.seen[-1]
+    assert sent[0] == {"role": "system", "content": "Summary of earlier conversation: user likes tea"}
+    assert cm._build_handover() == "user likes tea"
+
+
+def test_no_summary_without_config():
+    cm, _ = make_manager({})
+    for i in range(10):
+        cm.handle(f"turn {i}")
+    assert cm._pending is None
+    assert len(cm.history) == 20
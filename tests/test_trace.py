@@ -0,0 +1,97 @@
+import asyncio
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+import webserver
+from chatbot import run_once
+from core import trace, transport
+from core.agent import Agent
+from core.manager import ConversationManager
+from core.registry import AgentRegistry
+from providers.ollama import OllamaProvider
+
+
+class FakeProvider:
+    def chat(self, model, messages, **kw):
+        return "reply"
+
+
+def make_manager():
+    agents = AgentRegistry()
+    agents.register(Agent({"id": "main", "model": "m"}, FakeProvider()))
+    return ConversationManager(agents)
+
+
+def test_spans_are_noops_without_a_trace():
+    assert trace.current() is None
+    with trace.span("x") as s:
+        pass
+    assert s is trace._NOOP
+    chunks = [b"a", b"b"]
+    assert trace.timed_chunks(chunks) is chunks
+
+
+def test_manager_turn_records_pipeline_stages():
+    cm = make_manager()
+    with trace.start("turn", trace_id="t1") as tr:
+        assert cm.handle("hi") == "reply"
+    assert trace.current() is None
+    stages = [name for name, _, _ in tr.breakdown()]
+    assert stages == ["route", "before_call", "context_fit", "agent_call", "commit"]
+    assert all(seconds >= 0 for _, seconds, _ in tr.breakdown())
+    assert tr.format().startswith("[profile t1] turn")
+
+
+def test_trace_follows_async_turn_into_worker_threads():
+    cm = make_manager()
+
+    def work():
+        with trace.span("in_thread"):
+            pass
+
+    async def main():
+        with trace.start() as tr:
+            await cm.ahandle("hi")
+            await asyncio.to_thread(work)
+        return tr
+
+    names = [name for name, _, _ in asyncio.run(main()).breakdown()]
+    assert "agent_call" in names and "in_thread" in names
+
+
+def test_streamed_provider_call_splits_network_and_parse(monkeypatch):
+    body = "".join(json.dumps({"message": {"content": c}, "done": False}) + "\n" for c in "abc")
+    body += json.dumps({"done": True, "done_reason": "stop"}) + "\n"
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body.encode())))
+    monkeypatch.setattr(transport, "get_client", lambda url: client)
+    with trace.start() as tr:
+        assert "".join(d.text for d in OllamaProvider(reuse_context=False).stream("m", [])) == "abc"
+    names = [name for name, _, _ in tr.breakdown()]
+    assert names[:3] == ["request", "network_wait", "parse"]
+
+
+def test_server_timing_header():
+    # installed only when SERVER_TIMING is set at startup
+    assert not any(m.cls is webserver.ServerTiming for m in webserver.app.user_middleware)
+    assert "Server-Timing" not in TestClient(webserver.app).get("/api/sessions").headers
+
+    client = TestClient(webserver.ServerTiming(webserver.app))
+    resp = client.get("/api/sessions", headers={"X-Request-Id": "req-1"})
+    assert resp.headers["X-Trace-Id"] == "req-1"
+    assert resp.headers["Server-Timing"].startswith("total;dur=")
+
+
+def test_server_timing_format():
+    tr = trace.Trace("request")
+    tr.add("agent call", 0.0, 0.25)
+    tr.add("agent call", 0.5, 0.25)
+    assert tr.server_timing().startswith("agent_call;dur=500.00, total;dur=")
+
+
+def test_run_once_profile_prints_breakdown(capsys):
+    run_once("mock", None, "system prompt", "Hello", profile=True)
+    captured = capsys.readouterr()
+    assert "[mock]" in captured.out
+    assert "[profile " in captured.err
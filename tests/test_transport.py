@@ -0,0 +1,24 @@
+from core import transport
+
+
+def test_get_client_reuses_one_pool_per_origin():
+    a = transport.get_client("http://127.0.0.1:9/api/chat")
+    b = transport.get_client("http://127.0.0.1:9/api/generate")
+    c = transport.get_client("http://localhost:9/api/chat")
+    assert a is b
+    assert a is not c
+    transport.close()
+    assert a.is_closed
+    assert transport.get_client("http://127.0.0.1:9/") is not a
+    transport.close()
+
+
+def test_pool_size_per_host_overrides(monkeypatch):
+    monkeypatch.setenv("HTTP_POOL_SIZE", "7")
+    monkeypatch.setenv("HTTP_POOL_SIZES", "openrouter.ai=64, 127.0.0.1:11434=2")
+    monkeypatch.setattr(transport, "_pool_sizes", None)
+    assert transport.pool_size("https://openrouter.ai/api/v1") == 64
+    assert transport.pool_size("http://127.0.0.1:11434/api/chat") == 2
+    assert transport.pool_size("http://127.0.0.1:8000/") == 7
+    transport.configure_pool("example.com", 3)
+    assert transport.pool_size("https://example.com/v1") == 3
@@ -0,0 +1,93 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from fastapi.testclient import TestClient
+
+import webserver
+from core import transport, warmup
+from core.registry import AgentRegistry
+
+CFG = {
+    "providers": {"resilient": {"type": "composite", "fallbacks": ["qwen", {"provider": "ollama", "model": "qwen2.5:7b"}]}},
+    "agents": [{"id": "a", "provider": "qwen"}, {"id": "b", "provider": "ollama", "model": "llama3"}],
+}
+
+
+def test_plan_connects_remote_upstreams_and_preloads_local_models(monkeypatch):
+    monkeypatch.setenv("OLLAMA_KEEP_ALIVE", "10m")
+    names = {name: (method, body) for name, method, _, body in warmup.plan(CFG)}
+    assert names["connect:openrouter"] == ("HEAD", None)
+    assert names["preload:ollama/llama3"] == ("POST", {"model": "llama3", "keep_alive": "10m"})
+    assert "preload:ollama/qwen2.5:7b" in names
+    assert warmup.plan({"agents": [{"id": "x", "provider": "openai"}]}) == []
+
+
+def test_run_records_failures_and_still_becomes_ready(monkeypatch):
+    seen = []
+
+    def handler(request):
+        seen.append((request.method, request.url.path))
+        if request.url.path == "/api/generate":
+            return httpx.Response(404, json={"error": "model not found"})
+        return httpx.Response(405)
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(transport, "get_client", lambda url: client)
+    warm = warmup.Warmup()
+    warm.start(warmup.steps(CFG)).join(5)
+    report = warm.report()
+    assert warm.ready and report["state"] == "ready"
+    assert report["steps"]["connect:openrouter"]["ok"]  # any answer means the connection is up
+    assert not report["steps"]["preload:ollama/llama3"]["ok"]
+    assert report["steps"]["import:numpy"]["ok"]
+    assert ("POST", "/api/generate") in seen
+
+
+def test_arun_bounds_slow_steps(monkeypatch):
+    monkeypatch.setenv("WARMUP_TIMEOUT", "0.05")
+
+    async def slow():
+        await asyncio.sleep(5)
+
+    warm = warmup.Warmup()
+    start = time.perf_counter()
+    asyncio.run(warm.arun([("slow", slow), ("fast", lambda: None)]))
+    assert time.perf_counter() - start < 1
+    assert warm.ready and not warm.steps["slow"]["ok"] and warm.steps["fast"]["ok"]
+
+
+def test_health_is_unavailable_until_warm(monkeypatch):
+    gate = asyncio.Event()
+
+    async def blocked():
+        await gate.wait()
+
+    monkeypatch.setattr(webserver, "warm", warmup.Warmup())
+    monkeypatch.setattr(webserver, "_warmup_steps", lambda: [("blocked", blocked)])
+    with TestClient(webserver.app) as client:
+        resp = client.get("/api/health")
+        assert resp.status_code == 503 and resp.json()["ready"] is False
+        client.portal.call(gate.set)
+        for _ in range(100):
+            resp = client.get("/api/health")
+            if resp.status_code == 200:
+                break
+            time.sleep(0.01)
+        assert resp.status_code == 200 and resp.json()["warmup"]["steps"]["blocked"]["ok"]
+
+
+def test_session_store_is_built_once_under_concurrent_first_use(monkeypatch):
+    built = []
+
+    def slow_build(path, models=None):
+        built.append(path)
+        time.sleep(0.05)
+        return AgentRegistry()
+
+    monkeypatch.setattr(webserver, "sessions", None)
+    monkeypatch.setattr(webserver, "build_registries", slow_build)
+    with ThreadPoolExecutor(4) as pool:
+        stores = list(pool.map(lambda _: webserver.session_store(), range(4)))
+    assert len(built) == 1 and all(s is stores[0] for s in stores)
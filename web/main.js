@@ -15,6 +15,8 @@
   const testConnBtn = el('#test-conn');
 
   let convo = [];
+  // The server keeps the conversation; we only send this id and the new message
+  let sessionId = localStorage.getItem('qwen_session') || null;
 
   const STATUS_MAP = {
     idle: ['#94a3b8', 'Idle'],
@@ -22,7 +24,7 @@
     error: ['#ef4444', 'Error'],
   };
 
-  const QWEN_ENDPOINT = '/api/chat/qwen';
+  const QWEN_STREAM_ENDPOINT = '/api/chat/qwen/stream';
 
   function setStatus(state) {
     const [color, text] = STATUS_MAP[state] || STATUS_MAP.idle;
@@ -54,6 +56,11 @@
   }
 
   function resetChat() {
+    if (sessionId) {
+      fetch(`/api/sessions/${encodeURIComponent(sessionId)}`, { method: 'DELETE' }).catch(() => {});
+    }
+    sessionId = null;
+    localStorage.removeItem('qwen_session');
     convo = [];
     messagesEl.innerHTML = '';
     localStorage.removeItem('qwen_chat');
@@ -61,15 +68,27 @@
     setStatus('idle');
   }
 
-  async function send(messages) {
+  function parseSseEvent(raw) {
+    let event = 'message';
+    const data = [];
+    raw.split('\n').forEach((line) => {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+    });
+    if (!data.length) return null;
+    return { event, data: JSON.parse(data.join('\n')) };
+  }
+
+  async function send(message, onText) {
     setStatus('sending');
     try {
-      const res = await fetch(QWEN_ENDPOINT, {
+      const res = await fetch(QWEN_STREAM_ENDPOINT, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
-          messages,
-          system_prompt: (sysPromptEl?.value || '').trim() || undefined,
+          session_id: sessionId || undefined,
+          message,
+          system_prompt: (sysPromptEl?.value || '').trim(),
         }),
       });
 
@@ -89,8 +108,33 @@
         throw new Error(detail);
       }
 
-      const data = isJson ? await res.json() : { reply: await res.text() };
-      const reply = data && typeof data.reply === 'string' ? data.reply : '';
+      const sid = res.headers.get('X-Session-Id');
+      if (sid) {
+        sessionId = sid;
+        localStorage.setItem('qwen_session', sid);
+      }
+
+      // Render tokens as Server-Sent Events arrive instead of waiting for the full reply
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let reply = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+          const evt = parseSseEvent(buffer.slice(0, sep));
+          buffer = buffer.slice(sep + 2);
+          if (!evt) continue;
+          if (evt.event === 'error') throw new Error(evt.data.detail || 'stream failed');
+          if (evt.event === 'message' && evt.data.text) {
+            reply += evt.data.text;
+            if (onText) onText(reply);
+          }
+        }
+      }
       setStatus('idle');
       banner.hidden = true;
       return { reply };
@@ -130,8 +174,10 @@
     messagesEl.scrollTop = messagesEl.scrollHeight;
 
     try {
-      const outbound = convo.slice(0, -1);
-      const out = await send(outbound);
+      const out = await send(text, (partial) => {
+        p.textContent = partial;
+        messagesEl.scrollTop = messagesEl.scrollHeight;
+      });
       const reply = out && out.reply ? out.reply : '(no reply)';
       p.textContent = reply;
       placeholder.content = reply;
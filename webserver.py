@@ -1,24 +1,178 @@
 from fastapi import FastAPI, Request, Depends, Header, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers, MutableHeaders
 import uvicorn
-from typing import List, Dict, Any
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Any, Optional
+import asyncio
+import contextvars
+import itertools
+import json
 import os
 import logging
+import re
+import secrets
+import threading
+import time
+import httpx
 from dotenv import load_dotenv
-from requests import HTTPError
 
 # Load environment variables from .env at project root
 load_dotenv()
 
 # Qwen (OpenRouter) provider only
 from src.providers.qwen_provider import QwenProvider
+from providers import cassette
+from providers.ollama import provider_instance as ollama_instance
+from core import batch, convlog, metrics, resilience, scheduler, trace, transport, warmup
+from core.agent import is_error_reply
+from core.cache import build_cache, cache_key, is_cacheable
+from core.load import build_registries, configure_limits, read_config
+from core.sessions import Session, SessionStore, build_session_store
+from core.singleflight import AsyncSingleFlight, StreamFlight
 
-app = FastAPI(title="Qwen Chatbot Server (Qwen-only)")
+# Per-provider concurrency limits from agents.yml (see core.scheduler)
+_agents_config = os.getenv("AGENTS_CONFIG", "agents/agents.yml")
+if os.path.exists(_agents_config):
+    configure_limits(_agents_config)
+
+# Process-wide provider singletons; connection pools live in core.transport.
+qwen = scheduler.scheduled("qwen", QwenProvider())
+ollama = scheduler.scheduled("ollama", cassette.from_env("ollama", ollama_instance))
+
+# Opt-in reply cache for /api/chat/qwen; CHAT_CACHE_PATH shares it across workers via SQLite
+_cache_ttl = float(os.getenv("CHAT_CACHE_TTL", "0"))
+chat_cache = build_cache(
+    {
+        "ttl": _cache_ttl,
+        "max_entries": int(os.getenv("CHAT_CACHE_SIZE", "1024")),
+        "path": os.getenv("CHAT_CACHE_PATH"),
+    }
+    if _cache_ttl > 0
+    else None
+)
+# Identical concurrent requests share one upstream call / stream
+chat_flights = AsyncSingleFlight()
+stream_flights = StreamFlight()
+
+# Server-side conversations for clients that send {session_id, message}; built on first use
+sessions: Optional[SessionStore] = None
+# warm-up builds the store on a worker thread while early requests may ask for it on the loop
+_sessions_lock = threading.Lock()
+
+
+def session_store() -> SessionStore:
+    global sessions
+    if sessions is None:
+        with _sessions_lock:
+            if sessions is None:
+                # qwen agents answer with the model the direct routes use (MODEL_NAME), so the UI keeps its model
+                sessions = build_session_store(build_registries(_agents_config, models={"qwen": qwen.model}))
+    return sessions
+
+
+# Health reports 503 until startup warm-up has finished, so load balancers skip cold workers
+warm = warmup.Warmup()
+
+
+def _warmup_steps() -> List[warmup.Step]:
+    cfg = read_config(_agents_config) if os.path.exists(_agents_config) else {}
+    return [("registries", session_store)] + warmup.asteps(cfg)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    task = None
+    if warmup.enabled():
+        task = asyncio.create_task(warm.arun(_warmup_steps()))
+    else:
+        warm.skip()
+    yield
+    if task is not None:
+        task.cancel()
+    # unfinished batch jobs stop here; re-POSTing them resumes from their results file
+    for job_task in list(_batch_tasks.values()):
+        job_task.cancel()
+    await asyncio.gather(*_batch_tasks.values(), return_exceptions=True)
+    if sessions is not None:
+        sessions.close()
+    await transport.aclose()
+    transport.close()
+
+
+app = FastAPI(title="Qwen Chatbot Server (Qwen-only)", lifespan=lifespan)
 
 app.mount("/web", StaticFiles(directory="web"), name="web")
 
 
+class HttpMetrics:
+    """Request count, latency and in-flight gauge per route.
+
+    Plain ASGI rather than ``@app.middleware``: that wraps every request in an
+    extra task and body stream, which costs more than the recording itself.
+    Latency runs to the last byte, so streamed responses count in full.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.HTTP_IN_FLIGHT.add(1, method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            metrics.HTTP_IN_FLIGHT.add(-1, method)
+            # label by route template, not raw path, so ids in URLs don't explode cardinality
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.HTTP_LATENCY.observe(time.perf_counter() - start, method, route)
+            metrics.HTTP_REQUESTS.inc(method, route, str(status))
+
+
+app.add_middleware(HttpMetrics)
+
+
+class ServerTiming:
+    """Traces each request and reports its stages in Server-Timing and X-Trace-Id headers."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with trace.start("request", trace_id=Headers(scope=scope).get("x-request-id")) as tr:
+
+            async def send_timed(message):
+                if message["type"] == "http.response.start":
+                    # a streamed body has not started yet, so only the stages up to its first byte are included
+                    headers = MutableHeaders(scope=message)
+                    headers["Server-Timing"] = tr.server_timing()
+                    headers["X-Trace-Id"] = tr.id
+                await send(message)
+
+            await self.app(scope, receive, send_timed)
+
+
+# read once at startup, so a server without SERVER_TIMING=1 does not pay for the middleware at all
+if os.getenv("SERVER_TIMING", "0").lower() not in ("0", "false", "no", ""):
+    app.add_middleware(ServerTiming)
+
+
 def require_auth(x_auth_token: str | None = Header(default=None, alias="X-Auth-Token")):
     expected = os.getenv("CHATKIT_AUTH_TOKEN")
     if expected and x_auth_token != expected:
@@ -30,9 +184,7 @@ async def root_index():
     return FileResponse("web/index.html")
 
 
-@app.post("/api/chat/qwen", dependencies=[Depends(require_auth)])
-async def api_chat_qwen(req: Request):
-    data = await req.json()
+def _build_messages(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     messages: List[Dict[str, Any]] = data.get("messages", [])
     system_prompt = (data.get("system_prompt") or "").strip()
 
@@ -41,26 +193,282 @@ async def api_chat_qwen(req: Request):
 
     if system_prompt:
         messages = [{"role": "system", "content": system_prompt}] + messages
+    return messages
 
-    try:
-        provider = QwenProvider()
-        reply = provider.chat(messages)
-        return JSONResponse({"reply": reply})
-    except HTTPError as he:
-        status = getattr(he.response, "status_code", None) or 502
-        msg = f"OpenRouter HTTPError {status}: {he}"
-        logging.exception(msg)
-        raise HTTPException(status_code=status, detail=msg)
-    except Exception as e:
-        msg = f"Chat failed: {e}"
+
+def _set_caller(req: Request, data: Dict[str, Any]) -> None:
+    # fair queueing key for core.scheduler: session, then auth token, then client address
+    caller = data.get("session_id") or req.headers.get("X-Auth-Token") or (req.client.host if req.client else None)
+    scheduler.current_caller.set(str(caller or "anonymous"))
+
+
+def _unavailable(exc: Exception) -> HTTPException:
+    retry_in = getattr(exc, "retry_in", 1.0)
+    return HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": str(max(1, round(retry_in)))})
+
+
+def _http_error(exc: Exception) -> HTTPException:
+    if isinstance(exc, (resilience.CircuitOpenError, scheduler.QueueFullError, convlog.LogFullError)):
+        return _unavailable(exc)
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code or 502
+        msg = f"OpenRouter HTTPError {status}: {exc}"
         logging.exception(msg)
-        raise HTTPException(status_code=500, detail=msg)
+        return HTTPException(status_code=status, detail=msg)
+    msg = f"Chat failed: {exc}"
+    logging.exception(msg)
+    return HTTPException(status_code=500, detail=msg)
+
+
+async def _session(data: Dict[str, Any]) -> Session:
+    prompt = data.get("system_prompt")
+    return await session_store().aget(data.get("session_id"), prompt.strip() if isinstance(prompt, str) else None)
+
+
+async def _session_deltas(session: Session, text: str):
+    async with session.lock:
+        async for delta in session.manager.astream(text):
+            yield delta
+
+
+async def _tracked(deltas, labels):
+    with metrics.track(*labels) as t:
+        async for delta in deltas:
+            t.delta(delta)
+            yield delta
+
+
+def _sse(data: Dict[str, Any], event: str | None = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/chat/qwen", dependencies=[Depends(require_auth)])
+async def api_chat_qwen(req: Request):
+    data = await req.json()
+    _set_caller(req, data)
+    if "message" in data:
+        # session mode: the server holds the history, the client sends only the new turn
+        try:
+            session = await _session(data)
+            async with session.lock:
+                reply = await session.manager.ahandle(str(data["message"]))
+        except Exception as e:
+            raise _http_error(e)
+        if is_error_reply(reply):
+            # the turn was not kept; the client can resend it
+            raise HTTPException(status_code=502, detail=reply, headers={"X-Session-Id": session.id})
+        return JSONResponse({"reply": reply, "session_id": session.id}, headers={"X-Session-Id": session.id})
+
+    messages = _build_messages(data)
+    key = cache_key(qwen.model, messages)
+    if chat_cache is not None:
+        hit = await chat_cache.aget(key)
+        metrics.CACHE.inc("direct", "miss" if hit is None else "hit")
+        if hit is not None:
+            return JSONResponse({"reply": hit, "cached": True})
+
+    async def fetch() -> str:
+        reply = await qwen.achat(messages)
+        if chat_cache is not None and is_cacheable(reply):
+            await chat_cache.aset(key, reply)
+        return reply
+
+    with metrics.track("direct", "qwen", qwen.model) as t:
+        try:
+            reply = t.reply(await chat_flights.do(key, fetch))
+        except Exception as e:
+            raise _http_error(e)
+    return JSONResponse({"reply": reply})
+
+
+@app.post("/api/chat/qwen/stream", dependencies=[Depends(require_auth)])
+async def api_chat_qwen_stream(req: Request):
+    data = await req.json()
+    model = data.get("model") or None
+    _set_caller(req, data)
+    sched = scheduler.get("ollama" if data.get("provider") == "ollama" else "qwen")
+    if sched is not None and sched.saturated():
+        # reject before the response starts; once streaming, errors can only be SSE events
+        raise _unavailable(scheduler.QueueFullError(sched.name))
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    extra: Dict[str, Any] = {}
+    if "message" in data:
+        session = await _session(data)
+        deltas = _session_deltas(session, str(data["message"]))
+        headers["X-Session-Id"] = extra["session_id"] = session.id
+    elif data.get("provider") == "ollama":
+        messages = _build_messages(data)
+        key = cache_key(f"ollama:{model}", messages)
+        deltas = _tracked(stream_flights.stream(key, lambda: ollama.astream(model, messages)), ("direct", "ollama", model or ""))
+    else:
+        messages = _build_messages(data)
+        key = cache_key(f"qwen:{model or qwen.model}", messages)
+        deltas = _tracked(
+            stream_flights.stream(key, lambda: qwen.astream(messages, model_override=model)),
+            ("direct", "qwen", model or qwen.model),
+        )
+
+    async def events() -> AsyncIterator[str]:
+        finish_reason = None
+        usage = None
+        try:
+            async for delta in deltas:
+                if delta.text:
+                    yield _sse({"text": delta.text})
+                finish_reason = delta.finish_reason or finish_reason
+                usage = delta.usage or usage
+        except httpx.HTTPStatusError as he:
+            msg = f"Upstream HTTPError {he.response.status_code}: {he}"
+            logging.exception(msg)
+            yield _sse({"detail": msg}, event="error")
+            return
+        except Exception as e:
+            msg = f"Chat failed: {e}"
+            logging.exception(msg)
+            yield _sse({"detail": msg}, event="error")
+            return
+        yield _sse({"finish_reason": finish_reason or "stop", "usage": usage, **extra}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+# Batch jobs: the body is spooled to BATCH_DIR/input/<job>.jsonl, results go to BATCH_DIR/<job>.jsonl
+BATCH_DIR = os.getenv("BATCH_DIR", "batch_jobs")
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "64"))
+BATCH_KEEP_STATS = int(os.getenv("BATCH_KEEP_STATS", "256"))
+_JOB_NAME = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+# job -> counters of its BatchRunner, oldest first, at most BATCH_KEEP_STATS finished jobs;
+# a job is running while its task is in _batch_tasks
+_batch_stats: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+_batch_tasks: Dict[str, "asyncio.Task[None]"] = {}
+
+
+def _job_path(job: str) -> str:
+    if not _JOB_NAME.match(job) or job.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid job name")
+    return os.path.join(BATCH_DIR, job + ".jsonl")
+
+
+def _keep_stats(job: str, stats: Dict[str, int]) -> None:
+    _batch_stats[job] = stats
+    _batch_stats.move_to_end(job)
+    finished = [j for j in _batch_stats if j not in _batch_tasks and j != job]
+    for old in finished[: max(0, len(finished) - BATCH_KEEP_STATS)]:
+        del _batch_stats[old]
+
+
+async def _run_batch_job(job: str, spool: str, path: str, concurrency: int) -> None:
+    # one thread does all of the job's file work, in order, so the loop never touches the disk
+    io = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"batch-{job}")
+    loop = asyncio.get_running_loop()
+    writer = None
+    try:
+        writer = await loop.run_in_executor(io, batch.ResultWriter, path)
+        runner = batch.BatchRunner(
+            session_store().agents, lambda result: io.submit(writer.write, result), concurrency, skip=set(writer.done)
+        )
+        _keep_stats(job, runner.stats)
+        records = batch.read_records(spool)
+        while True:
+            chunk = await loop.run_in_executor(io, list, itertools.islice(records, 256))
+            if not chunk:
+                break
+            for record in chunk:
+                await runner.submit(record)
+        await runner.join()
+    except Exception:
+        logging.exception(f"Batch job {job} failed")
+    finally:
+        if writer is not None:
+            io.submit(writer.close)
+        await asyncio.to_thread(io.shutdown)
+
+
+async def _spool(req: Request, spool: str) -> None:
+    await asyncio.to_thread(os.makedirs, os.path.dirname(spool), exist_ok=True)
+    f = await asyncio.to_thread(open, spool, "wb")
+    try:
+        async for chunk in req.stream():
+            await asyncio.to_thread(f.write, chunk)
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+@app.post("/api/chat/batch", dependencies=[Depends(require_auth)])
+async def api_chat_batch(req: Request, job: Optional[str] = None, concurrency: int = 16):
+    """Queue a JSON Lines batch (see core.batch); results are served by GET /api/chat/batch/{job}.
+
+    The body is spooled to disk and the job id returned right away, so a long run never holds
+    a request open. Re-POSTing an existing job resumes it: finished ids are skipped.
+    """
+    job = job or time.strftime("%Y%m%d-%H%M%S-") + secrets.token_hex(4)
+    path = _job_path(job)
+    if job in _batch_tasks:
+        raise HTTPException(status_code=409, detail=f"Batch job {job} is already running")
+    spool = os.path.join(BATCH_DIR, "input", job + ".jsonl")
+    await _spool(req, spool)
+    run = _run_batch_job(job, spool, path, max(1, min(concurrency, BATCH_MAX_CONCURRENCY)))
+    # a fresh context, so the job does not carry this request's trace or caller along
+    task = contextvars.Context().run(asyncio.create_task, run)
+    _batch_tasks[job] = task
+    task.add_done_callback(lambda _: _batch_tasks.pop(job, None))
+    url = f"/api/chat/batch/{job}"
+    return JSONResponse({"job": job, "status": "running", "results": url}, status_code=202, headers={"Location": url})
+
+
+@app.get("/api/chat/batch/{job}", dependencies=[Depends(require_auth)])
+def batch_results(job: str):
+    """The results so far as JSON Lines; X-Batch-Status says whether the job is still running."""
+    path = _job_path(job)
+    if not os.path.exists(path):
+        if job in _batch_tasks:
+            return PlainTextResponse("", media_type="application/x-ndjson", headers={"X-Batch-Status": "running"})
+        raise HTTPException(status_code=404, detail=f"No batch job {job}")
+    headers = {"X-Batch-Status": "running" if job in _batch_tasks else "done"}
+    stats = _batch_stats.get(job)
+    if stats is not None:
+        headers.update({f"X-Batch-{k.capitalize()}": str(v) for k, v in stats.items()})
+    return FileResponse(path, media_type="application/x-ndjson", headers=headers)
+
+
+@app.get("/api/cache", dependencies=[Depends(require_auth)])
+def cache_stats():
+    if chat_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, "size": len(chat_cache), **chat_cache.stats.as_dict()}
+
+
+@app.get("/api/sessions", dependencies=[Depends(require_auth)])
+def session_stats():
+    if sessions is None:
+        return {"live": 0, "evictions": 0}
+    return sessions.stats()
+
+
+@app.delete("/api/sessions/{session_id}", dependencies=[Depends(require_auth)])
+def delete_session(session_id: str):
+    if sessions is not None:
+        sessions.delete(session_id)
+    return {"deleted": session_id}
+
+
+@app.get("/api/metrics", dependencies=[Depends(require_auth)])
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/api/health", dependencies=[Depends(require_auth)])
 def health():
     ok = bool(os.getenv("OPENROUTER_API_KEY"))
-    return {"ok": ok}
+    body = {
+        "ok": ok,
+        "ready": warm.ready,
+        "warmup": warm.report(),
+        "circuits": resilience.breaker_states(),
+        "schedulers": scheduler.states(),
+    }
+    return JSONResponse(body, status_code=200 if warm.ready else 503)
 
 
 if __name__ == "__main__":